@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+asyncio server core: every connection on one event loop instead of one OS
+thread per request.
+
+ThreadedHTTPServer starts a thread for each control poll (index_fixed.html
+sends several every 50 ms) and keeps one per MJPEG viewer. AsyncHTTPServer
+serves the same BaseHTTPRequestHandler class without changing its routes:
+
+  - the request head is read on the loop, then the handler's own
+    handle_one_request() parses it from an in-memory rfile, so routing,
+    headers and errors are exactly those of the threaded server;
+  - routes listed in loop_routes (telemetry, /tank_command, stream set-up)
+    only read globals or queue work for other threads, so they run directly on
+    the loop and their buffered response is written back without a thread;
+  - every other route (static files, panorama, dataset, recordings...) runs
+    on a small fixed pool of handler threads, writing through the loop;
+  - routes listed in stream_routes (replay and recording playback) stream
+    from their handler until the viewer leaves, so they get their own capped
+    pool of threads: once stream_threads viewers are watching, further ones
+    get a 503 and the request threads stay free for everything else;
+  - MJPEG streams are served by coroutines. The handler's send_mjpeg() is
+    replaced so that it only sends the headers and names the source; one
+    FrameFeed per source moves each new JPEG from the camera thread to the
+    loop (call_soon_threadsafe, the loop's thread-safe queue), and every
+    viewer coroutine sends the newest frame when its socket can take it, so a
+    slow viewer skips frames without holding anything up;
+  - Server-Sent Events (/events) are coroutines too: send_events() is replaced
+    the same way, and each client is woken through a ChangeFeed on the
+    telemetry state's condition.
+
+Handler classes used here must stream MJPEG through send_mjpeg(source,
+viewer=None) and send_mjpeg_headers(), and events through
+send_events(stream) and send_events_headers(), as web_fixed.StreamingHandler
+does.
+"""
+import asyncio
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MJPEG_PART_HEADER = b'--FRAME\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n'
+MAX_HEADER_BYTES = 65536
+STREAMS_BUSY_RESPONSE = (b'HTTP/1.1 503 Service Unavailable\r\nRetry-After: 5\r\nContent-Length: 0\r\n'
+                         b'Connection: close\r\n\r\n')
+
+
+class ChangeFeed:
+    """Wakes coroutines on the event loop each time source.version changes (e.g. TelemetryState)."""
+    def __init__(self, loop, source):
+        self.loop = loop
+        self.source = source
+        self.waiter = loop.create_future()
+        self.thread = threading.Thread(target=self._forward, daemon=True)
+        self.thread.start()
+
+    def _forward(self):
+        # One thread per source (not per client): waits like the threaded handlers did
+        # wait_for() rather than wait(): a change made while this thread was forwarding is not missed
+        source = self.source
+        value = self._value()
+        while True:
+            with source.condition:
+                source.condition.wait_for(lambda: self._value() is not value)
+                value = self._value()
+            self.loop.call_soon_threadsafe(self._publish, value)
+
+    def _value(self):
+        return self.source.version
+
+    def _publish(self, value):
+        waiter, self.waiter = self.waiter, self.loop.create_future()
+        waiter.set_result(value)
+
+    async def wait(self):
+        return await asyncio.shield(self.waiter)
+
+
+class FrameFeed(ChangeFeed):
+    """Newest JPEG of one StreamingOutput / FrameOutput, republished on the event loop."""
+    def _value(self):
+        return self.source.frame
+
+    async def next_frame(self):
+        return await self.wait()
+
+
+class _LoopWriter(io.RawIOBase):
+    """wfile for handlers running on a handler thread: each write is sent by the loop, with backpressure."""
+    def __init__(self, loop, writer):
+        self.loop = loop
+        self.writer = writer
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        send = self._send(bytes(data))
+        try:
+            future = asyncio.run_coroutine_threadsafe(send, self.loop)
+        except RuntimeError:
+            send.close()
+            raise ConnectionResetError("Server shut down")  # Loop closed: ends the handler like a lost client
+        future.result()
+        return len(data)
+
+    async def _send(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+
+
+class AsyncHTTPServer:
+    def __init__(self, server_address, handler_class, loop_routes=(), handler_threads=4, request_timeout=10.0,
+                 stream_routes=(), stream_threads=8):
+        """
+        :param server_address: (host, port) like HTTPServer.
+        :param handler_class: BaseHTTPRequestHandler subclass with the routes (e.g. StreamingHandler).
+        :param loop_routes: Path prefixes handled directly on the event loop; their handlers must not block.
+        :param handler_threads: Threads for all other routes. A long download holds one while it lasts.
+        :param request_timeout: Seconds a client has to send its first request head. Later requests on a
+            kept-alive connection may take the handler class's timeout (keepalive_http.py).
+        :param stream_routes: Path prefixes whose handlers stream until the client leaves (e.g. /replay.mjpg).
+        :param stream_threads: Threads for stream_routes, i.e. how many of those streams run at once.
+        """
+        self.server_address = server_address
+        self.handler_class = self._streaming_handler(handler_class)
+        self.loop_routes = tuple(loop_routes)
+        self.request_timeout = request_timeout
+        self.idle_timeout = getattr(handler_class, 'timeout', None) or request_timeout
+        self.executor = ThreadPoolExecutor(max_workers=handler_threads, thread_name_prefix='http-handler')
+        self.stream_routes = tuple(stream_routes)
+        self.stream_threads = stream_threads
+        self.stream_executor = ThreadPoolExecutor(max_workers=stream_threads, thread_name_prefix='http-stream')
+        self.stream_handlers = 0
+        self.loop = None
+        self.server = None
+        self.feeds = {}
+        self.requests = 0
+        self.streams = 0
+        # HTTPServer attributes some handlers read
+        self.server_name = server_address[0] or 'localhost'
+        self.server_port = server_address[1]
+
+    @staticmethod
+    def _streaming_handler(handler_class):
+        def send_mjpeg(self, source, viewer=None):
+            # Headers now; the frames are sent by _stream_mjpeg() once the handler has returned
+            self.send_mjpeg_headers()
+            self.deferred_stream = ('mjpeg', source, viewer)
+
+        def send_events(self, stream):
+            self.send_events_headers()
+            self.deferred_stream = ('events', stream)
+        return type(handler_class.__name__, (handler_class,),
+                    {'send_mjpeg': send_mjpeg, 'send_events': send_events, 'deferred_stream': None})
+
+    def serve_forever(self):
+        """Runs the event loop in the calling thread (start it in a daemon thread, like HTTPServer)."""
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        host, port = self.server_address
+        self.server = await asyncio.start_server(self._handle_connection, host or None, port,
+                                                 limit=MAX_HEADER_BYTES, reuse_address=True)
+        async with self.server:
+            try:
+                await self.server.serve_forever()
+            except asyncio.CancelledError:
+                pass  # shutdown() closed the server
+
+    def shutdown(self):
+        if self.loop is not None and self.server is not None:
+            self.loop.call_soon_threadsafe(self.server.close)
+        self.executor.shutdown(wait=False)
+        self.stream_executor.shutdown(wait=False)
+
+    def _feed(self, source, feed_class=FrameFeed):
+        feed = self.feeds.get(id(source))
+        if feed is None:
+            feed = self.feeds[id(source)] = feed_class(self.loop, source)
+        return feed
+
+    async def _handle_connection(self, reader, writer):
+        client_address = writer.get_extra_info('peername') or ('unix', 0)
+        served = 0
+        try:
+            while True:
+                # Kept-alive connections (keepalive_http.py) wait up to the handler's idle timeout
+                head, body = await self._read_request(reader, self.idle_timeout if served else self.request_timeout)
+                if head is None:
+                    return
+                self.requests += 1
+                path = head.split(b'\r\n', 1)[0].split(b' ')[1:2]
+                path = path[0].decode('latin-1') if path else ''
+                if path.startswith(self.loop_routes):
+                    wfile = io.BytesIO()
+                    handler = self._run_handler(head + body, wfile, client_address, served)
+                    writer.write(wfile.getvalue())
+                elif self.stream_routes and path.startswith(self.stream_routes):
+                    if self.stream_handlers >= self.stream_threads:
+                        writer.write(STREAMS_BUSY_RESPONSE)
+                        await writer.drain()
+                        return
+                    self.stream_handlers += 1
+                    try:
+                        handler = await self.loop.run_in_executor(
+                            self.stream_executor, self._run_handler, head + body, _LoopWriter(self.loop, writer),
+                            client_address, served)
+                    finally:
+                        self.stream_handlers -= 1
+                else:
+                    handler = await self.loop.run_in_executor(
+                        self.executor, self._run_handler, head + body, _LoopWriter(self.loop, writer), client_address,
+                        served)
+                await writer.drain()
+                if handler is None:
+                    return
+                if handler.deferred_stream is not None:
+                    kind, *args = handler.deferred_stream
+                    await (self._stream_mjpeg if kind == 'mjpeg' else self._stream_events)(writer, *args)
+                    return
+                if handler.close_connection:
+                    return
+                served += 1
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"HTTP connection error: {e}")
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader, timeout):
+        """(request head, body) bytes, or (None, None) if the client sent nothing usable in time."""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)
+        except (asyncio.TimeoutError, asyncio.LimitOverrunError, asyncio.IncompleteReadError):
+            return None, None
+        body = b''
+        for line in head.split(b'\r\n')[1:]:
+            if line[:15].lower() == b'content-length:':
+                length = int(line[15:].strip() or 0)
+                if length:
+                    body = await asyncio.wait_for(reader.readexactly(length), self.request_timeout)
+                break
+        return head, body
+
+    def _run_handler(self, request, wfile, client_address, served=0):
+        """The handler class's own parsing and do_GET, on an in-memory request."""
+        handler = self.handler_class.__new__(self.handler_class)
+        handler.requests_served = served
+        handler.server = self
+        handler.request = None
+        handler.client_address = client_address
+        handler.directory = getattr(handler, 'directory', None) or '.'
+        handler.rfile = io.BytesIO(request)
+        handler.wfile = wfile
+        handler.close_connection = True
+        try:
+            handler.handle_one_request()
+        except ConnectionError:
+            return None
+        return handler
+
+    async def _stream_mjpeg(self, writer, source, viewer):
+        feed = self._feed(source)
+        if viewer is not None:
+            viewer.acquire()
+        self.streams += 1
+        try:
+            while True:
+                frame = await feed.next_frame()
+                writer.writelines((MJPEG_PART_HEADER % len(frame), frame, b'\r\n'))
+                await writer.drain()
+        finally:
+            self.streams -= 1
+            if viewer is not None:
+                viewer.release()
+
+    async def _stream_events(self, writer, stream):
+        """SSE from a telemetry.EventStream: sent when it has an event, woken by every state change."""
+        feed = self._feed(stream.state, ChangeFeed)
+        self.streams += 1
+        try:
+            while True:
+                event, wait = stream.poll(time.monotonic())
+                if event is not None:
+                    writer.write(event)
+                    await writer.drain()
+                    continue
+                try:
+                    await asyncio.wait_for(feed.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.streams -= 1
+
+    def get_stats(self):
+        return {'requests': self.requests, 'streams': self.streams + self.stream_handlers, 'feeds': len(self.feeds)}
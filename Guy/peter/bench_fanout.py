@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Viewer fan-out scaling benchmark: single ThreadedHTTPServer vs SO_REUSEPORT workers.
+
+Publishes JPEG-sized frames at FRAMERATE (random bytes by default, or real
+JPEGs encoded from any frame_sources.py source) and connects 1-50 MJPEG
+viewers, then reports the fps each viewer actually received and the
+server-side CPU used.
+
+    python3 bench_fanout.py                       # threaded vs 2 and 4 workers
+    python3 bench_fanout.py --workers 4 --viewers 1 10 50 --duration 10
+    python3 bench_fanout.py --source file:drive.mp4
+"""
+import argparse
+import multiprocessing
+import os
+import selectors
+import socket
+import threading
+import time
+
+from frame_sources import add_source_argument, encode_frames, open_frame_source
+from multiproc_frontend import (ReusePortHTTPServer, SharedFrameSlot, WorkerOutput,
+                                make_worker_handler, start_frontend_workers)
+
+FRAMERATE = 24
+FRAME_BYTES = 45000  # Typical 640x480 q80 JPEG (replaced by the mean size with --source)
+PAYLOADS = []  # Pre-encoded JPEGs from --source, cycled by the publisher
+BENCH_PORT = 8095
+WARMUP = 1.0  # Seconds each viewer reads before measuring
+CLK_TCK = os.sysconf('SC_CLK_TCK')
+
+
+def cpu_seconds(pids):
+    """utime + stime of the given processes, read from /proc."""
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            total += int(fields[11]) + int(fields[12])
+        except FileNotFoundError:
+            pass
+    return total / CLK_TCK
+
+
+def load_payloads(spec):
+    """Encode two seconds of `spec` into PAYLOADS and make FRAME_BYTES their mean size."""
+    global FRAME_BYTES
+    PAYLOADS.extend(encode_frames(open_frame_source(spec), FRAMERATE * 2))
+    FRAME_BYTES = sum(len(p) for p in PAYLOADS) // len(PAYLOADS)
+
+
+def publish_frames(write):
+    frame = bytearray(os.urandom(FRAME_BYTES))
+    counter = 0
+    while True:
+        counter += 1
+        if PAYLOADS:
+            write(PAYLOADS[counter % len(PAYLOADS)])
+        else:
+            frame[:8] = counter.to_bytes(8, 'little')
+            write(bytes(frame))
+        time.sleep(1.0 / FRAMERATE)
+
+
+def threaded_server_process(port):
+    """Same shape as web_fixed.py: capture thread and all viewer threads in one process."""
+    worker_output = WorkerOutput()
+    threading.Thread(target=publish_frames, args=(worker_output.write,), daemon=True).start()
+    server = ReusePortHTTPServer(('127.0.0.1', port), make_worker_handler(worker_output, {}, port))
+    server.serve_forever()
+
+
+def slot_publisher_process(slot):
+    publish_frames(slot.write)
+
+
+def viewer_client_process(port, count, duration, results):
+    selector = selectors.DefaultSelector()
+    received = {}
+    for i in range(count):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.sendall(b'GET /stream.mjpg HTTP/1.0\r\n\r\n')
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ, i)
+        received[i] = 0
+    # Drain the connection burst first so socket backlog does not inflate the fps
+    measure_start = time.time() + WARMUP
+    deadline = measure_start + duration
+    measuring = False
+    while time.time() < deadline:
+        if not measuring and time.time() >= measure_start:
+            received = dict.fromkeys(received, 0)
+            measuring = True
+        for key, _ in selector.select(timeout=0.1):
+            try:
+                data = key.fileobj.recv(262144)
+            except BlockingIOError:
+                continue
+            received[key.data] += len(data)
+    for key in list(selector.get_map().values()):
+        key.fileobj.close()
+    results.put([nbytes / FRAME_BYTES / duration for nbytes in received.values()])
+
+
+def run_viewers(port, viewers, duration, server_pids):
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    per_client = 10
+    clients = []
+    remaining = viewers
+    while remaining > 0:
+        count = min(per_client, remaining)
+        remaining -= count
+        client = context.Process(target=viewer_client_process, args=(port, count, duration, results))
+        client.start()
+        clients.append(client)
+    time.sleep(WARMUP)  # Sample CPU over the same window the viewers measure
+    cpu_start = cpu_seconds(server_pids)
+    wall_start = time.time()
+    fps = []
+    for _ in clients:
+        fps.extend(results.get())
+    cpu_used = cpu_seconds(server_pids) - cpu_start
+    wall = time.time() - wall_start
+    for client in clients:
+        client.join()
+    return fps, 100.0 * cpu_used / max(wall, 1e-6)
+
+
+def bench_mode(label, workers, viewer_counts, duration):
+    context = multiprocessing.get_context('fork')
+    processes = []
+    slot = None
+    if workers == 0:
+        server = context.Process(target=threaded_server_process, args=(BENCH_PORT,), daemon=True)
+        server.start()
+        processes.append(server)
+    else:
+        slot = SharedFrameSlot()
+        processes.extend(start_frontend_workers(workers, slot, BENCH_PORT, BENCH_PORT))
+        publisher = context.Process(target=slot_publisher_process, args=(slot,), daemon=True)
+        publisher.start()
+        processes.append(publisher)
+    time.sleep(1.0)
+    pids = [p.pid for p in processes]
+    try:
+        for viewers in viewer_counts:
+            fps, cpu = run_viewers(BENCH_PORT, viewers, duration, pids)
+            print(f"{label:<12} {viewers:>7} {sum(fps) / len(fps):>9.1f} {min(fps):>9.1f} "
+                  f"{sum(fps) * FRAME_BYTES / 1e6:>9.1f} {cpu:>8.0f}%")
+    finally:
+        for p in processes:
+            p.terminate()
+            p.join()
+        if slot is not None:
+            slot.close()
+        time.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4],
+                        help='Worker counts to compare against the threaded server')
+    parser.add_argument('--viewers', type=int, nargs='+', default=[1, 5, 10, 20, 35, 50])
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per measurement')
+    add_source_argument(parser, use='JPEG payloads (default: random bytes)')
+    args = parser.parse_args()
+
+    if args.source:
+        load_payloads(args.source)
+
+    print(f"Target {FRAMERATE} fps, {FRAME_BYTES} byte frames, {os.cpu_count()} CPUs")
+    print(f"{'mode':<12} {'viewers':>7} {'avg fps':>9} {'min fps':>9} {'MB/s':>9} {'CPU':>9}")
+    bench_mode('threaded', 0, args.viewers, args.duration)
+    for workers in args.workers:
+        bench_mode(f'{workers} workers', workers, args.viewers, args.duration)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+HUD overlay benchmark: cached compositing (HudOverlay.draw) against drawing
+everything with OpenCV calls on every frame (HudOverlay.draw_direct).
+
+Two telemetry scenarios: "steady" (parked or aiming: values rarely change,
+distance updates a few times a second) and "driving" (motor PWM and heading
+change on every frame, so the cached HUD re-renders its bars every frame).
+The heading tile is included (show_heading=True), although web_fixed.py has
+no heading source yet and leaves it out.
+
+    python3 bench_hud.py --frames 1000
+    python3 bench_hud.py --source test:1280x720@0
+"""
+import argparse
+import math
+import statistics
+import time
+
+from frame_sources import add_source_argument, open_frame_source
+from hud_overlay import HudOverlay
+
+
+def simulated_values(n, scenario):
+    if scenario == 'steady':
+        return {'distance': 80 + (n // 6) % 3, 'm1': 0, 'm2': 0, 'heading': 90}
+    return {
+        'distance': 80 + int(40 * math.sin(n / 24.0)),
+        'm1': int(255 * math.sin(n / 30.0)),
+        'm2': int(255 * math.sin(n / 30.0 + 0.5)),
+        'heading': (n * 2) % 360,
+    }
+
+
+def run(mode, scenario, frames, hud):
+    timings = []
+    for n, frame in enumerate(frames):
+        hud.set_values(**simulated_values(n, scenario))
+        start = time.perf_counter()
+        if mode == 'cached':
+            hud.draw(frame)
+        else:
+            hud.draw_direct(frame)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_source_argument(parser, default='test')
+    parser.add_argument('--frames', type=int, default=500)
+    args = parser.parse_args()
+
+    source = open_frame_source(args.source)
+    source.fps = None
+    originals = []
+    while len(originals) < min(args.frames, 100):
+        ret, frame = source.read()
+        if not ret:
+            break
+        originals.append(frame)
+    source.release()
+    if not originals:
+        print("No frames read")
+        return
+    height, width = originals[0].shape[:2]
+    print(f"{args.frames} frames at {width}x{height}")
+
+    print(f"{'scenario':<9} {'mode':<8} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9} {'renders':>9}")
+    for scenario in ('steady', 'driving'):
+        for mode in ('direct', 'cached'):
+            hud = HudOverlay((width, height), show_heading=True)
+            frames = [originals[i % len(originals)].copy() for i in range(args.frames)]
+            timings = sorted(run(mode, scenario, frames, hud))
+            renders = hud.renders if mode == 'cached' else len(frames) * 4
+            print(f"{scenario:<9} {mode:<8} {statistics.mean(timings) * 1000:>9.3f} "
+                  f"{timings[int(len(timings) * 0.95)] * 1000:>9.3f} {timings[-1] * 1000:>9.3f} {renders:>9}")
+    stats = hud.get_stats()
+    print(f"Cached HUD: {stats['tiles']} tiles, {stats['blended_pixels']} pixels blended per frame "
+          f"({100.0 * stats['blended_pixels'] / (width * height):.1f}% of the frame)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Capture/encode pipeline benchmark, runnable on any frame source.
+
+Runs the same per-frame work as stream_camera() (web_fixed.encode_frame) on
+frames from frame_sources.py and reports the cost of every stage, so pipeline
+optimizations can be measured reproducibly without a camera.
+
+    python3 bench_pipeline.py --source test --frames 300
+    python3 bench_pipeline.py --source file:drive.mp4 --paced
+    python3 bench_pipeline.py --source jpegdir:samples/
+    python3 bench_pipeline.py --hud cached
+    python3 bench_pipeline.py --undistort calibration_data/camera.npz   (or --undistort synthetic)
+    python3 bench_pipeline.py --filters ../../mjpg-streamer/mjpg-streamer-experimental/plugins/input_opencv/filters/cvfilter_py/example_filter.py
+"""
+import argparse
+import statistics
+import time
+
+from filter_chain import FilterChain
+from frame_views import FrameViews
+from frame_sources import add_source_argument, open_frame_source
+from hud_overlay import HudOverlay
+from undistort import Undistorter, synthetic_calibration
+from stabilizer import GyroStabilizer, focal_from_hfov
+import web_fixed
+
+
+def report_filters(chain):
+    print(f"\n{'filter':<16} {'mean ms':>9} {'max ms':>9} {'overruns':>9} {'bypassed':>9}")
+    for stats in chain.get_stats()['filters']:
+        print(f"{stats['name']:<16} {stats['mean_ms']:>9.2f} {stats['max_ms']:>9.2f} "
+              f"{stats['overruns']:>9} {stats['bypass_count']:>9}")
+
+
+def build_stages(args):
+    """
+    :return: (stages, reports) - stages are (name, function) pairs applied in order,
+             each taking and returning a BGR frame; reports are called after the run.
+    """
+    stages = []
+    reports = []
+    if args.undistort:
+        if args.undistort == 'synthetic':
+            undistorter = Undistorter(calibration=synthetic_calibration(web_fixed.RESOLUTION), cache_dir=None)
+        else:
+            undistorter = Undistorter(args.undistort)
+        stages.append(('undistort', undistorter.apply))
+    if args.stabilize:
+        # No gyro here, so this measures the warp cost only (see bench_stabilizer.py for shake)
+        stabilizer = GyroStabilizer(web_fixed.RESOLUTION, focal_from_hfov(web_fixed.RESOLUTION[0], web_fixed.EIS_HFOV_DEG),
+                                    web_fixed.EIS_MARGIN, residual_every=0)
+        stages.append(('stabilize', stabilizer.apply))
+    if args.filters:
+        chain = FilterChain.from_paths(args.filters, web_fixed.FILTER_BUDGET_MS)
+        stages.append(('filters', lambda frame: chain.process(frame, FrameViews(frame))))
+        reports.append(lambda: report_filters(chain))
+    if args.hud:
+        hud = HudOverlay(web_fixed.RESOLUTION)
+        hud.set_values(distance=120, m1=180, m2=-60)
+        stages.append(('hud', hud.draw if args.hud == 'cached' else hud.draw_direct))
+    return stages, reports
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_source_argument(parser, default='test')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--paced', action='store_true',
+                        help="Keep the source's own frame rate instead of reading as fast as possible")
+    parser.add_argument('--filters', nargs='+', help='cvfilter_py-style filter files for the filter chain stage')
+    parser.add_argument('--undistort', help="Calibration .npz for the undistortion stage, or 'synthetic'")
+    parser.add_argument('--stabilize', action='store_true', help='Add the gyro stabilizer warp stage')
+    parser.add_argument('--hud', choices=['cached', 'direct'], help='Add the HUD overlay stage (see bench_hud.py)')
+    args = parser.parse_args()
+
+    source = open_frame_source(args.source, web_fixed.RESOLUTION)
+    if not args.paced:
+        source.fps = None
+    stages, reports = build_stages(args)
+    timings = {name: [] for name in ['read'] + [name for name, _ in stages] + ['encode', 'total']}
+    jpeg_bytes = []
+
+    print(f"Source: {source.describe()}")
+    wall_start = time.perf_counter()
+    for _ in range(args.frames):
+        frame_start = time.perf_counter()
+        ret, frame = source.read()
+        if not ret:
+            break
+        now = time.perf_counter()
+        timings['read'].append(now - frame_start)
+        for name, stage in stages:
+            stage_start = now
+            frame = stage(frame)
+            now = time.perf_counter()
+            timings[name].append(now - stage_start)
+        jpeg = web_fixed.encode_frame(frame)
+        end = time.perf_counter()
+        timings['encode'].append(end - now)
+        timings['total'].append(end - frame_start)
+        jpeg_bytes.append(len(jpeg))
+    wall = time.perf_counter() - wall_start
+    source.release()
+
+    count = len(timings['total'])
+    if not count:
+        print("No frames read")
+        return
+    print(f"{count} frames in {wall:.2f}s = {count / wall:.1f} fps, mean JPEG {statistics.mean(jpeg_bytes) / 1000:.1f} KB")
+    print(f"{'stage':<16} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for name, samples in timings.items():
+        print(f"{name:<16} {statistics.mean(samples) * 1000:>9.2f} {percentile(samples, 0.95) * 1000:>9.2f} "
+              f"{max(samples) * 1000:>9.2f}")
+    for report in reports:
+        report()
+
+
+if __name__ == '__main__':
+    main()
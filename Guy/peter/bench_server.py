@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Server core benchmark: ThreadedHTTPServer vs the asyncio core (async_http.py)
+under the browser's polling load.
+
+Each simulated browser polls like index_fixed.html: every 50 ms it sends
+/tank_command, /get_distance, /get_motor_speeds, /get_time and /get_latency
+(a route is skipped while its previous request is still pending, like the
+page's pendingRequest guard) and watches /stream.mjpg. Connections are reused
+when the server allows it (HTTP/1.1 keep-alive, keepalive_http.py), as a
+browser would; --close sends Connection: close to measure one connection per
+request, the HTTP/1.0 behaviour.
+
+The server process runs web_fixed.py's StreamingHandler and make_http_server()
+with frames published at FRAMERATE and the serial port replaced by a sink.
+Reported: requests answered per second (and how many the browsers wanted),
+latency percentiles of all requests and of /tank_command alone, connections
+opened per second, MJPEG fps per viewer and the server process's CPU.
+Frames are random bytes unless --source names a frame_sources.py source.
+
+    python3 bench_server.py
+    python3 bench_server.py --browsers 1 5 10 20 --duration 10 --no-stream
+    python3 bench_server.py --cores asyncio --close
+    python3 bench_server.py --source file:drive.mp4
+"""
+import argparse
+import multiprocessing
+import os
+import selectors
+import socket
+import sys
+import threading
+import time
+
+import bench_fanout
+from bench_fanout import cpu_seconds, load_payloads, publish_frames
+from frame_sources import add_source_argument
+
+BENCH_PORT = 8094
+POLL_INTERVAL = 0.05  # index_fixed.html's setInterval(..., 50)
+POLL_ROUTES = ['/tank_command?cmd=FR%3A0%3BLR%3A0%3BUD%3A0%3BTLR%3A0%3BFC%3A0%3BLC%3A0', '/get_distance',
+               '/get_motor_speeds', '/get_time', '/get_latency']
+WARMUP = 1.0
+
+
+class SerialSink:
+    """Stands in for the serial port: accepts writes, never has data."""
+    in_waiting = 0
+
+    def write(self, data):
+        return len(data)
+
+    def readline(self):
+        return b''
+
+
+def server_process(core, port):
+    sys.stdout = open(os.devnull, 'w')  # /tank_command prints every command
+    import web_fixed
+    web_fixed.SERVER_CORE = core
+    web_fixed.ser = SerialSink()
+    web_fixed.SERIAL_LINE_TIMEOUT = 0  # No firmware loop reports Dist: lines here
+    threading.Thread(target=web_fixed.write_serial_thread, daemon=True).start()
+    threading.Thread(target=publish_frames, args=(web_fixed.output.write,), daemon=True).start()
+    web_fixed.make_http_server(('127.0.0.1', port)).serve_forever()
+
+
+class Poller:
+    """One route of one browser: a request every POLL_INTERVAL unless the previous one is pending."""
+    def __init__(self, port, path, start, connection='keep-alive'):
+        self.port = port
+        self.request = (f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: {connection}\r\n\r\n').encode()
+        self.is_command = path.startswith('/tank_command')
+        self.connects = 0
+        self.sock = None
+        self.due = start
+        self.sent_at = None
+        self.buffer = b''
+
+    def send(self, selector, now):
+        if self.sock is None:
+            self.sock = socket.create_connection(('127.0.0.1', self.port))
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.connects += 1
+            selector.register(self.sock, selectors.EVENT_READ, self)
+        self.sock.sendall(self.request)
+        self.sent_at = now
+        self.buffer = b''
+
+    def close(self, selector):
+        selector.unregister(self.sock)
+        self.sock.close()
+        self.sock = None
+
+    def on_readable(self, selector):
+        """Latency in seconds when a response completed, else None."""
+        try:
+            data = self.sock.recv(65536)
+        except ConnectionError:
+            data = b''
+        if not data:
+            # Server closed: ends a response without Content-Length, or an idle kept-alive connection
+            done = self.sent_at is not None and b'\r\n\r\n' in self.buffer
+            self.close(selector)
+            return self._complete() if done else self._fail()
+        self.buffer += data
+        end = self.buffer.find(b'\r\n\r\n')
+        if end < 0:
+            return None
+        head = self.buffer[:end].decode('latin-1').lower()
+        length = None
+        for line in head.split('\r\n')[1:]:
+            if line.startswith('content-length:'):
+                length = int(line.split(':', 1)[1])
+        if length is None or len(self.buffer) < end + 4 + length:
+            return None
+        keep_alive = head.startswith('http/1.1') and 'connection: close' not in head
+        if not keep_alive:
+            self.close(selector)
+        return self._complete()
+
+    def _complete(self):
+        latency = time.perf_counter() - self.sent_at
+        self.sent_at = None
+        return latency
+
+    def _fail(self):
+        self.sent_at = None
+        return None
+
+
+def browser_client_process(port, browsers, stream, duration, connection, results):
+    selector = selectors.DefaultSelector()
+    start = time.perf_counter()
+    pollers = []
+    for b in range(browsers):
+        # Browsers do not poll in lock-step
+        offset = POLL_INTERVAL * b / browsers
+        pollers.extend(Poller(port, path, start + offset, connection) for path in POLL_ROUTES)
+    viewers = []
+    if stream:
+        for _ in range(browsers):
+            sock = socket.create_connection(('127.0.0.1', port))
+            sock.sendall(b'GET /stream.mjpg HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n')
+            sock.setblocking(False)
+            selector.register(sock, selectors.EVENT_READ, None)
+            viewers.append(sock)
+    measure_start = start + WARMUP
+    deadline = measure_start + duration
+    latencies = []
+    command_latencies = []
+    wanted = 0
+    frame_bytes = 0
+    connects_start = None
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            break
+        measuring = now >= measure_start
+        if measuring and connects_start is None:
+            connects_start = sum(p.connects for p in pollers)
+        for poller in pollers:
+            if poller.due <= now:
+                poller.due += POLL_INTERVAL
+                if measuring:
+                    wanted += 1
+                if poller.sent_at is None:
+                    try:
+                        poller.send(selector, now)
+                    except OSError:
+                        if poller.sock is not None:
+                            poller.close(selector)
+        timeout = max(0.0, min(p.due for p in pollers) - time.perf_counter())
+        for key, _ in selector.select(timeout=timeout):
+            if key.data is None:
+                try:
+                    data = key.fileobj.recv(262144)
+                except BlockingIOError:
+                    continue
+                if measuring:
+                    frame_bytes += len(data)
+                continue
+            latency = key.data.on_readable(selector)
+            if latency is not None and measuring:
+                latencies.append(latency)
+                if key.data.is_command:
+                    command_latencies.append(latency)
+    for sock in viewers:
+        sock.close()
+    connects = sum(p.connects for p in pollers) - (connects_start or 0)
+    results.put((latencies, command_latencies, wanted, connects, frame_bytes))
+
+
+def run_browsers(port, browsers, stream, duration, connection, server_pid, client_processes=2):
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    clients = []
+    for n in range(client_processes):
+        count = browsers // client_processes + (1 if n < browsers % client_processes else 0)
+        if count:
+            client = context.Process(target=browser_client_process,
+                                     args=(port, count, stream, duration, connection, results))
+            client.start()
+            clients.append(client)
+    time.sleep(WARMUP)
+    cpu_start = cpu_seconds([server_pid])
+    wall_start = time.time()
+    latencies, command_latencies, wanted, connects, frame_bytes = [], [], 0, 0, 0
+    for _ in clients:
+        client_latencies, client_command_latencies, client_wanted, client_connects, client_bytes = results.get()
+        latencies.extend(client_latencies)
+        command_latencies.extend(client_command_latencies)
+        wanted += client_wanted
+        connects += client_connects
+        frame_bytes += client_bytes
+    cpu = 100.0 * (cpu_seconds([server_pid]) - cpu_start) / max(time.time() - wall_start, 1e-6)
+    for client in clients:
+        client.join()
+    return sorted(latencies), sorted(command_latencies), wanted, connects, frame_bytes, cpu
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000 if samples else float('nan')
+
+
+def bench_core(core, browser_counts, stream, duration, connection):
+    context = multiprocessing.get_context('fork')
+    server = context.Process(target=server_process, args=(core, BENCH_PORT), daemon=True)
+    server.start()
+    time.sleep(2.0)  # web_fixed import
+    try:
+        for browsers in browser_counts:
+            latencies, command_latencies, wanted, connects, frame_bytes, cpu = run_browsers(
+                BENCH_PORT, browsers, stream, duration, connection, server.pid)
+            fps = frame_bytes / bench_fanout.FRAME_BYTES / duration / browsers if stream else 0.0
+            print(f"{core:<9} {browsers:>8} {len(latencies) / duration:>8.0f} {wanted / duration:>8.0f} "
+                  f"{percentile(latencies, 0.5):>8.2f} {percentile(latencies, 0.99):>8.2f} "
+                  f"{percentile(latencies, 1.0):>8.1f} {percentile(command_latencies, 0.5):>8.2f} "
+                  f"{percentile(command_latencies, 0.99):>8.2f} {connects / duration:>8.0f} {fps:>7.1f} {cpu:>6.0f}%")
+            time.sleep(0.5)
+    finally:
+        server.terminate()
+        server.join()
+        time.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cores', nargs='+', default=['threaded', 'asyncio'], choices=['threaded', 'asyncio'])
+    parser.add_argument('--browsers', type=int, nargs='+', default=[1, 5, 10, 20])
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per measurement')
+    parser.add_argument('--no-stream', action='store_true', help='Poll only, no /stream.mjpg viewer per browser')
+    parser.add_argument('--close', action='store_true', help='One connection per request (Connection: close)')
+    add_source_argument(parser, use='published JPEGs (default: random bytes)')
+    args = parser.parse_args()
+
+    if args.source:
+        load_payloads(args.source)  # Before the server process forks, which inherits them
+
+    connection = 'close' if args.close else 'keep-alive'
+    print(f"{len(POLL_ROUTES)} routes every {POLL_INTERVAL * 1000:.0f} ms per browser, "
+          f"{'one MJPEG viewer each' if not args.no_stream else 'no stream'}, Connection: {connection}, "
+          f"{os.cpu_count()} CPUs")
+    print(f"{'core':<9} {'browsers':>8} {'req/s':>8} {'wanted':>8} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'max ms':>8} {'cmd p50':>8} {'cmd p99':>8} {'conn/s':>8} {'fps':>7} {'CPU':>7}")
+    for core in args.cores:
+        bench_core(core, args.browsers, not args.no_stream, args.duration, connection)
+
+
+if __name__ == '__main__':
+    main()
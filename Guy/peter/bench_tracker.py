@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tracker benchmark: cost per frame and accuracy of TemplateTracker on a
+synthetic target moving over a textured background, at each pyramid level.
+
+At 24 fps a frame lasts 41.7 ms; web_fixed.TRACKER_BUDGET_MS is the share
+the tracker may use. The run reports whether each level stays inside it.
+
+With --source the background is the frames of any frame_sources.py source
+(e.g. a recorded drive) instead of a static texture.
+
+    python3 bench_tracker.py
+    python3 bench_tracker.py --size 1280x720 --target 64 --speed 12
+    python3 bench_tracker.py --source file:drive.mp4
+"""
+import argparse
+import math
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from frame_sources import add_source_argument, open_frame_source, read_frames
+from frame_views import FrameViews
+from turret_tracker import TemplateTracker
+import web_fixed
+
+
+def make_background(size):
+    width, height = size
+    rng = np.random.default_rng(2)
+    noise = rng.integers(40, 200, (height // 16, width // 16, 3), dtype=np.uint8)
+    return cv2.resize(noise, size, interpolation=cv2.INTER_CUBIC)
+
+
+def make_target(side):
+    target = np.zeros((side, side, 3), np.uint8)
+    cv2.rectangle(target, (0, 0), (side - 1, side - 1), (30, 30, 200), -1)
+    cv2.circle(target, (side // 2, side // 2), side // 3, (240, 240, 240), -1)
+    cv2.line(target, (0, 0), (side - 1, side - 1), (0, 0, 0), 2)
+    return target
+
+
+def target_position(n, size, side, speed):
+    """Lissajous path, `speed` px per frame on average."""
+    width, height = size
+    t = n * speed / 300.0
+    x = (width - side) * (0.5 + 0.4 * math.sin(t * 1.3))
+    y = (height - side) * (0.5 + 0.4 * math.sin(t * 0.9 + 1.0))
+    return int(x), int(y)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', default='640x480')
+    parser.add_argument('--frames', type=int, default=480)
+    parser.add_argument('--target', type=int, default=48, help='Target size in pixels')
+    parser.add_argument('--speed', type=float, default=6.0, help='Mean target speed, px per frame')
+    add_source_argument(parser, use='background (default: a static texture)')
+    args = parser.parse_args()
+
+    size = tuple(int(v) for v in args.size.split('x'))
+    if args.source:
+        backgrounds = read_frames(open_frame_source(args.source, size), args.frames, size)
+    else:
+        backgrounds = [make_background(size)]
+    target = make_target(args.target)
+    budget = web_fixed.TRACKER_BUDGET_MS
+    print(f"{args.frames} frames at {size[0]}x{size[1]}, {args.target}px target at ~{args.speed} px/frame, "
+          f"budget {budget} ms")
+    print(f"{'scale':<7} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9} {'error px':>9} {'lost':>6}  within budget")
+    for level in (1, 2, 3):
+        tracker = TemplateTracker(level=level, budget_ms=float('inf'))
+        timings = []
+        errors = []
+        lost = 0
+        for n in range(args.frames):
+            frame = backgrounds[n % len(backgrounds)].copy()
+            x, y = target_position(n, size, args.target, args.speed)
+            frame[y:y + args.target, x:x + args.target] = target
+            views = FrameViews(frame, n)
+            if n == 0:
+                tracker.request_lock(x, y, args.target, args.target)
+            start = time.perf_counter()
+            tracker.update(views)
+            timings.append(time.perf_counter() - start)
+            box = tracker.full_box()
+            if tracker.state == 'tracking' and box is not None:
+                errors.append(math.hypot(box[0] - x, box[1] - y))
+            else:
+                lost += 1
+        timings = sorted(timings[1:])
+        p95 = timings[int(len(timings) * 0.95)] * 1000
+        print(f"1/{2 ** level:<5} {statistics.mean(timings) * 1000:>9.3f} {p95:>9.3f} {timings[-1] * 1000:>9.3f} "
+              f"{statistics.mean(errors) if errors else float('nan'):>9.1f} {lost:>6}  {'yes' if p95 <= budget else 'NO'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Undistortion cost per resolution: cv2.undistort per frame against cv2.remap
+with float maps and with the fixed-point maps undistort.py uses.
+
+    python3 bench_undistort.py
+    python3 bench_undistort.py --calibration calibration_data/camera.npz --sizes 640x480 1280x720
+    python3 bench_undistort.py --source jpegdir:samples/
+
+Without --calibration a synthetic barrel-distortion model is used; the cost
+does not depend on the coefficients.
+"""
+import argparse
+import statistics
+import time
+
+import cv2
+
+from frame_sources import add_source_argument, open_frame_source, read_frames
+from undistort import build_maps, load_calibration, scale_camera_matrix, synthetic_calibration
+
+
+def time_calls(function, frames):
+    timings = []
+    for frame in frames:
+        start = time.perf_counter()
+        function(frame)
+        timings.append(time.perf_counter() - start)
+    return statistics.mean(timings) * 1000, sorted(timings)[int(len(timings) * 0.95)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calibration', help='.npz from calibrate_camera.py')
+    parser.add_argument('--sizes', nargs='+', default=['320x240', '640x480', '1280x720'])
+    parser.add_argument('--frames', type=int, default=100)
+    add_source_argument(parser, default='test', use='input frames, resized to each size')
+    args = parser.parse_args()
+
+    calibration = load_calibration(args.calibration) if args.calibration else synthetic_calibration()
+    camera_matrix, dist_coeffs, calibration_size = calibration
+
+    print(f"{'size':<10} {'method':<18} {'mean ms':>9} {'p95 ms':>9}")
+    for spec in args.sizes:
+        size = tuple(int(v) for v in spec.split('x'))
+        source = open_frame_source(args.source, size)
+        frames = read_frames(source, args.frames, size)
+        source.release()
+
+        start = time.perf_counter()
+        fixed_maps = build_maps(camera_matrix, dist_coeffs, calibration_size, size)
+        build_ms = (time.perf_counter() - start) * 1000
+        float_maps = build_maps(camera_matrix, dist_coeffs, calibration_size, size, fixed_point=False)
+        matrix = scale_camera_matrix(camera_matrix, calibration_size, size)
+        new_matrix, _ = cv2.getOptimalNewCameraMatrix(matrix, dist_coeffs, size, 0.0, size)
+
+        methods = [
+            ('undistort', lambda f: cv2.undistort(f, matrix, dist_coeffs, None, new_matrix)),
+            ('remap float32', lambda f: cv2.remap(f, float_maps[0], float_maps[1], cv2.INTER_LINEAR)),
+            ('remap fixed-point', lambda f: cv2.remap(f, fixed_maps[0], fixed_maps[1], cv2.INTER_LINEAR)),
+        ]
+        for name, function in methods:
+            mean_ms, p95_ms = time_calls(function, frames)
+            print(f"{spec:<10} {name:<18} {mean_ms:>9.2f} {p95_ms:>9.2f}")
+        table_kb = (fixed_maps[0].nbytes + fixed_maps[1].nbytes) / 1024
+        print(f"{spec:<10} one-off map build {build_ms:.1f} ms, fixed-point tables {table_kb:.0f} KB")
+
+
+if __name__ == '__main__':
+    main()
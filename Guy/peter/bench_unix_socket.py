@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Unix domain socket vs TCP loopback benchmark for local consumers.
+
+Runs the same small handler on 127.0.0.1 and on a Unix socket and measures:
+  * poll latency: one short request per connection, like a helper polling /get_distance
+  * keep-alive polls: many requests over one connection
+  * stream throughput: MJPEG frames read from /stream.mjpg
+
+    python3 bench_unix_socket.py --requests 5000 --frames 500
+    python3 bench_unix_socket.py --source test    # real JPEGs instead of random bytes
+"""
+import argparse
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from frame_sources import add_source_argument, encode_frames, open_frame_source
+from unix_http import ThreadedUnixHTTPServer
+
+FRAME_BYTES = 45000
+TCP_PORT = 8097
+FRAMES = [os.urandom(FRAME_BYTES)]  # Replaced by encoded frames with --source
+
+
+class BenchHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes; without this Nagle stalls keep-alive TCP
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/stream.mjpg':
+            self.send_response(200)
+            self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=FRAME')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            try:
+                counter = 0
+                while True:
+                    frame = FRAMES[counter % len(FRAMES)]
+                    counter += 1
+                    self.wfile.write(b'--FRAME\r\n')
+                    self.send_header('Content-Type', 'image/jpeg')
+                    self.send_header('Content-Length', len(frame))
+                    self.end_headers()
+                    self.wfile.write(frame)
+                    self.wfile.write(b'\r\n')
+            except Exception:
+                pass
+            self.close_connection = True
+        else:
+            body = b'123'
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def tcp_connect():
+    sock = socket.create_connection(('127.0.0.1', TCP_PORT))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+def make_unix_connect(path):
+    def unix_connect():
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        return sock
+    return unix_connect
+
+
+def read_response(sock_file):
+    content_length = 0
+    sock_file.readline()
+    while True:
+        line = sock_file.readline()
+        if line in (b'\r\n', b''):
+            break
+        if line.lower().startswith(b'content-length:'):
+            content_length = int(line.split(b':')[1])
+    return sock_file.read(content_length)
+
+
+def bench_polls(connect, requests):
+    """New connection per request, like a helper that opens, polls and closes."""
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        sock = connect()
+        sock.sendall(b'GET /get_distance HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n')
+        with sock.makefile('rb') as f:
+            read_response(f)
+        sock.close()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_keepalive(connect, requests):
+    sock = connect()
+    samples = []
+    with sock.makefile('rb') as f:
+        for _ in range(requests):
+            start = time.perf_counter()
+            sock.sendall(b'GET /get_distance HTTP/1.1\r\nHost: x\r\n\r\n')
+            read_response(f)
+            samples.append(time.perf_counter() - start)
+    sock.close()
+    return samples
+
+
+def bench_stream(connect, frames):
+    sock = connect()
+    sock.sendall(b'GET /stream.mjpg HTTP/1.1\r\nHost: x\r\n\r\n')
+    f = sock.makefile('rb')
+    while f.readline() not in (b'\r\n', b''):
+        pass
+    start = time.perf_counter()
+    for _ in range(frames):
+        f.readline()  # --FRAME
+        content_length = 0
+        while True:
+            line = f.readline()
+            if line == b'\r\n':
+                break
+            if line.lower().startswith(b'content-length:'):
+                content_length = int(line.split(b':')[1])
+        f.read(content_length)
+        f.readline()
+    elapsed = time.perf_counter() - start
+    f.close()
+    sock.close()
+    return frames / elapsed, frames * FRAME_BYTES / elapsed / 1e6
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    return statistics.mean(samples) * 1e6, p99 * 1e6, len(samples) / sum(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--frames', type=int, default=500)
+    add_source_argument(parser, use='JPEG payloads (default: random bytes)')
+    args = parser.parse_args()
+
+    global FRAME_BYTES
+    if args.source:
+        FRAMES[:] = encode_frames(open_frame_source(args.source), 48)
+        FRAME_BYTES = sum(len(f) for f in FRAMES) // len(FRAMES)
+
+    unix_path = os.path.join(tempfile.mkdtemp(), 'bench_web.sock')
+    tcp_server = ThreadedHTTPServer(('127.0.0.1', TCP_PORT), BenchHandler)
+    unix_server = ThreadedUnixHTTPServer(unix_path, BenchHandler)
+    for server in (tcp_server, unix_server):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    transports = [('tcp', tcp_connect), ('unix', make_unix_connect(unix_path))]
+    print(f"{'test':<22} {'transport':<9} {'mean us':>9} {'p99 us':>9} {'req/s':>9}")
+    for label, bench in (('poll (new conn)', bench_polls), ('poll (keep-alive)', bench_keepalive)):
+        for name, connect in transports:
+            bench(connect, 200)  # Warm up
+            mean, p99, rate = summarize(bench(connect, args.requests))
+            print(f"{label:<22} {name:<9} {mean:>9.0f} {p99:>9.0f} {rate:>9.0f}")
+    print(f"\n{'test':<22} {'transport':<9} {'fps':>9} {'MB/s':>9}")
+    for name, connect in transports:
+        fps, mbps = bench_stream(connect, args.frames)
+        print(f"{'stream.mjpg':<22} {name:<9} {fps:>9.0f} {mbps:>9.1f}")
+
+    tcp_server.shutdown()
+    unix_server.shutdown()
+    unix_server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Chessboard calibration for undistort.py.
+
+Print a chessboard (default 9x6 inner corners, 25 mm squares), then either
+capture views live - hold the board at different distances, angles and in the
+corners of the picture:
+
+    python3 calibrate_camera.py --source camera:0 --samples 20
+
+or calibrate from photos taken earlier:
+
+    python3 calibrate_camera.py --images calibration_data/shots/
+
+Live mode keeps a frame every --interval seconds when the board is found, and
+saves the kept frames to calibration_data/shots/ so the run can be repeated.
+The result is written to calibration_data/camera.npz (see UNDISTORT_CALIBRATION
+in web_fixed.py).
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from frame_sources import open_frame_source
+from undistort import save_calibration
+
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+
+def find_corners(gray, board):
+    found, corners = cv2.findChessboardCorners(
+        gray, board, cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FAST_CHECK)
+    if not found:
+        return None
+    return cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), SUBPIX_CRITERIA)
+
+
+def capture_views(source, board, samples, interval, shots_dir):
+    """Keep frames where the board is visible, at most one per `interval` seconds."""
+    views = []
+    last_kept = 0.0
+    os.makedirs(shots_dir, exist_ok=True)
+    print(f"Looking for a {board[0]}x{board[1]} chessboard, need {samples} views...")
+    while len(views) < samples:
+        ret, frame = source.read()
+        if not ret:
+            break
+        now = time.time()
+        if now - last_kept < interval:
+            continue
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        corners = find_corners(gray, board)
+        if corners is None:
+            continue
+        last_kept = now
+        views.append((gray.shape[::-1], corners))
+        cv2.imwrite(os.path.join(shots_dir, f"shot_{len(views):03d}.jpg"), frame)
+        print(f"  view {len(views)}/{samples}")
+    return views
+
+
+def load_views(directory, board):
+    views = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.jpg')) + glob.glob(os.path.join(directory, '*.png'))):
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            continue
+        corners = find_corners(image, board)
+        print(f"  {os.path.basename(path)}: {'found' if corners is not None else 'no board'}")
+        if corners is not None:
+            views.append((image.shape[::-1], corners))
+    return views
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', default='camera:0', help='Frame source spec for live capture')
+    parser.add_argument('--images', help='Calibrate from the images in this directory instead')
+    parser.add_argument('--board', default='9x6', help='Inner corners per row x per column')
+    parser.add_argument('--square', type=float, default=25.0, help='Square size in mm')
+    parser.add_argument('--samples', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=1.5, help='Seconds between kept live views')
+    parser.add_argument('--output', default=os.path.join('calibration_data', 'camera.npz'))
+    args = parser.parse_args()
+
+    board = tuple(int(v) for v in args.board.lower().split('x'))
+    if args.images:
+        views = load_views(args.images, board)
+    else:
+        source = open_frame_source(args.source)
+        try:
+            views = capture_views(source, board, args.samples, args.interval,
+                                  os.path.join(os.path.dirname(args.output) or '.', 'shots'))
+        finally:
+            source.release()
+    if len(views) < 5:
+        print(f"Only {len(views)} usable views, need at least 5")
+        return
+
+    image_size = views[0][0]
+    object_points = np.zeros((board[0] * board[1], 3), np.float32)
+    object_points[:, :2] = np.mgrid[0:board[0], 0:board[1]].T.reshape(-1, 2) * args.square
+    rms, camera_matrix, dist_coeffs, _, _ = cv2.calibrateCamera(
+        [object_points] * len(views), [corners for _, corners in views], image_size, None, None)
+
+    save_calibration(args.output, camera_matrix, dist_coeffs, image_size, rms)
+    print(f"RMS reprojection error: {rms:.3f} px (below ~0.5 px is good)")
+    print(f"Camera matrix:\n{camera_matrix}\nDistortion: {dist_coeffs.ravel()}")
+    print(f"Saved {args.output}")
+
+
+if __name__ == '__main__':
+    main()
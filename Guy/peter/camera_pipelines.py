@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Extra camera pipelines next to the main stream, and an on-demand
+picture-in-picture composite.
+
+web_fixed.py's stream_camera() runs the full pipeline (stabilization,
+analysis, HUD...) for the main (driving) camera. Each entry of EXTRA_CAMERAS
+gets a CameraPipeline here: its own thread, frame source, resolution, frame
+rate and JPEG quality, and its own output. Every camera, the main one
+included, is served at /stream/<name>.mjpg.
+
+PipCompositor puts one camera as an inset into another. It is only built
+while someone watches /stream/pip.mjpg: the first viewer starts its thread,
+and the thread stops when the last viewer leaves, so it costs nothing
+otherwise.
+
+FrameStats measures each pipeline: achieved fps over the last few seconds and
+CPU time per frame, from time.thread_time() (the pipeline thread's own CPU
+time, so other threads do not count). cpu_pct is that CPU time as a share of
+one core.
+"""
+import collections
+import threading
+import time
+
+import cv2
+
+from frame_sources import open_frame_source
+
+
+class FrameOutput:
+    """Newest JPEG of one pipeline, with a condition the MJPEG handlers wait on (like StreamingOutput)."""
+    def __init__(self):
+        self.frame = None
+        self.condition = threading.Condition()
+
+    def write(self, buf):
+        with self.condition:
+            self.frame = buf
+            self.condition.notify_all()
+
+
+class FrameStats:
+    def __init__(self, window_s=5.0):
+        self.window_s = window_s
+        self.samples = collections.deque()  # (wall time, cpu seconds) per frame
+        self.frames = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Call at the start of a frame from the pipeline's own thread; pass the result to end()."""
+        return time.thread_time()
+
+    def end(self, cpu_start):
+        now = time.monotonic()
+        with self.lock:
+            self.samples.append((now, time.thread_time() - cpu_start))
+            self.frames += 1
+            while self.samples and now - self.samples[0][0] > self.window_s:
+                self.samples.popleft()
+
+    def get_stats(self):
+        with self.lock:
+            samples = list(self.samples)
+            frames = self.frames
+        if len(samples) < 2:
+            return {'frames': frames, 'fps': 0.0, 'cpu_ms': 0.0, 'cpu_pct': 0.0}
+        duration = samples[-1][0] - samples[0][0]
+        cpu = sum(c for _, c in samples[1:])
+        return {
+            'frames': frames,
+            'fps': round((len(samples) - 1) / duration, 1) if duration > 0 else 0.0,
+            'cpu_ms': round(1000 * cpu / (len(samples) - 1), 2),
+            'cpu_pct': round(100 * cpu / duration, 1) if duration > 0 else 0.0,
+        }
+
+
+class CameraPipeline(threading.Thread):
+    def __init__(self, name, source, resolution=(640, 480), framerate=24, quality=80):
+        """
+        :param source: Frame source spec (see frame_sources.py), e.g. 'camera:1'.
+        :param resolution: Capture and stream size.
+        :param quality: JPEG quality of this stream.
+        """
+        super().__init__(daemon=True)
+        self.name = name
+        self.source_spec = source
+        self.resolution = tuple(resolution)
+        self.framerate = framerate
+        self.quality = quality
+        self.output = FrameOutput()
+        self.stats = FrameStats()
+        self.latest_frame = None  # Newest BGR frame, for the PiP composite
+        self.running = True
+        self.camera = None
+
+    def run(self):
+        self.camera = camera = open_frame_source(self.source_spec, self.resolution)
+        print(f"Camera '{self.name}': {camera.describe()}")
+        error_count = 0
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        while self.running:
+            start_time = time.time()
+            cpu_start = self.stats.start()
+            try:
+                ret, frame = camera.read()
+                if not ret:
+                    error_count += 1
+                    if error_count > 10:
+                        camera = self.camera = camera.reopen()
+                        error_count = 0
+                    time.sleep(0.1)
+                    continue
+                error_count = 0
+                if (frame.shape[1], frame.shape[0]) != self.resolution:
+                    frame = cv2.resize(frame, self.resolution, interpolation=cv2.INTER_AREA)
+                self.latest_frame = frame
+                ok, jpeg = cv2.imencode('.jpg', frame, params)
+                if ok:
+                    self.output.write(jpeg.tobytes())
+                self.stats.end(cpu_start)
+            except Exception as e:
+                print(f"Camera '{self.name}' error: {e}")
+                time.sleep(0.1)
+            time.sleep(max(0.0, 1.0 / self.framerate - (time.time() - start_time)))
+        camera.release()
+
+    def stop(self):
+        self.running = False
+
+
+class PipCompositor:
+    def __init__(self, main_frame, inset_frame, framerate=15, quality=75, inset_scale=0.3, margin=10):
+        """
+        :param main_frame: Callable returning the newest BGR frame of the main picture (or None).
+        :param inset_frame: Callable returning the newest BGR frame of the inset (or None).
+        :param inset_scale: Inset width as a fraction of the main picture's width.
+        """
+        self.main_frame = main_frame
+        self.inset_frame = inset_frame
+        self.framerate = framerate
+        self.quality = quality
+        self.inset_scale = inset_scale
+        self.margin = margin
+        self.output = FrameOutput()
+        self.stats = FrameStats()
+        self.lock = threading.Lock()
+        self.viewers = 0
+        self.thread = None
+
+    def acquire(self):
+        """A viewer connected; starts compositing if it is the first."""
+        with self.lock:
+            self.viewers += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+                print("PiP composite started")
+
+    def release(self):
+        with self.lock:
+            self.viewers -= 1
+
+    def _run(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        while True:
+            with self.lock:
+                if self.viewers <= 0:
+                    self.thread = None
+                    print("PiP composite stopped (no viewers)")
+                    return
+            start_time = time.time()
+            cpu_start = self.stats.start()
+            main, inset = self.main_frame(), self.inset_frame()
+            if main is not None:
+                composite = main.copy()
+                if inset is not None:
+                    self._place_inset(composite, inset)
+                ok, jpeg = cv2.imencode('.jpg', composite, params)
+                if ok:
+                    self.output.write(jpeg.tobytes())
+                self.stats.end(cpu_start)
+            time.sleep(max(0.0, 1.0 / self.framerate - (time.time() - start_time)))
+
+    def _place_inset(self, composite, inset):
+        height, width = composite.shape[:2]
+        inset_width = int(width * self.inset_scale)
+        inset_height = int(inset_width * inset.shape[0] / inset.shape[1])
+        small = cv2.resize(inset, (inset_width, inset_height), interpolation=cv2.INTER_AREA)
+        x = width - inset_width - self.margin
+        y = self.margin
+        composite[y:y + inset_height, x:x + inset_width] = small
+        cv2.rectangle(composite, (x - 1, y - 1), (x + inset_width, y + inset_height), (255, 255, 255), 1)
+
+    def get_stats(self):
+        stats = self.stats.get_stats()
+        stats['viewers'] = self.viewers
+        stats['active'] = self.thread is not None
+        return stats
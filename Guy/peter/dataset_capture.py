@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Dataset capture: sampled frames paired with the operator's controls and telemetry.
+
+For training driving and aiming models from real sessions. While a capture
+runs, stream_camera() offers every clean frame (before overlays) with the
+current labels; DatasetCapture takes one every 1/sample_fps seconds:
+
+  - optional blur rejection: variance of the Laplacian of the 1/2-scale grey
+    view from FrameViews (shared, so usually already computed), below
+    blur_threshold = motion-blurred or out of focus, skipped;
+  - the frame is copied into a bounded queue and the streaming thread moves
+    on. If the workers fall behind, samples are dropped, never stream frames.
+
+A pool of worker threads JPEG-encodes the samples (cv2.imencode releases the
+GIL) and appends them to sharded files. Each worker writes its own shard, so
+they never contend for a file:
+
+    datasets/<session>/shard-<worker>-<n>.jpgs   concatenated JPEGs
+    datasets/<session>/manifest.jsonl            one line per sample
+
+A manifest line holds the shard name, byte offset and length of the JPEG, so
+any sample can be read with one seek (read_sample()), plus the frame ID,
+capture time, sharpness and the labels: the last /tank_command values (FR, LR,
+UD, TLR, FC, LC) with their age, and the telemetry (distance, motor speeds,
+zoom). Shards rotate after shard_samples samples.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+MANIFEST_NAME = 'manifest.jsonl'
+
+
+def sharpness(views):
+    """Variance of the Laplacian on the 1/2-scale grey view; low = blurred."""
+    _, std = cv2.meanStdDev(cv2.Laplacian(views.gray_level(1), cv2.CV_16S, ksize=3))
+    return float(std[0][0]) ** 2
+
+
+class DatasetCapture:
+    def __init__(self, directory, sample_fps=4.0, blur_threshold=None, shard_samples=1000, workers=2,
+                 jpeg_quality=90, queue_samples=16):
+        """
+        :param directory: Parent directory; each capture session gets its own sub-directory.
+        :param sample_fps: Samples per second taken from the stream.
+        :param blur_threshold: Minimum Laplacian variance to keep a frame (None = keep all).
+        :param shard_samples: Samples per shard file before rotating.
+        :param workers: Encoder/writer threads.
+        :param queue_samples: Samples waiting for the workers before new ones are dropped.
+        """
+        self.interval = 1.0 / sample_fps
+        self.blur_threshold = blur_threshold
+        self.shard_samples = shard_samples
+        self.jpeg_quality = jpeg_quality
+        self.session = time.strftime('session-%Y%m%d-%H%M%S')
+        self.directory = os.path.join(directory, self.session)
+        os.makedirs(self.directory, exist_ok=True)
+        self.queue = queue.Queue(maxsize=queue_samples)
+        self.manifest_lock = threading.Lock()
+        self.manifest = open(os.path.join(self.directory, MANIFEST_NAME), 'a')
+        self.next_due = 0.0
+        self.running = True
+        self.workers = [threading.Thread(target=self._worker, args=(index,), daemon=True) for index in range(workers)]
+        for worker in self.workers:
+            worker.start()
+        # Stats
+        self.offered = 0
+        self.sampled = 0
+        self.blurry = 0
+        self.dropped = 0
+        self.written = 0
+        self.bytes_written = 0
+        self.check_ms = 0.0
+        self.started = time.time()
+
+    def submit(self, frame, views, labels):
+        """
+        Called from stream_camera() for every frame; returns at once unless a sample is due.
+
+        :param frame: Clean BGR frame (before overlays); copied only when sampled.
+        :param labels: Dict of controls and telemetry for this frame (built only when a sample is due).
+        """
+        self.offered += 1
+        now = time.monotonic()
+        if not self.running or now < self.next_due:
+            return
+        self.next_due = now + self.interval
+        score = None
+        if self.blur_threshold is not None:
+            start = time.perf_counter()
+            score = sharpness(views)
+            self.check_ms += (time.perf_counter() - start) * 1000
+            if score < self.blur_threshold:
+                self.blurry += 1
+                return
+        sample = (frame.copy(), views.frame_id, views.timestamp or time.time(), score,
+                  labels() if callable(labels) else labels)
+        try:
+            self.queue.put_nowait(sample)
+            self.sampled += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _worker(self, index):
+        shard_number = 0
+        shard = None
+        shard_name = None
+        count = 0
+        while True:
+            sample = self.queue.get()
+            if sample is None:
+                break
+            frame, frame_id, timestamp, score, labels = sample
+            ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ok:
+                continue
+            if shard is None or count >= self.shard_samples:
+                if shard is not None:
+                    shard.close()
+                shard_name = f"shard-{index:02d}-{shard_number:05d}.jpgs"
+                shard = open(os.path.join(self.directory, shard_name), 'ab')
+                shard_number += 1
+                count = 0
+            offset = shard.tell()
+            shard.write(jpeg.tobytes())
+            shard.flush()
+            count += 1
+            entry = {
+                'shard': shard_name,
+                'offset': offset,
+                'length': int(jpeg.size),
+                'frame_id': frame_id,
+                'time': round(timestamp, 3),
+                'size': [frame.shape[1], frame.shape[0]],
+                'sharpness': round(score, 1) if score is not None else None,
+            }
+            entry.update(labels)
+            with self.manifest_lock:
+                self.manifest.write(json.dumps(entry) + '\n')
+                self.manifest.flush()
+                self.written += 1
+                self.bytes_written += int(jpeg.size)
+        if shard is not None:
+            shard.close()
+
+    def stop(self):
+        """Finish the queued samples and close the files."""
+        if not self.running:
+            return
+        self.running = False
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout=5)
+        with self.manifest_lock:
+            self.manifest.close()
+        print(f"Dataset capture {self.session}: {self.written} samples, {self.bytes_written / 1e6:.1f} MB")
+
+    def get_stats(self):
+        return {
+            'session': self.session,
+            'running': self.running,
+            'seconds': round(time.time() - self.started, 1),
+            'offered': self.offered,
+            'sampled': self.sampled,
+            'skipped_blurry': self.blurry,
+            'dropped': self.dropped,
+            'written': self.written,
+            'megabytes': round(self.bytes_written / 1e6, 2),
+            'queued': self.queue.qsize(),
+            'blur_check_ms': round(self.check_ms / (self.sampled + self.blurry), 3) if self.sampled + self.blurry else 0.0,
+        }
+
+
+def load_manifest(session_directory):
+    """All manifest entries of a capture session, in write order."""
+    with open(os.path.join(session_directory, MANIFEST_NAME)) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def read_sample(session_directory, entry):
+    """JPEG bytes of one manifest entry (one seek, one read)."""
+    with open(os.path.join(session_directory, entry['shard']), 'rb') as f:
+        f.seek(entry['offset'])
+        return f.read(entry['length'])
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Server-side digital zoom: crop the region of interest from the capture before
+anything is resized or encoded.
+
+Zooming in the browser only enlarges the pixels the Pi already sent. Here the
+crop is taken from the capture frame (CAPTURE_RESOLUTION in web_fixed.py,
+which can be larger than the stream RESOLUTION):
+
+  - if the crop is larger than the stream size it is scaled down to it, so a
+    high-resolution capture gives the zoomed view real detail;
+  - otherwise it is kept at its native size and never upscaled, so the JPEG
+    shrinks with the zoom (the browser's <img> scales it to the same size on
+    screen).
+
+Zoom and centre are set by /stream.mjpg?zoom=2&cx=..&cy=.. or /zoom and take
+effect on the next frame, without restarting the stream. cx, cy are in stream
+pixels of the unzoomed view (RESOLUTION), default the centre; the crop is
+shifted to stay inside the frame.
+"""
+import math
+import threading
+
+import cv2
+import numpy as np
+
+
+def _finite(value):
+    """float(value), or a ValueError for anything that is not a finite number (nan, inf)."""
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"Expected a finite number, got {value!r}")
+    return number
+
+
+class DigitalZoom:
+    def __init__(self, output_size, max_zoom=8.0):
+        """
+        :param output_size: (width, height) of the stream at zoom 1 (RESOLUTION).
+        :param max_zoom: Largest zoom accepted.
+        """
+        self.output_size = tuple(output_size)
+        self.max_zoom = max_zoom
+        self.lock = threading.Lock()
+        self.zoom = 1.0
+        self.centre = (output_size[0] / 2.0, output_size[1] / 2.0)
+        self.box = None  # Last crop (x0, y0, x1, y1) in capture pixels
+        self.last_output = tuple(output_size)
+
+    def set(self, zoom=None, cx=None, cy=None):
+        """
+        Runtime changes from the HTTP threads; take effect on the next frame.
+        A ValueError (nothing changed) if any value is not a finite number.
+        """
+        # Parse everything first: a bad cy must not leave a new zoom half applied
+        zoom, cx, cy = (None if value is None else _finite(value) for value in (zoom, cx, cy))
+        with self.lock:
+            if zoom is not None:
+                self.zoom = min(max(zoom, 1.0), self.max_zoom)
+            if cx is not None or cy is not None:
+                x, y = self.centre
+                self.centre = (min(max(cx if cx is not None else x, 0.0), self.output_size[0]),
+                               min(max(cy if cy is not None else y, 0.0), self.output_size[1]))
+
+    def active(self):
+        return self.zoom > 1.0
+
+    def crop_box(self, frame_shape):
+        """(x0, y0, x1, y1) of the crop in capture pixels for the current zoom and centre."""
+        height, width = frame_shape[:2]
+        with self.lock:
+            zoom, (cx, cy) = self.zoom, self.centre
+        # Stream pixels -> capture pixels
+        cx *= width / float(self.output_size[0])
+        cy *= height / float(self.output_size[1])
+        crop_w = max(2, int(round(width / zoom))) & ~1
+        crop_h = max(2, int(round(height / zoom))) & ~1
+        x0 = int(round(min(max(cx - crop_w / 2.0, 0), width - crop_w)))
+        y0 = int(round(min(max(cy - crop_h / 2.0, 0), height - crop_h)))
+        return x0, y0, x0 + crop_w, y0 + crop_h
+
+    def apply(self, frame):
+        """The zoomed frame: at most output_size, never upscaled."""
+        height, width = frame.shape[:2]
+        if not self.active():
+            self.box = None
+            if (width, height) == self.output_size:
+                return frame
+            return cv2.resize(frame, self.output_size, interpolation=cv2.INTER_AREA)
+        x0, y0, x1, y1 = self.box = self.crop_box(frame.shape)
+        crop = frame[y0:y1, x0:x1]
+        if x1 - x0 > self.output_size[0]:
+            crop = cv2.resize(crop, self.output_size, interpolation=cv2.INTER_AREA)
+        else:
+            crop = np.ascontiguousarray(crop)
+        self.last_output = (crop.shape[1], crop.shape[0])
+        return crop
+
+    def get_state(self):
+        with self.lock:
+            zoom, centre = self.zoom, self.centre
+        return {
+            'zoom': round(zoom, 3),
+            'cx': round(centre[0], 1),
+            'cy': round(centre[1], 1),
+            'crop': list(self.box) if self.box is not None else None,
+            'output': list(self.last_output if zoom > 1.0 else self.output_size),
+        }
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Ordered filter chain for stream_camera(), compatible with mjpg-streamer's
+cvfilter_py filters (input_opencv/filters/cvfilter_py/example_filter.py).
+
+A filter is a Python file defining init_filter(), which returns a callable
+process(img) -> img working on a BGR NumPy frame. Optional module-level
+declarations:
+
+    FILTER_SCALE = 0.25      run on a downscaled copy (analysis only: whatever
+                             the filter returns is ignored, the streamed frame
+                             is not modified). 1/2, 1/4 and 1/8 come from the
+                             frame's shared FrameViews pyramid, so the filter
+                             must treat its input as read-only
+    FILTER_BUDGET_MS = 4.0   per-frame time budget (default: the chain's budget)
+
+Each call is timed. A filter that overruns its budget on OVERRUN_LIMIT
+consecutive frames (or raises) is bypassed for BYPASS_SECONDS and then given
+another chance, so one slow filter cannot drag down the stream rate.
+"""
+import importlib.util
+import os
+import threading
+import time
+
+import cv2
+
+OVERRUN_LIMIT = 5
+BYPASS_SECONDS = 10.0
+
+
+class StreamFilter:
+    def __init__(self, name, process, budget_ms, scale=1.0):
+        self.name = name
+        self.process = process
+        self.budget_ms = budget_ms
+        self.scale = scale
+        # Stats
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+        self.overruns = 0
+        self.errors = 0
+        self.bypass_count = 0
+        self.consecutive_overruns = 0
+        self.bypassed_until = 0.0
+
+    def record(self, elapsed_ms, failed=False):
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        self.last_ms = elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if failed or elapsed_ms > self.budget_ms:
+            self.overruns += 1
+            self.consecutive_overruns += 1
+            if failed or self.consecutive_overruns >= OVERRUN_LIMIT:
+                self.bypassed_until = time.monotonic() + BYPASS_SECONDS
+                self.bypass_count += 1
+                self.consecutive_overruns = 0
+                print(f"Filter '{self.name}' bypassed for {BYPASS_SECONDS:.0f}s "
+                      f"({'error' if failed else f'{elapsed_ms:.1f} ms > {self.budget_ms:.1f} ms budget'})")
+        else:
+            self.consecutive_overruns = 0
+
+    def is_bypassed(self):
+        return time.monotonic() < self.bypassed_until
+
+    def get_stats(self):
+        return {
+            'name': self.name,
+            'scale': self.scale,
+            'budget_ms': self.budget_ms,
+            'calls': self.calls,
+            'mean_ms': round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            'last_ms': round(self.last_ms, 3),
+            'max_ms': round(self.max_ms, 3),
+            'overruns': self.overruns,
+            'errors': self.errors,
+            'bypass_count': self.bypass_count,
+            'bypassed': self.is_bypassed(),
+        }
+
+
+def load_filter(path, default_budget_ms):
+    """Import a cvfilter_py-style module from a file path and wrap its process callable."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(f"stream_filter_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    process = module.init_filter()
+    if not callable(process):
+        raise TypeError(f"init_filter() in {path} must return a callable")
+    budget_ms = float(getattr(module, 'FILTER_BUDGET_MS', default_budget_ms))
+    scale = float(getattr(module, 'FILTER_SCALE', 1.0))
+    return StreamFilter(name, process, budget_ms, scale)
+
+
+class FilterChain:
+    def __init__(self, filters=None):
+        self.filters = list(filters or [])
+        self.lock = threading.Lock()
+        self.last_total_ms = 0.0
+
+    @classmethod
+    def from_paths(cls, paths, default_budget_ms):
+        filters = []
+        for path in paths:
+            try:
+                stream_filter = load_filter(path, default_budget_ms)
+                filters.append(stream_filter)
+                print(f"Loaded filter '{stream_filter.name}' (budget {stream_filter.budget_ms} ms, "
+                      f"scale {stream_filter.scale})")
+            except Exception as e:
+                print(f"Error loading filter {path}: {e}")
+        return cls(filters)
+
+    def process(self, frame, views=None):
+        """
+        Run every active filter in order; returns the (possibly replaced) frame.
+
+        :param views: FrameViews for this frame (frame_views.py); scaled filters then
+                      share its pyramid levels instead of resizing on their own.
+        """
+        chain_start = time.perf_counter()
+        with self.lock:
+            filters = list(self.filters)
+        for stream_filter in filters:
+            if stream_filter.is_bypassed():
+                continue
+            start = time.perf_counter()
+            failed = False
+            try:
+                if stream_filter.scale < 1.0:
+                    small = views.scaled(stream_filter.scale) if views is not None else None
+                    if small is None:
+                        small = cv2.resize(frame, None, fx=stream_filter.scale, fy=stream_filter.scale,
+                                           interpolation=cv2.INTER_AREA)
+                    stream_filter.process(small)
+                else:
+                    result = stream_filter.process(frame)
+                    if result is not None:
+                        frame = result
+            except Exception as e:
+                failed = True
+                stream_filter.errors += 1
+                print(f"Filter '{stream_filter.name}' error: {e}")
+            stream_filter.record((time.perf_counter() - start) * 1000, failed)
+        self.last_total_ms = (time.perf_counter() - chain_start) * 1000
+        return frame
+
+    def get_stats(self):
+        with self.lock:
+            filters = list(self.filters)
+        return {
+            'last_total_ms': round(self.last_total_ms, 3),
+            'filters': [f.get_stats() for f in filters],
+        }
+
+    def summary(self):
+        parts = [f"{f.name} {f.total_ms / f.calls if f.calls else 0:.1f}ms{' (bypassed)' if f.is_bypassed() else ''}"
+                 for f in self.filters]
+        return ', '.join(parts)
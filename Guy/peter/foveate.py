@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Foveated streaming profile: full detail around the crosshair, reduced periphery.
+
+Aiming only needs detail near the crosshair, but the frame edges carry most of
+the JPEG bytes. The foveated profile keeps a central region (the fovea, a
+fraction of the frame width and height) untouched, and replaces the rest with a
+low-resolution copy (downsampled then scaled back up, or Gaussian blurred).
+Smooth areas cost the JPEG encoder very little, so the frame gets much smaller
+at the same JPEG_QUALITY while the centre looks the same.
+
+The fovea size and the profile itself can be changed at runtime
+(/stream_profile). To measure what it saves, every measure_every frames
+stream_camera() also encodes the unmodified frame and records both sizes;
+get_stats() reports the average saving on those paired frames.
+"""
+import collections
+import math
+import threading
+
+import cv2
+
+
+class Foveator:
+    def __init__(self, fovea=0.4, periphery_scale=0.25, periphery='downsample', measure_every=48, enabled=True):
+        """
+        :param fovea: Size of the full-detail centre, as a fraction of the frame width and height.
+        :param periphery_scale: Resolution kept outside the fovea ('downsample'), e.g. 0.25 = 1/4.
+        :param periphery: 'downsample' or 'blur'.
+        :param measure_every: Encode the standard frame too every N frames, to measure the saving (0 = never).
+        """
+        self.lock = threading.Lock()
+        self.enabled = enabled
+        self.fovea = fovea
+        self.periphery_scale = periphery_scale
+        self.periphery = periphery
+        self.measure_every = measure_every
+        self.frames = 0
+        self.foveated_bytes = 0
+        self.samples = collections.deque(maxlen=50)  # (standard bytes, foveated bytes) for the same frame
+
+    def configure(self, enabled=None, fovea=None, periphery_scale=None, periphery=None):
+        """
+        Runtime changes from the HTTP threads; take effect on the next frame.
+        A ValueError (nothing changed) for a non-finite fovea or periphery_scale, or an unknown periphery.
+        """
+        # Checked before anything is applied; a NaN would pass the clamping and break every apply()
+        if fovea is not None:
+            fovea = float(fovea)
+            if not math.isfinite(fovea):
+                raise ValueError("fovea must be a number")
+        if periphery_scale is not None:
+            periphery_scale = float(periphery_scale)
+            if not math.isfinite(periphery_scale):
+                raise ValueError("scale must be a number")
+        if periphery is not None and periphery not in ('downsample', 'blur'):
+            raise ValueError("periphery must be 'downsample' or 'blur'")
+        with self.lock:
+            if enabled is not None:
+                self.enabled = enabled
+            if fovea is not None:
+                self.fovea = min(max(fovea, 0.05), 1.0)
+            if periphery_scale is not None:
+                self.periphery_scale = min(max(periphery_scale, 0.05), 1.0)
+            if periphery is not None:
+                self.periphery = periphery
+            if (enabled, fovea, periphery_scale, periphery) != (None, None, None, None):
+                self.samples.clear()  # Measurements were for the old settings
+
+    def fovea_box(self, shape):
+        """(x0, y0, x1, y1) of the full-detail centre for a frame of this shape."""
+        height, width = shape[:2]
+        fw = int(width * self.fovea) & ~1
+        fh = int(height * self.fovea) & ~1
+        x0 = (width - fw) // 2
+        y0 = (height - fh) // 2
+        return x0, y0, x0 + fw, y0 + fh
+
+    def apply(self, frame):
+        """The foveated frame (a new array; the input is left as it is)."""
+        height, width = frame.shape[:2]
+        with self.lock:
+            periphery, scale = self.periphery, self.periphery_scale
+            x0, y0, x1, y1 = self.fovea_box(frame.shape)
+        if x1 - x0 >= width and y1 - y0 >= height:
+            return frame
+        if periphery == 'blur':
+            k = max(3, int(round(1.0 / scale)) * 2 + 1)
+            out = cv2.GaussianBlur(frame, (k, k), 0)
+        else:
+            small = cv2.resize(frame, (max(1, int(width * scale)), max(1, int(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+            out = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+        out[y0:y1, x0:x1] = frame[y0:y1, x0:x1]
+        return out
+
+    def should_measure(self):
+        """True on the frames where the standard profile should be encoded too."""
+        self.frames += 1
+        return self.measure_every > 0 and self.frames % self.measure_every == 0
+
+    def record(self, foveated_bytes, standard_bytes=None):
+        self.foveated_bytes += foveated_bytes
+        if standard_bytes is not None:
+            self.samples.append((standard_bytes, foveated_bytes))
+
+    def get_stats(self):
+        samples = list(self.samples)
+        standard = sum(s for s, _ in samples) / len(samples) if samples else 0
+        foveated = sum(f for _, f in samples) / len(samples) if samples else 0
+        return {
+            'profile': 'foveated' if self.enabled else 'standard',
+            'fovea': self.fovea,
+            'periphery': self.periphery,
+            'periphery_scale': self.periphery_scale,
+            'frames': self.frames,
+            'measured_frames': len(samples),
+            'standard_bytes': int(standard),
+            'foveated_bytes': int(foveated),
+            'saved_pct': round(100.0 * (1 - foveated / standard), 1) if standard else None,
+        }
+
+    def summary(self):
+        stats = self.get_stats()
+        if stats['saved_pct'] is None:
+            return f"fovea {stats['fovea']:.0%}, no measurement yet"
+        return (f"fovea {stats['fovea']:.0%}: {stats['foveated_bytes']} vs {stats['standard_bytes']} bytes/frame, "
+                f"{stats['saved_pct']}% saved")
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Pluggable frame sources for stream_camera() and the benchmarks.
+
+Every source behaves like cv2.VideoCapture for the calls stream_camera() makes
+(read(), release(), isOpened()) and adds reopen() for error recovery, so the
+pipeline can be load-tested and profiled on a machine without a camera.
+
+Sources are chosen with a spec string (FRAME_SOURCE in web_fixed.py or
+--source in the bench_*.py scripts):
+
+    camera:0                  V4L2/OpenCV camera index 0
+    file:run.mp4              replay a video at its native rate
+    file:run.mp4@4            ... at 4x speed
+    file:run.mp4@0            ... as fast as it decodes (no pacing)
+    test                      synthetic moving test pattern at 640x480, 24 fps
+    test:1280x720@30          ... at another size / rate
+    jpegdir:frames/           JPEG files from a directory, sorted by name, 24 fps
+    jpegdir:frames/@10        ... at 10 fps (0 = no pacing)
+"""
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+DEFAULT_RESOLUTION = (640, 480)
+DEFAULT_FPS = 24
+
+
+class FrameSource:
+    """Base class: subclasses implement _read() returning a BGR frame or None."""
+    def __init__(self, fps=None):
+        self.fps = fps  # None or 0 = do not pace
+        self.frames_read = 0
+        self._next_frame_time = None
+
+    def _pace(self):
+        if not self.fps:
+            return
+        now = time.monotonic()
+        if self._next_frame_time is None or now - self._next_frame_time > 1.0:
+            self._next_frame_time = now  # First frame, or we fell far behind: resync
+        delay = self._next_frame_time - now
+        if delay > 0:
+            time.sleep(delay)
+        self._next_frame_time += 1.0 / self.fps
+
+    def read(self):
+        self._pace()
+        frame = self._read()
+        if frame is None:
+            return False, None
+        self.frames_read += 1
+        return True, frame
+
+    def _read(self):
+        raise NotImplementedError
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+    def reopen(self):
+        """Return a working source after read() failures (may be self)."""
+        return self
+
+    def describe(self):
+        return self.__class__.__name__
+
+
+class CameraSource(FrameSource):
+    """Live camera. The driver paces frames, so no software pacing."""
+    def __init__(self, index=0, resolution=DEFAULT_RESOLUTION):
+        super().__init__(fps=None)
+        self.index = index
+        self.resolution = resolution
+        self.capture = self._open()
+
+    def _open(self):
+        # Prefer V4L2 on Linux, fall back to whatever OpenCV picks
+        capture = cv2.VideoCapture(self.index, cv2.CAP_V4L2) if hasattr(cv2, 'CAP_V4L2') else None
+        if capture is None or not capture.isOpened():
+            capture = cv2.VideoCapture(self.index)
+        if capture.isOpened():
+            capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
+            capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
+        return capture
+
+    def read(self):
+        ret, frame = self.capture.read()
+        if ret:
+            self.frames_read += 1
+        return ret, frame
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def release(self):
+        self.capture.release()
+
+    def reopen(self):
+        self.capture.release()
+        time.sleep(1)
+        self.capture = self._open()
+        return self
+
+    def describe(self):
+        width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        return f"camera {self.index} ({width}x{height})"
+
+
+class VideoFileSource(FrameSource):
+    """Replays a video file, looping, at its native rate times `speed`."""
+    def __init__(self, path, speed=1.0, loop=True):
+        self.path = path
+        self.loop = loop
+        self.capture = cv2.VideoCapture(path)
+        native_fps = self.capture.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+        super().__init__(fps=native_fps * speed if speed else None)
+
+    def _read(self):
+        ret, frame = self.capture.read()
+        if not ret and self.loop:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.capture.read()
+        return frame if ret else None
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def release(self):
+        self.capture.release()
+
+    def reopen(self):
+        self.capture.release()
+        self.capture = cv2.VideoCapture(self.path)
+        return self
+
+    def describe(self):
+        pacing = f"{self.fps:.1f} fps" if self.fps else "unpaced"
+        return f"video file {self.path} ({pacing})"
+
+
+class TestPatternSource(FrameSource):
+    """
+    Synthetic moving test pattern, like mjpg-streamer's input_testpicture.
+    Colour bars and a grid are rendered once; each frame only copies them and
+    draws a moving box and a frame counter, so the source itself is cheap.
+    """
+    BAR_COLOURS = [(255, 255, 255), (0, 255, 255), (255, 255, 0), (0, 255, 0),
+                   (255, 0, 255), (0, 0, 255), (255, 0, 0), (0, 0, 0)]
+
+    def __init__(self, resolution=DEFAULT_RESOLUTION, fps=DEFAULT_FPS):
+        super().__init__(fps=fps)
+        self.resolution = resolution
+        width, height = resolution
+        background = np.zeros((height, width, 3), dtype=np.uint8)
+        bar_width = width / len(self.BAR_COLOURS)
+        for i, colour in enumerate(self.BAR_COLOURS):
+            background[:height * 2 // 3, int(i * bar_width):int((i + 1) * bar_width)] = colour
+        ramp = np.linspace(0, 255, width, dtype=np.uint8)
+        background[height * 2 // 3:] = ramp[np.newaxis, :, np.newaxis]
+        background[::40, :] = 128
+        background[:, ::40] = 128
+        self.background = background
+
+    def _read(self):
+        width, height = self.resolution
+        n = self.frames_read
+        # Callers may keep or modify the frame, so every frame is a fresh copy
+        frame = self.background.copy()
+        box = max(height // 8, 8)
+        x = int((width - box) * (0.5 + 0.5 * np.sin(n * 0.05)))
+        y = int((height - box) * (0.5 + 0.5 * np.cos(n * 0.037)))
+        cv2.rectangle(frame, (x, y), (x + box, y + box), (0, 0, 0), -1)
+        cv2.putText(frame, f"{n:06d}", (10, height - 20), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 2)
+        return frame
+
+    def describe(self):
+        pacing = f"{self.fps} fps" if self.fps else "unpaced"
+        return f"test pattern {self.resolution[0]}x{self.resolution[1]} ({pacing})"
+
+
+class JpegDirectorySource(FrameSource):
+    """Cycles through the JPEG files in a directory. Files are decoded once and kept."""
+    def __init__(self, directory, fps=DEFAULT_FPS, loop=True):
+        super().__init__(fps=fps)
+        self.directory = directory
+        self.loop = loop
+        paths = sorted(glob.glob(os.path.join(directory, '*.jpg')) + glob.glob(os.path.join(directory, '*.jpeg')))
+        self.frames = [frame for frame in (cv2.imread(p) for p in paths) if frame is not None]
+        self.position = 0
+
+    def _read(self):
+        if not self.frames:
+            return None
+        if self.position >= len(self.frames):
+            if not self.loop:
+                return None
+            self.position = 0
+        frame = self.frames[self.position]
+        self.position += 1
+        return frame.copy()
+
+    def isOpened(self):
+        return bool(self.frames)
+
+    def describe(self):
+        return f"{len(self.frames)} JPEGs from {self.directory}"
+
+
+def _split_rate(argument, default):
+    """'path@4' -> ('path', 4.0); 'path' -> ('path', default)."""
+    if '@' in argument:
+        value, rate = argument.rsplit('@', 1)
+        return value, float(rate)
+    return argument, default
+
+
+def open_frame_source(spec, resolution=DEFAULT_RESOLUTION):
+    """
+    :param spec: Source spec string, see the module docstring.
+    :param resolution: Capture resolution for cameras and the test pattern default.
+    """
+    kind, _, argument = spec.partition(':')
+    kind = kind.lower()
+    if kind == 'camera':
+        return CameraSource(int(argument or 0), resolution)
+    if kind == 'file':
+        path, speed = _split_rate(argument, 1.0)
+        return VideoFileSource(path, speed)
+    if kind == 'test':
+        size, fps = _split_rate(argument, DEFAULT_FPS)
+        if size:
+            width, height = (int(v) for v in size.lower().split('x'))
+            resolution = (width, height)
+        return TestPatternSource(resolution, fps)
+    if kind == 'jpegdir':
+        directory, fps = _split_rate(argument, DEFAULT_FPS)
+        return JpegDirectorySource(directory, fps)
+    raise ValueError(f"Unknown frame source '{spec}' (use camera:, file:, test or jpegdir:)")
+
+
+def add_source_argument(parser, default=None, use='frames'):
+    """The --source option shared by the bench_*.py scripts."""
+    parser.add_argument('--source', default=default,
+                        help=f"Frame source spec for the {use} (see frame_sources.py), e.g. test or file:run.mp4")
+
+
+def read_frames(source, count, size=None):
+    """Read `count` frames up front, unpaced and resized to size if given, for benchmark inputs."""
+    source.fps = None
+    frames = []
+    while len(frames) < count:
+        ret, frame = source.read()
+        if not ret:
+            break
+        if size is not None and (frame.shape[1], frame.shape[0]) != tuple(size):
+            frame = cv2.resize(frame, tuple(size), interpolation=cv2.INTER_AREA)
+        frames.append(frame)
+    return frames
+
+
+def encode_frames(source, count, quality=80):
+    """Read `count` frames and JPEG-encode them up front, for benchmark payloads."""
+    payloads = []
+    for frame in read_frames(source, count):
+        ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if ok:
+            payloads.append(encoded.tobytes())
+    return payloads
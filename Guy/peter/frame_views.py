@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Per-frame cache of derived views, shared by every consumer of the same frame.
+
+Overlays, filters, motion detection, laser detection and tracking all want a
+grey, HSV or downscaled copy of the current frame. stream_camera() wraps each
+frame in a FrameViews; consumers ask it for the view they need, the first
+request computes it and later requests (from any thread) get the same array.
+
+    views.gray              full-resolution grey
+    views.hsv               full-resolution HSV
+    views.level(2)          BGR pyramid level: 1 = 1/2, 2 = 1/4, 3 = 1/8
+    views.gray_level(2)     grey pyramid level (built from the grey pyramid)
+
+Each pyramid level is built from the level above it with INTER_AREA, so asking
+for 1/8 also caches 1/2 and 1/4 for whoever needs them next.
+
+Views are kept for that frame only: release() drops them when stream_camera()
+moves on to the next frame. A worker still holding a retired frame can ask for
+views; they are computed but not cached (counted as 'late').
+
+Hit/miss counts per view are kept in VIEW_STATS (see get_view_stats()). The
+cache itself never builds a view twice; 'duplicates' counts the conversions
+done twice for the same frame anyway, by a late worker rebuilding a view that
+was built (and dropped) before the frame retired. It should stay near 0; if it
+grows, that worker should ask for its views before the frame moves on.
+
+Views reflect the frame as it was when first requested, so analysis should ask
+for its views before overlays are drawn on the frame.
+"""
+import threading
+
+import cv2
+
+PYRAMID_LEVELS = 3
+
+
+class ViewStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}  # view name -> {'hits', 'misses', 'late'}
+        self.frames = 0
+        self.duplicates = 0
+
+    def record(self, name, outcome):
+        with self.lock:
+            counts = self.counts.get(name)
+            if counts is None:
+                counts = self.counts[name] = {'hits': 0, 'misses': 0, 'late': 0}
+            counts[outcome] += 1
+
+    def get_stats(self):
+        with self.lock:
+            views = {name: dict(counts) for name, counts in self.counts.items()}
+            frames = self.frames
+            duplicates = self.duplicates
+        for counts in views.values():
+            total = counts['hits'] + counts['misses']
+            counts['hit_rate'] = round(counts['hits'] / total, 3) if total else 0.0
+            # Misses per frame: 1.0 = computed on every frame, never more
+            counts['per_frame'] = round(counts['misses'] / frames, 3) if frames else 0.0
+        return {'frames': frames, 'duplicates': duplicates, 'views': views}
+
+    def summary(self):
+        stats = self.get_stats()
+        parts = [f"{name} {c['hits']}/{c['misses']}" for name, c in sorted(stats['views'].items())]
+        return f"hits/misses {', '.join(parts) or 'none'}; duplicates {stats['duplicates']}"
+
+
+VIEW_STATS = ViewStats()
+
+
+def get_view_stats():
+    return VIEW_STATS.get_stats()
+
+
+class FrameViews:
+    def __init__(self, bgr, frame_id=0, timestamp=None, stats=VIEW_STATS):
+        """
+        :param bgr: The frame (not copied; analysis views are taken from it as it is when first requested).
+        :param frame_id: Sequence number, so results computed later can be matched to their frame.
+        :param timestamp: Capture time.
+        """
+        self.bgr = bgr
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.stats = stats
+        self.shape = bgr.shape
+        self._views = {}
+        self._built = set()  # Names of the views built while cached, kept after release()
+        self._lock = threading.RLock()  # Re-entrant: pyramid levels build the level above
+        self._retired = False
+        with stats.lock:
+            stats.frames += 1
+
+    def view(self, name, build):
+        """
+        Cached view `name`, computing it with build() on first use. Builds
+        happen under the frame's lock, so a view is built once even when
+        several threads ask for it at the same time.
+        """
+        cached = self._views.get(name)
+        if cached is not None:
+            self.stats.record(name, 'hits')
+            return cached
+        with self._lock:
+            if self._retired:
+                self.stats.record(name, 'late')
+                if name in self._built:
+                    with self.stats.lock:
+                        self.stats.duplicates += 1
+                return build()
+            cached = self._views.get(name)
+            if cached is not None:
+                self.stats.record(name, 'hits')
+                return cached
+            result = self._views[name] = build()
+            self._built.add(name)
+        self.stats.record(name, 'misses')
+        return result
+
+    @property
+    def gray(self):
+        return self.view('gray', lambda: cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def hsv(self):
+        return self.view('hsv', lambda: cv2.cvtColor(self.bgr, cv2.COLOR_BGR2HSV))
+
+    def level(self, level):
+        """BGR image at 1 / 2**level scale (level 0 is the frame itself)."""
+        if level == 0:
+            return self.bgr
+        if not 0 < level <= PYRAMID_LEVELS:
+            raise ValueError(f"pyramid level must be 0..{PYRAMID_LEVELS}")
+        return self.view(f'bgr/{2 ** level}', lambda: _half(self.level(level - 1)))
+
+    def gray_level(self, level):
+        """Grey image at 1 / 2**level scale."""
+        if level == 0:
+            return self.gray
+        if not 0 < level <= PYRAMID_LEVELS:
+            raise ValueError(f"pyramid level must be 0..{PYRAMID_LEVELS}")
+        return self.view(f'gray/{2 ** level}', lambda: _half(self.gray_level(level - 1)))
+
+    def scaled(self, scale, gray=False):
+        """View for a scale factor (1, 0.5, 0.25, 0.125), or None if it is not a pyramid level."""
+        for level in range(PYRAMID_LEVELS + 1):
+            if abs(scale - 1.0 / 2 ** level) < 1e-6:
+                return self.gray_level(level) if gray else self.level(level)
+        return None
+
+    def release(self):
+        """The frame has retired: drop the cached views."""
+        with self._lock:
+            self._retired = True
+            self._views.clear()
+
+
+def _half(image):
+    return cv2.resize(image, (image.shape[1] // 2, image.shape[0] // 2), interpolation=cv2.INTER_AREA)
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Cached HUD overlay for stream_camera(): crosshair, distance, motor bars and,
+with show_heading=True, a heading readout (web_fixed.py has no heading source
+yet, so it leaves that tile out).
+
+Drawing the HUD with cv2.line / cv2.putText on every frame (as example_filter.py
+does for its crosshair) costs the same whether anything changed or not. Here:
+
+  - static elements (crosshair, labels, bar outlines) are rasterized once into
+    premultiplied RGBA tiles, one per element, cropped to its bounding box;
+  - dynamic elements (distance text, motor bar fills, heading text) are
+    re-rendered into their own tiles only when their displayed value changes;
+  - compositing is a vectorized alpha blend over each tile's box only, never
+    a pass over the whole frame.
+
+draw_direct() draws the same HUD the straightforward way, for comparison
+(see bench_hud.py).
+
+    hud = HudOverlay()
+    hud.set_values(distance=ultrasonic_distance, m1=motor_m1_speed, m2=motor_m2_speed)
+    hud.draw(frame)   # in place
+"""
+import cv2
+import numpy as np
+
+HUD_COLOUR = (0, 255, 0)      # BGR
+SHADOW_COLOUR = (0, 0, 0)
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+MOTOR_MAX = 255
+
+
+class Tile:
+    """
+    A premultiplied RGBA element cropped to its bounding box.
+
+    Compositing is dst = dst * (255 - a) / 255 + src * a / 255 over the box
+    only, done with cv2.multiply / cv2.add in place on the frame's ROI view
+    (saturating uint8 arithmetic, no float temporaries).
+    """
+    def __init__(self, x, y, bgr, alpha):
+        """
+        :param bgr: Element colours, uint8 (h, w, 3).
+        :param alpha: Element coverage, uint8 (h, w).
+        """
+        self.x = x
+        self.y = y
+        alpha3 = cv2.merge([alpha, alpha, alpha])
+        self.premultiplied = cv2.multiply(bgr, alpha3, scale=1 / 255.0)
+        self.inverse_alpha = cv2.bitwise_not(alpha3)
+        self.height, self.width = alpha.shape
+
+    def blend(self, frame):
+        roi = frame[self.y:self.y + self.height, self.x:self.x + self.width]
+        cv2.add(cv2.multiply(roi, self.inverse_alpha, scale=1 / 255.0), self.premultiplied, dst=roi)
+
+
+def _canvas(width, height):
+    return np.zeros((height, width, 3), dtype=np.uint8), np.zeros((height, width), dtype=np.uint8)
+
+
+def _outlined_text(img, text, origin, scale):
+    """Text with a dark outline so it stays readable on bright scenes."""
+    cv2.putText(img, text, origin, FONT, scale, SHADOW_COLOUR, 3, cv2.LINE_AA)
+    cv2.putText(img, text, origin, FONT, scale, HUD_COLOUR, 1, cv2.LINE_AA)
+
+
+def _text(bgr, alpha, text, origin, scale):
+    _outlined_text(bgr, text, origin, scale)
+    cv2.putText(alpha, text, origin, FONT, scale, 200, 3, cv2.LINE_AA)
+    cv2.putText(alpha, text, origin, FONT, scale, 255, 1, cv2.LINE_AA)
+
+
+def format_distance(distance):
+    try:
+        return f"{float(distance):.0f} cm"
+    except (TypeError, ValueError):
+        return "N/A"
+
+
+def format_heading(heading):
+    return "---" if heading is None else f"{int(round(heading)) % 360:03d}"
+
+
+class HudOverlay:
+    def __init__(self, resolution=(640, 480), show_heading=False):
+        """
+        :param resolution: (width, height) of the frames the HUD is drawn on.
+        :param show_heading: Draw the HDG readout, fed through set_values(heading=degrees).
+        """
+        self.show_heading = show_heading
+        self.values = {'distance': None, 'm1': 0, 'm2': 0, 'heading': None}
+        self.renders = 0  # Dynamic tile re-renders, for stats
+        self._rebuild(resolution)
+
+    def _rebuild(self, resolution):
+        self.resolution = resolution
+        self._layout()
+        self.static_tiles = [Tile(*element) for element in self._static_elements()]
+        self.dynamic = {}  # name -> (displayed key, Tile)
+
+    def _layout(self):
+        w, h = self.resolution
+        s = h / 480.0
+        self.scale = s
+        self.centre = (w // 2, h // 2)
+        self.cross_size = int(40 * s)
+        self.text_scale = 0.6 * s
+        self.text_height = int(26 * s)
+        # Distance readout, top left
+        self.distance_box = (int(10 * s), int(10 * s), int(130 * s), self.text_height * 2)
+        # Heading readout, top centre
+        self.heading_box = (w // 2 - int(50 * s), int(10 * s), int(100 * s), self.text_height * 2)
+        # Motor bars, bottom left: two vertical bars with the zero line in the middle
+        self.bar_width = int(16 * s)
+        self.bar_height = int(120 * s)
+        bar_top = h - self.bar_height - int(40 * s)
+        self.bar_boxes = [(int(14 * s), bar_top), (int(14 * s) + self.bar_width + int(18 * s), bar_top)]
+
+    # ------------------------------------------------------------------
+    # Static elements: rendered once
+
+    def _static_elements(self):
+        elements = []
+        # Crosshair with a centre gap and ring
+        size = self.cross_size
+        gap = size // 4
+        bgr, alpha = _canvas(2 * size + 1, 2 * size + 1)
+        for canvas, colour in ((bgr, HUD_COLOUR), (alpha, 255)):
+            cv2.line(canvas, (0, size), (size - gap, size), colour, 2)
+            cv2.line(canvas, (size + gap, size), (2 * size, size), colour, 2)
+            cv2.line(canvas, (size, 0), (size, size - gap), colour, 2)
+            cv2.line(canvas, (size, size + gap), (size, 2 * size), colour, 2)
+            cv2.circle(canvas, (size, size), gap // 2, colour, 1, cv2.LINE_AA)
+        elements.append((self.centre[0] - size, self.centre[1] - size, bgr, alpha))
+
+        # Labels
+        labels = [(self.distance_box, "DIST")]
+        if self.show_heading:
+            labels.append((self.heading_box, "HDG"))
+        for (x, y, bw, _), label in labels:
+            bgr, alpha = _canvas(bw, self.text_height)
+            _text(bgr, alpha, label, (2, self.text_height - 6), self.text_scale)
+            elements.append((x, y, bgr, alpha))
+
+        # Motor bar frames, zero line and labels
+        for (x, y), label in zip(self.bar_boxes, ("M1", "M2")):
+            bgr, alpha = _canvas(self.bar_width + 2, self.bar_height + 2 + self.text_height)
+            for canvas, colour in ((bgr, HUD_COLOUR), (alpha, 255)):
+                cv2.rectangle(canvas, (0, 0), (self.bar_width + 1, self.bar_height + 1), colour, 1)
+                mid = self.bar_height // 2 + 1
+                cv2.line(canvas, (0, mid), (self.bar_width + 1, mid), colour, 1)
+            _text(bgr, alpha, label, (0, self.bar_height + self.text_height - 4), self.text_scale * 0.8)
+            # Translucent background inside the frame so the fill reads well
+            alpha[1:self.bar_height + 1, 1:self.bar_width + 1] = np.maximum(
+                alpha[1:self.bar_height + 1, 1:self.bar_width + 1], 60)
+            elements.append((x - 1, y - 1, bgr, alpha))
+        return elements
+
+    # ------------------------------------------------------------------
+    # Dynamic elements: re-rendered only when the displayed value changes
+
+    def _text_tile(self, box, text):
+        x, y, bw, _ = box
+        bgr, alpha = _canvas(bw, self.text_height)
+        _text(bgr, alpha, text, (2, self.text_height - 6), self.text_scale)
+        return x, y + self.text_height, bgr, alpha
+
+    def _bar_tile(self, index, value):
+        x, y = self.bar_boxes[index]
+        bgr, alpha = _canvas(self.bar_width, self.bar_height)
+        half = self.bar_height // 2
+        length = int(round(half * min(abs(value), MOTOR_MAX) / MOTOR_MAX))
+        if length:
+            top, bottom = (half - length, half) if value > 0 else (half, half + length)
+            colour = HUD_COLOUR if value > 0 else (0, 165, 255)
+            bgr[top:bottom] = colour
+            alpha[top:bottom] = 220
+        return x, y, bgr, alpha
+
+    def _dynamic_elements(self):
+        """(name, cache key, render function) for every dynamic element."""
+        v = self.values
+        distance = format_distance(v['distance'])
+        half = self.bar_height // 2
+        elements = [('distance', distance, lambda: self._text_tile(self.distance_box, distance))]
+        if self.show_heading:
+            heading = format_heading(v['heading'])
+            elements.append(('heading', heading, lambda: self._text_tile(self.heading_box, heading)))
+        for i, name in enumerate(('m1', 'm2')):
+            value = int(v[name] or 0)
+            # Key on the drawn bar length, not the raw PWM value
+            key = (value > 0, int(round(half * min(abs(value), MOTOR_MAX) / MOTOR_MAX)))
+            elements.append((name, key, lambda i=i, value=value: self._bar_tile(i, value)))
+        return elements
+
+    def set_values(self, **values):
+        """Update any of distance, m1, m2, heading. Cheap; rendering happens in draw()."""
+        self.values.update(values)
+
+    def _refresh_dynamic(self):
+        for name, key, render in self._dynamic_elements():
+            cached = self.dynamic.get(name)
+            if cached is not None and cached[0] == key:
+                continue
+            self.dynamic[name] = (key, Tile(*render()))
+            self.renders += 1
+
+    def draw(self, frame):
+        """Composite the HUD onto a BGR frame in place; returns the frame."""
+        if (frame.shape[1], frame.shape[0]) != self.resolution:
+            self._rebuild((frame.shape[1], frame.shape[0]))
+        self._refresh_dynamic()
+        for tile in self.static_tiles:
+            tile.blend(frame)
+        for _, tile in self.dynamic.values():
+            tile.blend(frame)
+        return frame
+
+    # ------------------------------------------------------------------
+
+    def draw_direct(self, frame):
+        """Reference implementation: draw the whole HUD with OpenCV calls every frame."""
+        if (frame.shape[1], frame.shape[0]) != self.resolution:
+            self._rebuild((frame.shape[1], frame.shape[0]))
+        size = self.cross_size
+        gap = size // 4
+        cx, cy = self.centre
+        cv2.line(frame, (cx - size, cy), (cx - gap, cy), HUD_COLOUR, 2)
+        cv2.line(frame, (cx + gap, cy), (cx + size, cy), HUD_COLOUR, 2)
+        cv2.line(frame, (cx, cy - size), (cx, cy - gap), HUD_COLOUR, 2)
+        cv2.line(frame, (cx, cy + gap), (cx, cy + size), HUD_COLOUR, 2)
+        cv2.circle(frame, (cx, cy), gap // 2, HUD_COLOUR, 1, cv2.LINE_AA)
+        readouts = [(self.distance_box, "DIST", format_distance(self.values['distance']))]
+        if self.show_heading:
+            readouts.append((self.heading_box, "HDG", format_heading(self.values['heading'])))
+        for (x, y, _, _), label, value in readouts:
+            _outlined_text(frame, label, (x + 2, y + self.text_height - 6), self.text_scale)
+            _outlined_text(frame, value, (x + 2, y + 2 * self.text_height - 6), self.text_scale)
+        half = self.bar_height // 2
+        for (x, y), label, name in zip(self.bar_boxes, ("M1", "M2"), ('m1', 'm2')):
+            value = int(self.values[name] or 0)
+            inside = frame[y:y + self.bar_height, x:x + self.bar_width]
+            inside[:] = cv2.convertScaleAbs(inside, alpha=195 / 255.0)
+            cv2.rectangle(frame, (x - 1, y - 1), (x + self.bar_width, y + self.bar_height), HUD_COLOUR, 1)
+            cv2.line(frame, (x - 1, y + half), (x + self.bar_width, y + half), HUD_COLOUR, 1)
+            length = int(round(half * min(abs(value), MOTOR_MAX) / MOTOR_MAX))
+            if length:
+                top, bottom = (y + half - length, y + half) if value > 0 else (y + half, y + half + length)
+                cv2.rectangle(frame, (x, top), (x + self.bar_width - 1, bottom - 1),
+                              HUD_COLOUR if value > 0 else (0, 165, 255), -1)
+            _outlined_text(frame, label, (x - 1, y + self.bar_height + self.text_height - 5),
+                           self.text_scale * 0.8)
+        return frame
+
+    def get_stats(self):
+        tiles = self.static_tiles + [tile for _, tile in self.dynamic.values()]
+        return {
+            'renders': self.renders,
+            'tiles': len(tiles),
+            'blended_pixels': sum(tile.width * tile.height for tile in tiles),
+        }
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+HTTP/1.1 persistent connections for BaseHTTPRequestHandler subclasses.
+
+index_fixed.html polls several routes every 50 ms. With the HTTP/1.0 default
+every poll opens and tears down a TCP connection, which on Wi-Fi costs an
+extra round trip per request. KeepAliveMixin switches the handler to HTTP/1.1
+so the browser reuses its connections:
+
+  - a response is only kept alive if its length is known: routes send
+    Content-Length, and a response that starts without one (MJPEG, replay and
+    recording playback end when the connection does) gets Connection: close;
+  - idle connections are closed after `timeout` seconds (the socket timeout
+    for the threaded servers, the wait for the next request in async_http.py);
+  - after max_requests responses the connection is closed with
+    Connection: close, so no client holds a connection forever;
+  - Nagle is disabled: the threaded servers write the headers and the body
+    separately, and on a kept-alive connection the body would otherwise wait
+    for the client's delayed ACK (~40 ms).
+
+HTTP/1.0 clients (and Connection: close requests) are still served one request
+per connection, like before.
+"""
+
+
+class KeepAliveMixin:
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    timeout = 15  # Idle seconds before a kept-alive connection is closed
+    max_requests = 1000  # Responses per connection
+    requests_served = 0  # On this connection so far (AsyncHTTPServer sets it per request)
+    head_pending = False
+    length_sent = False
+
+    def send_response(self, code, message=None):
+        super().send_response(code, message)
+        self.requests_served += 1
+        self.head_pending = True
+        self.length_sent = code < 200 or code in (204, 304)  # No body by definition
+        if self.requests_served >= self.max_requests:
+            self.send_header('Connection', 'close')
+
+    def send_header(self, keyword, value):
+        if self.head_pending and keyword.lower() == 'content-length':
+            self.length_sent = True
+        super().send_header(keyword, value)
+
+    def end_headers(self):
+        if self.head_pending:
+            self.head_pending = False
+            if not self.length_sent and not self.close_connection:
+                # The body ends when the connection does
+                self.send_header('Connection', 'close')
+        super().end_headers()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Laser dot detection and hit scoring, only while the laser is on.
+
+The laser is boresighted with the camera, so its spot always lands near the
+crosshair (the frame centre, plus a fixed boresight offset once calibrated).
+The detector therefore only looks at a small region of interest around that
+point, and only while the laser is lit:
+
+  - set_laser(True/False) follows /laser_on and /laser_off (continuous laser);
+  - arm(seconds) opens a shot window when the operator fires (the firmware
+    pulses the laser for ~100 ms on FC, see espWorkProject_fixed.ino).
+
+Outside those windows process() returns immediately, so it costs nothing.
+
+Detection is vectorized thresholding on the ROI: a pixel belongs to the spot
+when it is bright (max channel >= min_value) and red dominates
+(R - max(G, B) >= min_red_excess), or when it is saturated (the centre of a
+laser spot clips to white on most sensors) next to red pixels. The spot is the
+intensity-weighted centroid of the mask.
+
+Each shot is scored once, on the first frame the spot is found (or as a miss
+when the window closes without a spot): spot position, offset from the
+crosshair, and which marked target (if any) it landed in. With the laser on
+continuously, a hit is logged each time the spot enters a target.
+"""
+import collections
+import math
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class LaserDetector:
+    def __init__(self, resolution=(640, 480), roi_size=160, boresight=(0, 0), min_value=200,
+                 min_red_excess=40, min_pixels=3, max_hits=200):
+        """
+        :param roi_size: Side of the square searched around the boresight, in pixels.
+        :param boresight: Where the laser lands relative to the crosshair (frame centre), in pixels.
+        :param min_value: Brightest channel needed for a spot pixel.
+        :param min_red_excess: How much R must exceed max(G, B) for a (non-saturated) spot pixel.
+        :param min_pixels: Smallest spot accepted, in pixels.
+        """
+        self.roi_size = roi_size
+        self.boresight = boresight
+        self.min_value = min_value
+        self.min_red_excess = min_red_excess
+        self.min_pixels = min_pixels
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+        self._set_resolution(resolution)
+
+        self.lock = threading.Lock()
+        self.laser_on = False
+        self.armed_until = 0.0
+        self.shot = None  # The open shot window: {'id', 'fired', 'scored'}
+        self.shots = 0
+        self.targets = []  # [{'name', 'x', 'y', 'radius'}] in full-frame pixels
+        self.spot = None  # (x, y, pixels) from the last frame searched
+        self.spot_frame_id = 0
+        self.in_target = None  # Target the continuous spot is inside, to log entries once
+        self.hits = collections.deque(maxlen=max_hits)
+        # Stats
+        self.frames_searched = 0
+        self.frames_found = 0
+        self.total_ms = 0.0
+
+    def _set_resolution(self, resolution):
+        self.resolution = tuple(resolution)
+        self.crosshair = (resolution[0] // 2, resolution[1] // 2)
+        half = self.roi_size // 2
+        cx = self.crosshair[0] + self.boresight[0]
+        cy = self.crosshair[1] + self.boresight[1]
+        self.roi = (max(0, cx - half), max(0, cy - half),
+                    min(resolution[0], cx + half), min(resolution[1], cy + half))
+
+    # ------------------------------------------------------------------
+    # Laser state and targets (HTTP threads)
+
+    def set_laser(self, on):
+        with self.lock:
+            self.laser_on = on
+            if not on:
+                self.spot = None
+                self.in_target = None
+
+    def arm(self, seconds):
+        """The operator fired: look for the spot for the next `seconds` and score the shot."""
+        with self.lock:
+            self._close_shot()
+            self.shots += 1
+            self.shot = {'id': self.shots, 'fired': time.time(), 'scored': False}
+            self.armed_until = time.monotonic() + seconds
+
+    def add_target(self, x, y, radius, name=None):
+        with self.lock:
+            name = name or f"T{len(self.targets) + 1}"
+            self.targets.append({'name': name, 'x': x, 'y': y, 'radius': radius})
+            return name
+
+    def clear_targets(self):
+        with self.lock:
+            self.targets = []
+            self.in_target = None
+
+    def active(self):
+        return self.laser_on or self.shot is not None
+
+    # ------------------------------------------------------------------
+    # Streaming thread
+
+    def process(self, views):
+        """Search for the spot on this frame. Returns at once while the laser is off."""
+        if not self.active():
+            return
+        if views.shape[1::-1] != self.resolution:
+            self._set_resolution(views.shape[1::-1])
+        with self.lock:
+            if self.shot is not None and time.monotonic() > self.armed_until:
+                self._close_shot()
+                if not self.laser_on:
+                    self.spot = None
+                    return
+        start = time.perf_counter()
+        spot = self._detect(views.bgr)
+        self.total_ms += (time.perf_counter() - start) * 1000
+        self.frames_searched += 1
+        with self.lock:
+            self.spot = spot
+            self.spot_frame_id = views.frame_id
+            if spot is None:
+                return
+            self.frames_found += 1
+            target = self._target_at(spot[0], spot[1])
+            if self.shot is not None and not self.shot['scored']:
+                self.shot['scored'] = True
+                self._log_hit(spot, target, views.frame_id, self.shot['id'])
+            elif self.shot is None and target is not None and target is not self.in_target:
+                self._log_hit(spot, target, views.frame_id, None)
+            self.in_target = target
+
+    def _detect(self, bgr):
+        x0, y0, x1, y1 = self.roi
+        roi = bgr[y0:y1, x0:x1]
+        b, g, r = cv2.split(roi)
+        brightest = cv2.max(cv2.max(b, g), r)
+        red_excess = cv2.subtract(r, cv2.max(b, g))
+        bright = brightest >= self.min_value
+        red = bright & (red_excess >= self.min_red_excess)
+        if not red.any():
+            return None
+        # Saturated core: clipped to white, but only where it touches red pixels
+        near_red = cv2.dilate(red.view(np.uint8), self.kernel).view(bool)
+        mask = red | (near_red & (brightest >= 250))
+        pixels = int(np.count_nonzero(mask))
+        if pixels < self.min_pixels:
+            return None
+        weights = brightest.astype(np.float32) * mask
+        total = float(weights.sum())
+        ys, xs = np.indices(mask.shape, dtype=np.float32)
+        x = float((weights * xs).sum()) / total
+        y = float((weights * ys).sum()) / total
+        return x0 + x, y0 + y, pixels
+
+    def _target_at(self, x, y):
+        for target in self.targets:
+            if math.hypot(x - target['x'], y - target['y']) <= target['radius']:
+                return target
+        return None
+
+    def _close_shot(self):
+        """Record the open shot as a miss if no spot was seen during its window."""
+        shot = self.shot
+        self.shot = None
+        if shot is not None and not shot['scored']:
+            self.hits.append({'time': shot['fired'], 'shot': shot['id'], 'spot': None, 'target': None})
+            print(f"Laser shot {shot['id']}: no spot seen")
+
+    def _log_hit(self, spot, target, frame_id, shot_id):
+        dx = spot[0] - self.crosshair[0]
+        dy = spot[1] - self.crosshair[1]
+        hit = {
+            'time': time.time(),
+            'shot': shot_id,
+            'frame_id': frame_id,
+            'spot': [round(spot[0], 1), round(spot[1], 1)],
+            'offset': [round(dx, 1), round(dy, 1)],
+            'target': target['name'] if target is not None else None,
+        }
+        if target is not None:
+            hit['target_distance'] = round(math.hypot(spot[0] - target['x'], spot[1] - target['y']), 1)
+        self.hits.append(hit)
+        where = f"HIT {target['name']}" if target is not None else "no target"
+        print(f"Laser {'shot ' + str(shot_id) if shot_id else 'spot'}: ({spot[0]:.0f}, {spot[1]:.0f}), "
+              f"offset ({dx:+.0f}, {dy:+.0f}) px from the crosshair, {where}")
+
+    # ------------------------------------------------------------------
+
+    def draw(self, frame):
+        with self.lock:
+            targets = list(self.targets)
+            spot = self.spot
+        for target in targets:
+            cv2.circle(frame, (int(target['x']), int(target['y'])), int(target['radius']), (255, 200, 0), 1, cv2.LINE_AA)
+            cv2.putText(frame, target['name'], (int(target['x'] + target['radius'] + 3), int(target['y'])),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 200, 0), 1, cv2.LINE_AA)
+        if spot is not None:
+            cv2.drawMarker(frame, (int(spot[0]), int(spot[1])), (0, 0, 255), cv2.MARKER_TILTED_CROSS, 14, 2)
+        return frame
+
+    def get_state(self):
+        with self.lock:
+            spot = self.spot
+            state = {
+                'laser_on': self.laser_on,
+                'armed': self.shot is not None,
+                'roi': list(self.roi),
+                'spot': [round(spot[0], 1), round(spot[1], 1)] if spot is not None else None,
+                'offset': ([round(spot[0] - self.crosshair[0], 1), round(spot[1] - self.crosshair[1], 1)]
+                           if spot is not None else None),
+                'frame_id': self.spot_frame_id,
+                'targets': [dict(t) for t in self.targets],
+                'hits': [dict(h) for h in self.hits][-20:],
+            }
+        shots = [h for h in self.hits if h['shot'] is not None]
+        state['score'] = {'shots': len(shots), 'on_target': sum(1 for h in shots if h['target'] is not None)}
+        state['stats'] = {
+            'frames_searched': self.frames_searched,
+            'frames_found': self.frames_found,
+            'mean_ms': round(self.total_ms / self.frames_searched, 3) if self.frames_searched else 0.0,
+        }
+        return state
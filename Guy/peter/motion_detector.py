@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Sentry motion detection on 1/4-scale grey frames, in a background worker.
+
+stream_camera() offers every frame with submit(views). The detector only takes
+one when its worker is idle and the next analysis is due (analysis_fps, not
+FRAMERATE), so it always works on the newest frame and simply skips frames
+when it falls behind; the streaming thread never waits for it. The only work
+done on the streaming thread is fetching the 1/4 grey pyramid level from the
+frame's FrameViews (so it is taken before overlays are drawn, and shared with
+any other consumer of that view).
+
+Detection is a running-average background with absdiff / threshold / dilate
+and contours, at 160x120 for a 640x480 stream. Regions are scaled back to
+full-frame coordinates.
+
+A motion event starts after start_frames consecutive analyses with motion and
+ends after quiet_seconds without. Events are kept (newest last) as bookmarks
+with their start time, so they can be looked up in the recordings
+(/recordings/play.mjpg?t=<start>). While the tank is driving the whole picture
+moves, so set_suppressed(True) pauses detection and resets the background.
+"""
+import collections
+import threading
+import time
+
+import cv2
+import numpy as np
+
+PYRAMID_LEVEL = 2  # 1/4 scale
+
+
+class MotionDetector:
+    def __init__(self, analysis_fps=5.0, threshold=25, min_area=30, learning_rate=0.05,
+                 start_frames=2, quiet_seconds=3.0, max_events=100):
+        """
+        :param analysis_fps: Analyses per second, independent of the stream frame rate.
+        :param threshold: Grey level difference counted as change.
+        :param min_area: Smallest region kept, in 1/4-scale pixels.
+        :param learning_rate: How fast the background absorbs changes.
+        """
+        self.interval = 1.0 / analysis_fps
+        self.threshold = threshold
+        self.min_area = min_area
+        self.learning_rate = learning_rate
+        self.start_frames = start_frames
+        self.quiet_seconds = quiet_seconds
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+
+        self.condition = threading.Condition()
+        self.pending = None  # (views, small gray) waiting for the worker
+        self.busy = False
+        self.next_due = 0.0
+        self.running = False
+        self.thread = None
+        self.suppressed = False
+
+        self.background = None
+        self.lock = threading.Lock()
+        self.regions = []  # [(x, y, w, h)] in full-frame pixels, from the last analysis
+        self.regions_frame_id = 0
+        self.regions_time = 0.0
+        self.motion_streak = 0
+        self.active_event = None
+        self.events = collections.deque(maxlen=max_events)
+        # Stats
+        self.offered = 0
+        self.analysed = 0
+        self.skipped_busy = 0
+        self.total_ms = 0.0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def set_suppressed(self, suppressed):
+        """Pause detection (e.g. while driving); the background is relearned afterwards."""
+        if suppressed and not self.suppressed:
+            self.background = None
+            with self.lock:
+                self.regions = []
+                self.motion_streak = 0
+        self.suppressed = suppressed
+
+    def submit(self, views):
+        """Called from stream_camera() for every frame; cheap when the frame is skipped."""
+        self.offered += 1
+        now = time.monotonic()
+        if self.suppressed or now < self.next_due:
+            return
+        if self.busy:
+            self.skipped_busy += 1
+            return
+        small = views.gray_level(PYRAMID_LEVEL)
+        with self.condition:
+            self.pending = (views, small)
+            self.busy = True
+            self.next_due = now + self.interval
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                views, small = self.pending
+                self.pending = None
+            try:
+                start = time.perf_counter()
+                self._analyse(views, small)
+                self.total_ms += (time.perf_counter() - start) * 1000
+                self.analysed += 1
+            except Exception as e:
+                print(f"Motion detector error: {e}")
+            finally:
+                self.busy = False
+
+    def _analyse(self, views, small):
+        blurred = cv2.GaussianBlur(small, (5, 5), 0)
+        if self.background is None or self.background.shape != blurred.shape:
+            self.background = blurred.astype(np.float32)
+            return
+        diff = cv2.absdiff(blurred, cv2.convertScaleAbs(self.background))
+        cv2.accumulateWeighted(blurred, self.background, self.learning_rate)
+        _, mask = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)
+        mask = cv2.dilate(mask, self.kernel, iterations=2)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        factor = views.shape[1] / float(small.shape[1])
+        regions = []
+        for contour in contours:
+            if cv2.contourArea(contour) < self.min_area:
+                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            regions.append((int(x * factor), int(y * factor), int(w * factor), int(h * factor)))
+        timestamp = views.timestamp or time.time()
+        with self.lock:
+            self.regions = regions
+            self.regions_frame_id = views.frame_id
+            self.regions_time = timestamp
+            self._update_event(bool(regions), timestamp, regions)
+
+    def _update_event(self, moving, timestamp, regions):
+        self.motion_streak = self.motion_streak + 1 if moving else 0
+        event = self.active_event
+        if event is None:
+            if self.motion_streak >= self.start_frames:
+                event = {'start': timestamp, 'end': timestamp, 'peak_regions': len(regions),
+                         'frame_id': self.regions_frame_id}
+                self.active_event = event
+                self.events.append(event)
+                print(f"Motion detected at {time.strftime('%H:%M:%S', time.localtime(timestamp))} "
+                      f"({len(regions)} regions)")
+        elif moving:
+            event['end'] = timestamp
+            event['peak_regions'] = max(event['peak_regions'], len(regions))
+        elif timestamp - event['end'] > self.quiet_seconds:
+            self.active_event = None
+            print(f"Motion ended after {event['end'] - event['start']:.1f}s")
+
+    def draw(self, frame):
+        """Outline the current motion regions on the frame (in place)."""
+        with self.lock:
+            regions = list(self.regions)
+            active = self.active_event is not None
+        colour = (0, 0, 255) if active else (0, 200, 255)
+        for x, y, w, h in regions:
+            cv2.rectangle(frame, (x, y), (x + w, y + h), colour, 2)
+        return frame
+
+    def get_state(self):
+        """Motion telemetry: current regions, active event and recent bookmarks."""
+        with self.lock:
+            return {
+                'active': self.active_event is not None,
+                'suppressed': self.suppressed,
+                'regions': [list(r) for r in self.regions],
+                'frame_id': self.regions_frame_id,
+                'age_s': round(time.time() - self.regions_time, 3) if self.regions_time else None,
+                'events': [dict(e) for e in self.events][-10:],
+            }
+
+    def get_stats(self):
+        return {
+            'offered': self.offered,
+            'analysed': self.analysed,
+            'skipped_busy': self.skipped_busy,
+            'mean_ms': round(self.total_ms / self.analysed, 3) if self.analysed else 0.0,
+            'events': len(self.events),
+        }
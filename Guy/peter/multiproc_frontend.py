@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Multi-process viewer front-end.
+
+ThreadedHTTPServer serves every viewer from one GIL-bound process. With
+FRONTEND_WORKERS > 0 web_fixed.py instead forks N worker processes that all
+bind the public PORT with SO_REUSEPORT, so the kernel spreads connections
+across them. The capture process publishes each encoded JPEG into a
+SharedFrameSlot and the workers read it from shared memory.
+
+Workers serve /stream.mjpg and the static assets themselves. Everything else
+(/tank_command, /get_*, /laser_*) is forwarded to the single process that owns
+the serial port, which listens on 127.0.0.1:CONTROL_PORT. Responses without a
+length (the owner's other streams and /events) are relayed as they arrive,
+one owner connection per client, instead of being read whole.
+"""
+import http.client
+import multiprocessing
+import os
+import socket
+import struct
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, HTTPServer
+from multiprocessing import shared_memory
+from socketserver import ThreadingMixIn
+
+from keepalive_http import KeepAliveMixin
+
+# Configuration
+MAX_FRAME_BYTES = 512 * 1024  # Largest JPEG the slot can hold (640x480 q80 is ~40-60 KB)
+SLOT_POLL_INTERVAL = 0.005    # How often each worker checks the slot for a new frame
+CONTROL_TIMEOUT = 2.0
+STREAM_TIMEOUT = 40.0  # Longest quiet relayed stream; /events sends a heartbeat every 15 s
+# Headers passed to the owner, and back from it (conditional /state, ranged recordings, /events resume)
+FORWARDED_REQUEST_HEADERS = ('If-None-Match', 'Range', 'Last-Event-ID')
+FORWARDED_RESPONSE_HEADERS = ('ETag', 'Cache-Control', 'Content-Range', 'Accept-Ranges', 'X-Frame-Timestamp')
+# Files served directly by the workers (loaded once per worker)
+STATIC_FILES = {
+    '/index.html': ('index_fixed.html', 'text/html'),
+    '/gunshot.mp3': ('gunshot.mp3', 'audio/mpeg'),
+}
+# ----------------------------------------------------
+
+# Slot header: sequence number (odd while the writer is mid-update), frame length
+SLOT_HEADER = struct.Struct('<QI')
+
+
+class SharedFrameSlot:
+    """
+    Single-writer / many-reader shared-memory slot holding the newest JPEG.
+
+    Uses a sequence lock: the writer bumps the sequence to an odd value, copies
+    the frame, then bumps it to the next even value. Readers retry if the
+    sequence changed (or was odd) while they copied.
+    Create it in the parent before forking so workers inherit the mapping.
+    """
+    def __init__(self, capacity=MAX_FRAME_BYTES):
+        self.shm = shared_memory.SharedMemory(create=True, size=SLOT_HEADER.size + capacity)
+        self.buf = self.shm.buf
+        self.capacity = capacity
+        SLOT_HEADER.pack_into(self.buf, 0, 0, 0)
+        self.dropped = 0
+
+    def write(self, frame):
+        size = len(frame)
+        if size > self.capacity:
+            self.dropped += 1
+            return False
+        sequence, _ = SLOT_HEADER.unpack_from(self.buf, 0)
+        SLOT_HEADER.pack_into(self.buf, 0, sequence + 1, size)
+        self.buf[SLOT_HEADER.size:SLOT_HEADER.size + size] = frame
+        SLOT_HEADER.pack_into(self.buf, 0, sequence + 2, size)
+        return True
+
+    def read(self, last_sequence):
+        """
+        :param last_sequence: Sequence of the frame the caller already has.
+        :return: (sequence, frame_bytes), or (last_sequence, None) if no new frame.
+        """
+        while True:
+            sequence, size = SLOT_HEADER.unpack_from(self.buf, 0)
+            if sequence == last_sequence or sequence == 0:
+                return last_sequence, None
+            if sequence & 1:
+                continue  # Writer is mid-update
+            frame = bytes(self.buf[SLOT_HEADER.size:SLOT_HEADER.size + size])
+            if SLOT_HEADER.unpack_from(self.buf, 0)[0] == sequence:
+                return sequence, frame
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class WorkerOutput:
+    """Per-worker copy of the newest frame, fed by one slot-polling thread."""
+    def __init__(self):
+        self.frame = None
+        self.condition = threading.Condition()
+
+    def write(self, buf):
+        with self.condition:
+            self.frame = buf
+            self.condition.notify_all()
+
+
+def slot_pump_thread(slot, worker_output):
+    """Moves new frames from shared memory into the worker's local output."""
+    sequence = 0
+    while True:
+        sequence, frame = slot.read(sequence)
+        if frame is not None:
+            worker_output.write(frame)
+        else:
+            time.sleep(SLOT_POLL_INTERVAL)
+
+
+class ReusePortHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+def make_worker_handler(worker_output, static_content, control_port):
+    class FrontendHandler(KeepAliveMixin, SimpleHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == '/':
+                self.send_response(301)
+                self.send_header('Location', '/index.html')
+                self.send_header('Content-Length', 0)
+                self.end_headers()
+            elif self.path in static_content:
+                content_type, content = static_content[self.path]
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', len(content))
+                self.end_headers()
+                self.wfile.write(content)
+            elif self.path == '/stream.mjpg' or self.path.startswith('/stream.mjpg?'):
+                # ?zoom=&cx=&cy= sets the owner's digital zoom, which applies to the shared frames
+                query = self.path.partition('?')[2]
+                if query and not self.set_owner_zoom(query):
+                    return
+                self.send_response(200)
+                self.send_header('Age', 0)
+                self.send_header('Cache-Control', 'no-cache, private')
+                self.send_header('Pragma', 'no-cache')
+                self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=FRAME')
+                self.end_headers()
+                try:
+                    while True:
+                        with worker_output.condition:
+                            worker_output.condition.wait()
+                            frame = worker_output.frame
+                        self.wfile.write(b'--FRAME\r\n')
+                        self.send_header('Content-Type', 'image/jpeg')
+                        self.send_header('Content-Length', len(frame))
+                        self.end_headers()
+                        self.wfile.write(frame)
+                        self.wfile.write(b'\r\n')
+                except Exception:
+                    pass
+            else:
+                self.forward_to_owner()
+
+        def set_owner_zoom(self, query):
+            """/zoom?<query> on the owner; False (with the error already sent) if it was refused."""
+            conn = http.client.HTTPConnection('127.0.0.1', control_port, timeout=CONTROL_TIMEOUT)
+            try:
+                conn.request('GET', '/zoom?' + query)
+                response = conn.getresponse()
+                response.read()
+            except Exception as e:
+                self.send_error(502, f"Control process unavailable: {e}")
+                return False
+            finally:
+                conn.close()
+            if response.status != 200:
+                self.send_error(response.status, "Expected /stream.mjpg?zoom=&cx=&cy=")
+                return False
+            return True
+
+        def forward_to_owner(self):
+            """
+            Control and telemetry requests go to the serial-owning process. The response is relayed chunk by
+            chunk, never read whole: its streams (/stream/<name>.mjpg, zoomed /stream.mjpg, replay, playback,
+            /events) have no Content-Length and last for as long as both sides stay connected.
+            """
+            conn = http.client.HTTPConnection('127.0.0.1', control_port, timeout=CONTROL_TIMEOUT)
+            try:
+                headers = {name: self.headers[name] for name in FORWARDED_REQUEST_HEADERS if self.headers.get(name)}
+                conn.request('GET', self.path, headers=headers)
+                sock = conn.sock  # A response without a length takes it over
+                response = conn.getresponse()
+                self.send_response(response.status)
+                if response.status not in (204, 304):
+                    self.send_header('Content-Type', response.getheader('Content-Type', 'text/plain'))
+                for name in FORWARDED_RESPONSE_HEADERS:
+                    if response.getheader(name) is not None:
+                        self.send_header(name, response.getheader(name))
+                if response.length is None:
+                    sock.settimeout(STREAM_TIMEOUT)
+                elif response.status not in (204, 304):
+                    self.send_header('Content-Length', response.length)
+                self.end_headers()
+            except Exception as e:
+                conn.close()
+                self.send_error(502, f"Control process unavailable: {e}")
+                return
+            try:
+                while True:
+                    chunk = response.read1(65536)
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+            except Exception:
+                self.close_connection = True  # The client cannot tell a cut-off body from the next response
+            finally:
+                conn.close()
+
+    return FrontendHandler
+
+
+def load_static_files():
+    static_content = {}
+    for path, (filename, content_type) in STATIC_FILES.items():
+        try:
+            with open(filename, 'rb') as f:
+                static_content[path] = (content_type, f.read())
+        except FileNotFoundError:
+            print(f"Front-end: static file {filename} not found, {path} will be forwarded")
+    return static_content
+
+
+def frontend_worker(worker_index, slot, port, control_port):
+    worker_output = WorkerOutput()
+    threading.Thread(target=slot_pump_thread, args=(slot, worker_output), daemon=True).start()
+    handler = make_worker_handler(worker_output, load_static_files(), control_port)
+    server = ReusePortHTTPServer(('', port), handler)
+    print(f"Front-end worker {worker_index} (pid {os.getpid()}) listening on port {port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def start_frontend_workers(count, slot, port, control_port):
+    """
+    Fork `count` front-end workers sharing `port` via SO_REUSEPORT.
+    Call this before starting any other threads in the parent.
+
+    :return: List of multiprocessing.Process objects.
+    """
+    context = multiprocessing.get_context('fork')
+    workers = []
+    for worker_index in range(count):
+        worker = context.Process(target=frontend_worker, args=(worker_index, slot, port, control_port),
+                                 daemon=True)
+        worker.start()
+        workers.append(worker)
+    return workers
+
+
+def stop_frontend_workers(workers):
+    for worker in workers:
+        if worker.is_alive():
+            worker.terminate()
+    for worker in workers:
+        worker.join(timeout=1)
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Asynchronous object detection (people, vehicles) in a separate process.
+
+Inference with OpenCV's DNN module takes tens to hundreds of milliseconds per
+frame on the Pi's CPU, far longer than a 24 fps frame period, so it cannot
+run on the streaming thread and should not compete with it for the GIL. Here:
+
+  - a worker process (forked, like the front-end workers) loads the network
+    and runs inference;
+  - stream_camera() offers every frame with submit(views). A frame is only
+    taken when the worker is idle and the next detection is due
+    (detection_fps), so the worker always gets the newest frame and the
+    streaming thread never waits. The 1/2-scale view from FrameViews is
+    copied into a shared-memory buffer; only the frame ID goes down the pipe;
+  - results come back with the ID of the frame they were computed on. A
+    receiver thread keeps the newest; draw() puts those boxes on the newer
+    frames being streamed and shows how many frames old they are.
+
+Default model: MobileNet-SSD (Caffe, 300x300, 20 VOC classes), small enough
+for a Pi CPU:
+
+    models/MobileNetSSD_deploy.prototxt
+    models/MobileNetSSD_deploy.caffemodel
+
+Any SSD-style network cv2.dnn.readNet() can load works if it outputs
+[1, 1, N, 7] detections (image, class, confidence, x1, y1, x2, y2 normalized);
+set classes/input_size/scale/mean to match. OpenCV 5 dropped the Caffe
+importer; there, use an ONNX export of the same network. If the model cannot
+be loaded the detector reports it and stays disabled.
+"""
+import collections
+import multiprocessing
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+VOC_CLASSES = ('background', 'aeroplane', 'bicycle', 'bird', 'boat', 'bottle', 'bus', 'car', 'cat', 'chair',
+               'cow', 'diningtable', 'dog', 'horse', 'motorbike', 'person', 'pottedplant', 'sheep', 'sofa',
+               'train', 'tvmonitor')
+PEOPLE_AND_VEHICLES = ('person', 'bicycle', 'motorbike', 'car', 'bus', 'train')
+CLASS_COLOURS = {'person': (0, 255, 255)}
+DEFAULT_COLOUR = (255, 128, 0)
+
+
+def _detector_worker(conn, shm, shape, model, config, input_size, scale, mean, swap_rb, threads):
+    """Worker process: load the network, then one inference per frame ID received."""
+    try:
+        cv2.setNumThreads(threads)
+        net = cv2.dnn.readNet(model, config)
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+    except Exception as e:
+        conn.send(('error', f"cannot load {model}: {e}"))
+        return
+    conn.send(('ready', None))
+    frame = np.ndarray(shape, np.uint8, shm.buf)
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if request is None:
+            break
+        frame_id, timestamp, (height, width) = request
+        start = time.perf_counter()
+        blob = cv2.dnn.blobFromImage(frame[:height, :width], scale, input_size, mean, swap_rb, crop=False)
+        net.setInput(blob)
+        output = net.forward()
+        inference_ms = (time.perf_counter() - start) * 1000
+        detections = output.reshape(-1, 7)
+        conn.send(('result', (frame_id, timestamp, detections[:, 1:].tolist(), inference_ms)))
+
+
+class ObjectDetector:
+    def __init__(self, model, config=None, frame_shape=(480, 640, 3), level=1, detection_fps=2.0,
+                 min_confidence=0.5, classes=VOC_CLASSES, wanted=PEOPLE_AND_VEHICLES, input_size=(300, 300),
+                 scale=0.007843, mean=(127.5, 127.5, 127.5), swap_rb=False, threads=2, max_age_frames=48):
+        """
+        :param model: Network weights (e.g. .caffemodel, .onnx, .pb).
+        :param config: Network description (e.g. .prototxt), if the format needs one.
+        :param frame_shape: Full-resolution frame shape, to size the shared buffer.
+        :param level: FrameViews pyramid level sent to the worker (1 = 1/2 scale).
+        :param detection_fps: Detections per second at most; frames in between are not sent.
+        :param wanted: Class names kept; others are dropped.
+        :param threads: OpenCV threads in the worker, leaving cores for the stream.
+        :param max_age_frames: Boxes older than this (in frames) are no longer drawn.
+        """
+        self.model = model
+        self.config = config or ''
+        self.level = level
+        self.interval = 1.0 / detection_fps
+        self.min_confidence = min_confidence
+        self.classes = classes
+        self.wanted = set(wanted)
+        self.input_size = input_size
+        self.scale = scale
+        self.mean = mean
+        self.swap_rb = swap_rb
+        self.threads = threads
+        self.max_age_frames = max_age_frames
+        self.shape = (frame_shape[0] >> level, frame_shape[1] >> level, 3)
+
+        self.shm = None
+        self.conn = None
+        self.process = None
+        self.ready = False
+        self.stopping = False
+        self.busy = False
+        self.next_due = 0.0
+        self.submitted_at = 0.0
+        self.lock = threading.Lock()
+        self.detections = []  # [(class name, confidence, (x1, y1, x2, y2) normalized)]
+        self.detections_frame_id = 0
+        self.detections_time = 0.0
+        self.latest_frame_id = 0
+        # Stats
+        self.offered = 0
+        self.submitted = 0
+        self.completed = 0
+        self.skipped_busy = 0
+        self.inference_ms = collections.deque(maxlen=50)
+        self.round_trip_ms = collections.deque(maxlen=50)
+        self.ages = collections.deque(maxlen=50)  # Result age in frames when it arrived
+
+    def start(self):
+        """
+        Fork the worker process. Call before the parent starts other threads,
+        like start_frontend_workers().
+        """
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.shape)))
+        self.conn, child_conn = multiprocessing.Pipe()
+        context = multiprocessing.get_context('fork')
+        self.process = context.Process(
+            target=_detector_worker,
+            args=(child_conn, self.shm, self.shape, self.model, self.config, self.input_size, self.scale,
+                  self.mean, self.swap_rb, self.threads),
+            daemon=True)
+        self.process.start()
+        self.frame = np.ndarray(self.shape, np.uint8, self.shm.buf)
+        threading.Thread(target=self._receive, daemon=True).start()
+
+    def stop(self):
+        if self.process is None:
+            return
+        self.stopping = True
+        self.ready = False
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.frame = None
+        self.shm.close()
+        self.shm.unlink()
+        self.process = None
+
+    def submit(self, views):
+        """Called from stream_camera() for every frame; cheap unless a detection is due and the worker is idle."""
+        self.offered += 1
+        self.latest_frame_id = views.frame_id
+        now = time.monotonic()
+        if not self.ready or now < self.next_due:
+            return
+        if self.busy:
+            self.skipped_busy += 1
+            return
+        small = views.level(self.level)
+        height, width = small.shape[:2]
+        if height > self.shape[0] or width > self.shape[1]:
+            return
+        self.frame[:height, :width] = small
+        self.busy = True
+        self.next_due = now + self.interval
+        self.submitted_at = now
+        self.submitted += 1
+        self.conn.send((views.frame_id, views.timestamp, (height, width)))
+
+    def _receive(self):
+        while True:
+            try:
+                kind, payload = self.conn.recv()
+            except (EOFError, OSError):
+                if not self.stopping:
+                    print("Object detector: worker process exited")
+                self.ready = False
+                return
+            if kind == 'error':
+                print(f"Object detector disabled: {payload}")
+                return
+            if kind == 'ready':
+                print(f"Object detector ready ({self.model})")
+                self.ready = True
+                continue
+            frame_id, timestamp, rows, inference_ms = payload
+            detections = []
+            for class_id, confidence, x1, y1, x2, y2 in rows:
+                class_id = int(class_id)
+                name = self.classes[class_id] if 0 <= class_id < len(self.classes) else str(class_id)
+                if confidence < self.min_confidence or name not in self.wanted:
+                    continue
+                box = tuple(min(max(v, 0.0), 1.0) for v in (x1, y1, x2, y2))
+                detections.append((name, float(confidence), box))
+            with self.lock:
+                self.detections = detections
+                self.detections_frame_id = frame_id
+                self.detections_time = timestamp or time.time()
+            self.completed += 1
+            self.inference_ms.append(inference_ms)
+            self.round_trip_ms.append((time.monotonic() - self.submitted_at) * 1000)
+            self.ages.append(self.latest_frame_id - frame_id)
+            self.busy = False
+
+    def age_frames(self, frame_id=None):
+        """How many frames older than frame_id (default: the newest offered) the current boxes are."""
+        if not self.detections_frame_id:
+            return None
+        return (frame_id or self.latest_frame_id) - self.detections_frame_id
+
+    def draw(self, frame, frame_id):
+        """Draw the newest detections on a (newer) frame, labelled with their age in frames."""
+        with self.lock:
+            detections = list(self.detections)
+            detected_on = self.detections_frame_id
+        age = frame_id - detected_on
+        if not detections or age > self.max_age_frames:
+            return frame
+        height, width = frame.shape[:2]
+        for name, confidence, (x1, y1, x2, y2) in detections:
+            colour = CLASS_COLOURS.get(name, DEFAULT_COLOUR)
+            p1 = (int(x1 * width), int(y1 * height))
+            p2 = (int(x2 * width), int(y2 * height))
+            cv2.rectangle(frame, p1, p2, colour, 2)
+            cv2.putText(frame, f"{name} {confidence:.0%} -{age}f", (p1[0], max(p1[1] - 5, 12)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.45, colour, 1, cv2.LINE_AA)
+        return frame
+
+    def get_state(self):
+        with self.lock:
+            detections = [{'class': name, 'confidence': round(confidence, 3), 'box': [round(v, 4) for v in box]}
+                          for name, confidence, box in self.detections]
+            frame_id = self.detections_frame_id
+            detected_at = self.detections_time
+        return {
+            'ready': self.ready,
+            'frame_id': frame_id,
+            'age_frames': self.age_frames(),
+            'age_s': round(time.time() - detected_at, 3) if detected_at else None,
+            'detections': detections,
+            'stats': self.get_stats(),
+        }
+
+    def get_stats(self):
+        inference = list(self.inference_ms)
+        round_trip = list(self.round_trip_ms)
+        ages = list(self.ages)
+        return {
+            'offered': self.offered,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'skipped_busy': self.skipped_busy,
+            'inference_ms': round(float(np.mean(inference)), 1) if inference else 0.0,
+            'inference_max_ms': round(float(max(inference)), 1) if inference else 0.0,
+            'round_trip_ms': round(float(np.mean(round_trip)), 1) if round_trip else 0.0,
+            'age_frames_on_arrival': round(float(np.mean(ages)), 1) if ages else 0.0,
+        }
+
+    def summary(self):
+        stats = self.get_stats()
+        return (f"{stats['completed']} detections, inference {stats['inference_ms']} ms "
+                f"(max {stats['inference_max_ms']}), round trip {stats['round_trip_ms']} ms, "
+                f"results {stats['age_frames_on_arrival']} frames old on arrival")
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Cylindrical panorama from a turret pan sweep.
+
+PanoramaSweep turns the turret in fixed steps; at each position it waits for
+the turret to settle, takes the next clean frame from stream_camera() (before
+zoom and overlays) and hands it to the PanoramaBuilder with its pan angle.
+
+Alignment uses the step count as the prior: a frame taken at pan angle theta
+lands at x = focal * theta on the cylinder, so no feature matching is needed.
+Step loss and backlash leave a few pixels of error, which a phase correlation
+on the overlap with the panorama so far corrects (bounded by max_refine_px, so
+it can only refine the prior, never replace it).
+
+Each frame is warped onto the cylinder with remap maps computed once for the
+frame size, and feather-blended (weights falling off towards the frame edges)
+into a float accumulator. All of this runs on the builder's worker thread;
+the streaming thread only copies one frame per sweep position. The JPEG served
+at /panorama.jpg is re-encoded only after new frames were added.
+"""
+import io
+import math
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+def cylindrical_maps(size, focal_px):
+    """remap() maps warping a (width, height) frame onto a cylinder of radius focal_px (same output size)."""
+    width, height = size
+    cx, cy = width / 2.0, height / 2.0
+    xs, ys = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+    theta = (xs - cx) / focal_px
+    h = (ys - cy) / focal_px
+    map_x = focal_px * np.tan(theta) + cx
+    map_y = focal_px * h / np.cos(theta) + cy
+    return cv2.convertMaps(map_x.astype(np.float32), map_y.astype(np.float32), cv2.CV_16SC2)
+
+
+class PanoramaBuilder:
+    def __init__(self, focal_px, span_deg=360.0, max_refine_px=24, jpeg_quality=85):
+        """
+        :param focal_px: Camera focal length in pixels (at the size of the frames added).
+        :param span_deg: Pan range covered; sets the canvas width.
+        :param max_refine_px: Largest correction the overlap registration may apply to the step-count prior.
+        """
+        self.focal_px = focal_px
+        self.span_deg = span_deg
+        self.max_refine_px = max_refine_px
+        self.jpeg_quality = jpeg_quality
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.maps = None
+        self.weights = None
+        self.canvas = None  # Weighted colour sum, float32
+        self.weight_sum = None
+        self.frame_size = None
+        self.frames_added = 0
+        self.refinements = []  # Pixel correction applied to each frame's prior
+        self.build_ms = 0.0
+        self.jpeg = None
+        self.dirty = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def add(self, frame, angle_deg):
+        """Queue a frame taken at pan angle angle_deg (0 = first frame of the sweep). Returns at once."""
+        self.queue.put((frame, angle_deg))
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def _run(self):
+        while True:
+            frame, angle_deg = self.queue.get()
+            if frame is None:
+                return
+            try:
+                start = time.perf_counter()
+                self._add(frame, angle_deg)
+                self.build_ms += (time.perf_counter() - start) * 1000
+            except Exception as e:
+                print(f"Panorama: frame at {angle_deg:.1f} deg failed: {e}")
+
+    def _setup(self, size):
+        width, height = size
+        self.frame_size = size
+        self.maps = cylindrical_maps(size, self.focal_px)
+        # Valid area of the warped frame, feathered towards its edges
+        valid = cv2.remap(np.full((height, width), 255, np.uint8), self.maps[0], self.maps[1], cv2.INTER_NEAREST)
+        ramp_x = np.minimum(np.arange(width), np.arange(width)[::-1]).astype(np.float32) + 1
+        ramp_y = np.minimum(np.arange(height), np.arange(height)[::-1]).astype(np.float32) + 1
+        self.weights = np.outer(ramp_y, ramp_x) * (valid > 0)
+        canvas_width = int(math.ceil(self.focal_px * math.radians(self.span_deg))) + width
+        self.canvas = np.zeros((height, canvas_width, 3), np.float32)
+        self.weight_sum = np.zeros((height, canvas_width), np.float32)
+
+    def _add(self, frame, angle_deg):
+        size = (frame.shape[1], frame.shape[0])
+        if self.canvas is None:
+            self._setup(size)
+        elif size != self.frame_size:
+            raise ValueError(f"frame size {size} differs from the sweep's {self.frame_size}")
+        warped = cv2.remap(frame, self.maps[0], self.maps[1], cv2.INTER_LINEAR)
+        width = size[0]
+        x = int(round(self.focal_px * math.radians(angle_deg)))
+        x = min(max(x, 0), self.canvas.shape[1] - width)
+        if self.frames_added:
+            x += self._refine(warped, x)
+            x = min(max(x, 0), self.canvas.shape[1] - width)
+        with self.lock:
+            region = self.canvas[:, x:x + width]
+            region += warped.astype(np.float32) * self.weights[:, :, None]
+            self.weight_sum[:, x:x + width] += self.weights
+            self.frames_added += 1
+            self.dirty = True
+
+    def _refine(self, warped, x):
+        """Horizontal correction of the prior x from the overlap with what is already stitched."""
+        width = warped.shape[1]
+        covered = self.weight_sum[:, x:x + width].max(axis=0) > 0
+        columns = np.flatnonzero(covered)
+        if len(columns) < 32:
+            self.refinements.append(0)
+            return 0
+        c0, c1 = columns[0], columns[-1] + 1
+        existing = self.canvas[:, x + c0:x + c1] / np.maximum(self.weight_sum[:, x + c0:x + c1, None], 1e-6)
+        a = cv2.cvtColor(existing.astype(np.uint8), cv2.COLOR_BGR2GRAY).astype(np.float32)
+        b = cv2.cvtColor(warped[:, c0:c1], cv2.COLOR_BGR2GRAY).astype(np.float32)
+        window = cv2.createHanningWindow((b.shape[1], b.shape[0]), cv2.CV_32F)
+        (dx, _), response = cv2.phaseCorrelate(a, b, window)
+        correction = int(round(-dx)) if response > 0.05 and abs(dx) <= self.max_refine_px else 0
+        self.refinements.append(correction)
+        return correction
+
+    def render(self):
+        """The panorama as JPEG bytes (cached until frames are added), or None before the first frame."""
+        with self.lock:
+            if self.canvas is None:
+                return None
+            if not self.dirty and self.jpeg is not None:
+                return self.jpeg
+            image = self.canvas / np.maximum(self.weight_sum[:, :, None], 1e-6)
+            columns = np.flatnonzero(self.weight_sum.max(axis=0) > 0)
+            self.dirty = False
+        image = image[:, columns[0]:columns[-1] + 1].astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)).save(buffer, format='JPEG', quality=self.jpeg_quality)
+        self.jpeg = buffer.getvalue()
+        return self.jpeg
+
+    def get_stats(self):
+        return {
+            'frames': self.frames_added,
+            'pending': self.pending(),
+            'size': [int(self.canvas.shape[1]), int(self.canvas.shape[0])] if self.canvas is not None else None,
+            'refinements_px': list(self.refinements),
+            'mean_ms_per_frame': round(self.build_ms / self.frames_added, 1) if self.frames_added else 0.0,
+        }
+
+    def close(self):
+        self.queue.put((None, None))
+
+
+class PanoramaSweep(threading.Thread):
+    def __init__(self, send_pan, steps_per_degree, focal_px, span_deg=360.0, step_deg=20.0, settle_s=0.8,
+                 step_quantum=1, frame_timeout=2.0):
+        """
+        :param send_pan: send_pan(steps) turns the turret, positive = right; returns once the firmware has
+            taken the move (web_fixed.send_turret_command() waits for its lines to be read).
+        :param focal_px: Focal length at the size of the frames stream_camera() offers.
+        :param step_deg: Pan between frames; keep well under the horizontal field of view for overlap.
+        :param settle_s: Wait after each move before taking the frame (turret and EIS settle).
+        :param step_quantum: Steps the turret moves per command unit (10 per TLR line), steps are rounded to it.
+        """
+        super().__init__(daemon=True)
+        self.send_pan = send_pan
+        self.steps_per_degree = steps_per_degree
+        self.settle_s = settle_s
+        self.frame_timeout = frame_timeout
+        steps = max(step_quantum, int(round(step_deg * steps_per_degree / step_quantum)) * step_quantum)
+        self.step_steps = steps
+        self.step_deg = steps / steps_per_degree
+        self.positions = int(span_deg // self.step_deg) + 1
+        self.builder = PanoramaBuilder(focal_px, self.step_deg * (self.positions - 1))
+        self.condition = threading.Condition()
+        self.want_frame = False
+        self.frame = None
+        self.running = True
+        self.position = 0
+        self.state = 'starting'
+        self.started = time.time()
+
+    def offer(self, frame):
+        """Called from stream_camera() for every frame; copies it only when the sweep is waiting for one."""
+        if not self.want_frame:
+            return
+        with self.condition:
+            self.frame = frame.copy()
+            self.want_frame = False
+            self.condition.notify()
+
+    def _grab(self):
+        with self.condition:
+            self.frame = None
+            self.want_frame = True
+            self.condition.wait_for(lambda: self.frame is not None or not self.running, self.frame_timeout)
+            self.want_frame = False
+            return self.frame
+
+    def run(self):
+        moved = 0
+        try:
+            for self.position in range(self.positions):
+                if not self.running:
+                    break
+                self.state = 'sweeping'
+                time.sleep(self.settle_s)
+                frame = self._grab()
+                if frame is None:
+                    print("Panorama: no frame from the stream, sweep aborted")
+                    break
+                self.builder.add(frame, moved / self.steps_per_degree)
+                if self.position < self.positions - 1:
+                    self.send_pan(self.step_steps)
+                    moved += self.step_steps
+        except Exception as e:
+            print(f"Panorama sweep failed: {e}")
+        finally:
+            # Back to where the sweep started
+            if moved:
+                self.state = 'returning'
+                try:
+                    self.send_pan(-moved)
+                except Exception as e:
+                    print(f"Panorama: could not return the turret: {e}")
+            self.state = 'stitching' if self.builder.pending() else 'done'
+            print(f"Panorama sweep finished: {self.position + 1} of {self.positions} positions in "
+                  f"{time.time() - self.started:.1f}s")
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+
+    def get_state(self):
+        state = self.state
+        if state == 'stitching' and not self.builder.pending():
+            state = self.state = 'done'
+        return {
+            'state': state,
+            'position': self.position + 1,
+            'positions': self.positions,
+            'step_deg': round(self.step_deg, 2),
+            'step_steps': self.step_steps,
+            'builder': self.builder.get_stats(),
+        }
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Rolling segmented recorder for the already-encoded JPEG stream.
+
+stream_camera() hands every JPEG to SegmentRecorder.submit(), which only
+appends a reference to a bounded queue, so recording never re-encodes and never
+blocks the live stream (if the disk falls behind, frames are dropped from the
+recording, not from the stream).
+
+A background thread writes the frames with batched os.writev() calls into
+time-segmented files:
+
+    recordings/seg_<start_ms>.mjpg   concatenated JPEGs (plays in ffplay/VLC as MJPEG)
+    recordings/seg_<start_ms>.idx    16-byte records: timestamp_ms, offset, size
+
+Oldest segments are deleted once the directory exceeds max_bytes. The cap is
+checked whenever a new segment starts, so the directory can overshoot it by at
+most one segment.
+
+HTTP (see handle_recordings_request):
+    /recordings                       JSON list of segments
+    /recordings/<segment file>        raw .mjpg / .idx, supports Range requests
+    /recordings/frame.jpg?t=<unix>    single frame closest to a timestamp
+    /recordings/play.mjpg?t=<unix>    multipart playback starting at a timestamp
+"""
+import bisect
+import collections
+import json
+import math
+import os
+import re
+import struct
+import threading
+import time
+import urllib.parse
+
+# Index record: timestamp (ms since epoch), byte offset in the segment, JPEG size
+INDEX_RECORD = struct.Struct('<QII')
+SEGMENT_PATTERN = re.compile(r'^seg_(\d+)\.(mjpg|idx)$')
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+FILE_CHUNK_BYTES = 256 * 1024  # Segment download writes when the handler has no socket to sendfile() on
+
+
+class SegmentRecorder:
+    def __init__(self, directory, segment_seconds=60, max_bytes=2 * 1024 ** 3,
+                 batch_frames=24, flush_interval=1.0, queue_frames=240):
+        """
+        :param directory: Where segment and index files are written.
+        :param segment_seconds: Length of each segment before rotating.
+        :param max_bytes: Disk budget for all segments, oldest evicted first.
+        :param batch_frames: Frames gathered into a single writev() call.
+        :param flush_interval: Max seconds a frame waits in memory before being written.
+        :param queue_frames: Frames buffered for the writer before new ones are dropped.
+        """
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.max_bytes = max_bytes
+        self.batch_frames = batch_frames
+        self.flush_interval = flush_interval
+        self.queue = collections.deque(maxlen=queue_frames)
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        # Stats
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.bytes_written = 0
+        self.segments_evicted = 0
+        # Current segment, only touched by the writer thread
+        self.segment_start_ms = None
+        self.data_fd = None
+        self.index_fd = None
+        self.data_offset = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.thread.start()
+        print(f"Recorder writing {self.segment_seconds}s segments to {self.directory}/")
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+
+    def submit(self, jpeg, timestamp=None):
+        """Called from stream_camera(). O(1), never blocks on disk."""
+        timestamp_ms = int((timestamp if timestamp is not None else time.time()) * 1000)
+        with self.condition:
+            if len(self.queue) == self.queue.maxlen:
+                self.frames_dropped += 1  # deque drops the oldest queued frame
+            self.queue.append((timestamp_ms, jpeg))
+            if len(self.queue) >= self.batch_frames:
+                self.condition.notify()
+
+    # ------------------------------------------------
+    # Writer thread
+    def _writer_loop(self):
+        while self.running or self.queue:
+            with self.condition:
+                if len(self.queue) < self.batch_frames and self.running:
+                    self.condition.wait(self.flush_interval)
+                batch = list(self.queue)
+                self.queue.clear()
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except OSError as e:
+                    print(f"Recorder write error: {e}")
+                    self._close_segment()
+                    time.sleep(1)
+        self._close_segment()
+
+    def _write_batch(self, batch):
+        data_buffers = []
+        index_buffers = []
+        for timestamp_ms, jpeg in batch:
+            if self.data_fd is None or timestamp_ms - self.segment_start_ms >= self.segment_seconds * 1000:
+                if data_buffers:
+                    self._writev(data_buffers, index_buffers)
+                    data_buffers, index_buffers = [], []
+                self._open_segment(timestamp_ms)
+            index_buffers.append(INDEX_RECORD.pack(timestamp_ms, self.data_offset, len(jpeg)))
+            data_buffers.append(jpeg)
+            self.data_offset += len(jpeg)
+        if data_buffers:
+            self._writev(data_buffers, index_buffers)
+
+    def _writev(self, data_buffers, index_buffers):
+        # Data first so an index record never points past the end of the segment
+        expected = sum(len(b) for b in data_buffers)
+        written = os.writev(self.data_fd, data_buffers)
+        if written != expected:
+            # Partial writev (rare, e.g. disk almost full): finish with plain writes
+            remaining = b''.join(data_buffers)[written:]
+            while remaining:
+                remaining = remaining[os.write(self.data_fd, remaining):]
+        os.writev(self.index_fd, index_buffers)
+        self.frames_written += len(data_buffers)
+        self.bytes_written += expected
+
+    def _open_segment(self, timestamp_ms):
+        self._close_segment()
+        self.segment_start_ms = timestamp_ms
+        base = os.path.join(self.directory, f"seg_{timestamp_ms}")
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        self.data_fd = os.open(base + '.mjpg', flags, 0o644)
+        self.index_fd = os.open(base + '.idx', flags, 0o644)
+        self.data_offset = 0
+        self._evict_old_segments()
+
+    def _close_segment(self):
+        for fd in (self.data_fd, self.index_fd):
+            if fd is not None:
+                os.close(fd)
+        self.data_fd = None
+        self.index_fd = None
+
+    def _evict_old_segments(self):
+        segments = list_segments(self.directory)
+        total = sum(s['bytes'] + s['index_bytes'] for s in segments)
+        # Never evict the segment currently being written (the newest one)
+        for segment in segments[:-1]:
+            if total <= self.max_bytes:
+                break
+            for suffix in ('.mjpg', '.idx'):
+                try:
+                    os.remove(os.path.join(self.directory, segment['name'] + suffix))
+                except FileNotFoundError:
+                    pass
+            total -= segment['bytes'] + segment['index_bytes']
+            self.segments_evicted += 1
+            print(f"Recorder: evicted {segment['name']} (disk cap {self.max_bytes / 1e6:.0f} MB)")
+
+    def get_stats(self):
+        return {
+            'frames_written': self.frames_written,
+            'frames_dropped': self.frames_dropped,
+            'bytes_written': self.bytes_written,
+            'segments_evicted': self.segments_evicted,
+            'queued': len(self.queue),
+        }
+
+
+# ----------------------------------------------------
+# Reading side (used by the HTTP handler, works on closed and open segments)
+def list_segments(directory):
+    """Segments sorted oldest first."""
+    segments = []
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return segments
+    for name in names:
+        match = SEGMENT_PATTERN.match(name)
+        if not match or match.group(2) != 'mjpg':
+            continue
+        base = name[:-len('.mjpg')]
+        try:
+            data_bytes = os.path.getsize(os.path.join(directory, name))
+            index_bytes = os.path.getsize(os.path.join(directory, base + '.idx'))
+        except FileNotFoundError:
+            continue
+        segments.append({
+            'name': base,
+            'start_ms': int(match.group(1)),
+            'bytes': data_bytes,
+            'index_bytes': index_bytes,
+            'frames': index_bytes // INDEX_RECORD.size,
+        })
+    segments.sort(key=lambda s: s['start_ms'])
+    return segments
+
+
+def read_index(directory, segment_name):
+    """:return: List of (timestamp_ms, offset, size) tuples for a segment."""
+    with open(os.path.join(directory, segment_name + '.idx'), 'rb') as f:
+        raw = f.read()
+    usable = len(raw) - len(raw) % INDEX_RECORD.size  # Ignore a half-written tail record
+    return list(INDEX_RECORD.iter_unpack(raw[:usable]))
+
+
+def find_frame(directory, timestamp_ms):
+    """
+    Locate the first frame at or after timestamp_ms using the segment indexes.
+
+    :return: (segment_name, index_list, position) or None.
+    """
+    segments = list_segments(directory)
+    starts = [s['start_ms'] for s in segments]
+    position = bisect.bisect_right(starts, timestamp_ms) - 1
+    for segment in segments[max(position, 0):]:
+        index = read_index(directory, segment['name'])
+        frame_position = bisect.bisect_left(index, (timestamp_ms, 0, 0))
+        if frame_position < len(index):
+            return segment['name'], index, frame_position
+    return None
+
+
+def read_frame(f, record):
+    _, offset, size = record
+    f.seek(offset)
+    return f.read(size)
+
+
+def parse_range(range_header, file_size):
+    """
+    :return: (start, end_inclusive), None for no/ignored Range, or 'invalid'.
+    """
+    if not range_header:
+        return None
+    match = RANGE_PATTERN.match(range_header.strip())
+    if not match:
+        return None  # Multi-range and other units: serve the whole file
+    first, last = match.groups()
+    if first == '' and last == '':
+        return 'invalid'
+    if first == '':
+        suffix = int(last)
+        if suffix == 0:
+            return 'invalid'
+        return max(file_size - suffix, 0), file_size - 1
+    start = int(first)
+    end = int(last) if last else file_size - 1
+    if start >= file_size or end < start:
+        return 'invalid'
+    return start, min(end, file_size - 1)
+
+
+# ----------------------------------------------------
+# HTTP
+def handle_recordings_request(handler, directory):
+    """Serve /recordings routes on a BaseHTTPRequestHandler."""
+    parsed = urllib.parse.urlsplit(handler.path)
+    params = urllib.parse.parse_qs(parsed.query)
+    route = parsed.path[len('/recordings'):].lstrip('/')
+
+    if route == '':
+        body = json.dumps(list_segments(directory)).encode('utf-8')
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', len(body))
+        handler.end_headers()
+        handler.wfile.write(body)
+    elif route in ('frame.jpg', 'play.mjpg'):
+        try:
+            timestamp_ms = int(float(params['t'][0]) * 1000)
+        except (KeyError, ValueError, OverflowError):
+            handler.send_error(400, "Missing or invalid t=<unix timestamp>")
+            return
+        try:
+            speed = float(params.get('speed', ['1'])[0])
+            if not math.isfinite(speed) or speed <= 0:
+                raise ValueError
+        except ValueError:
+            handler.send_error(400, "Invalid speed=<playback rate>, expected a positive number")
+            return
+        located = find_frame(directory, timestamp_ms)
+        if located is None:
+            handler.send_error(404, "No recording at or after that time")
+            return
+        if route == 'frame.jpg':
+            _send_single_frame(handler, directory, located)
+        else:
+            _send_playback(handler, directory, located, max(speed, 0.1))
+    elif SEGMENT_PATTERN.match(route):
+        _send_segment_file(handler, os.path.join(directory, route))
+    else:
+        handler.send_error(404)
+
+
+def _send_single_frame(handler, directory, located):
+    segment_name, index, position = located
+    with open(os.path.join(directory, segment_name + '.mjpg'), 'rb') as f:
+        frame = read_frame(f, index[position])
+    handler.send_response(200)
+    handler.send_header('Content-Type', 'image/jpeg')
+    handler.send_header('Content-Length', len(frame))
+    handler.send_header('X-Frame-Timestamp', f"{index[position][0] / 1000:.3f}")
+    handler.end_headers()
+    handler.wfile.write(frame)
+
+
+def _send_playback(handler, directory, located, speed):
+    """Multipart playback from the located frame, paced by the recorded timestamps."""
+    segment_name, index, position = located
+    handler.send_response(200)
+    handler.send_header('Cache-Control', 'no-cache, private')
+    handler.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=FRAME')
+    handler.end_headers()
+    segment_names = [s['name'] for s in list_segments(directory)]
+    try:
+        segment_position = segment_names.index(segment_name)
+    except ValueError:
+        return
+    playback_start = time.time()
+    first_timestamp = index[position][0]
+    try:
+        while True:
+            with open(os.path.join(directory, segment_name + '.mjpg'), 'rb') as f:
+                for record in index[position:]:
+                    delay = (record[0] - first_timestamp) / 1000 / speed - (time.time() - playback_start)
+                    if delay > 0:
+                        time.sleep(delay)
+                    frame = read_frame(f, record)
+                    handler.wfile.write(b'--FRAME\r\n')
+                    handler.send_header('Content-Type', 'image/jpeg')
+                    handler.send_header('Content-Length', len(frame))
+                    handler.end_headers()
+                    handler.wfile.write(frame)
+                    handler.wfile.write(b'\r\n')
+            segment_position += 1
+            if segment_position >= len(segment_names):
+                break
+            segment_name = segment_names[segment_position]
+            index = read_index(directory, segment_name)
+            position = 0
+    except (OSError, ValueError):
+        pass  # Viewer went away or segment was evicted mid-playback
+
+
+def _send_segment_file(handler, file_path):
+    try:
+        f = open(file_path, 'rb')
+    except FileNotFoundError:
+        handler.send_error(404, 'File Not Found: %s' % handler.path)
+        return
+    with f:
+        file_size = os.fstat(f.fileno()).st_size
+        byte_range = parse_range(handler.headers.get('Range'), file_size)
+        if byte_range == 'invalid':
+            handler.send_response(416)
+            handler.send_header('Content-Range', f'bytes */{file_size}')
+            handler.send_header('Content-Length', 0)
+            handler.end_headers()
+            return
+        content_type = 'video/x-motion-jpeg' if file_path.endswith('.mjpg') else 'application/octet-stream'
+        if byte_range is None:
+            start, end = 0, file_size - 1
+            handler.send_response(200)
+        else:
+            start, end = byte_range
+            handler.send_response(206)
+            handler.send_header('Content-Range', f'bytes {start}-{end}/{file_size}')
+        length = end - start + 1 if file_size else 0
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Accept-Ranges', 'bytes')
+        handler.send_header('Content-Length', length)
+        handler.end_headers()
+        if length:
+            try:
+                connection = getattr(handler, 'connection', None)
+                if connection is not None:
+                    # Zero-copy from the page cache straight to the socket
+                    connection.sendfile(f, offset=start, count=length)
+                else:
+                    # No socket of its own (async_http.py handlers): copy through wfile
+                    f.seek(start)
+                    while length > 0:
+                        chunk = f.read(min(length, FILE_CHUNK_BYTES))
+                        if not chunk:
+                            break
+                        handler.wfile.write(chunk)
+                        length -= len(chunk)
+            except (OSError, ValueError):
+                pass
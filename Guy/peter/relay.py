@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+Stream relay / fan-out node.
+
+Runs on the operator laptop. Pulls ONE copy of /stream.mjpg and ONE /events
+telemetry subscription from the tank and re-serves them to any number of local
+viewers, so the Pi's Wi-Fi uplink only ever carries a single outbound stream.
+The telemetry is kept in a local TelemetryState (telemetry.py), updated as the
+tank's events arrive.
+
+    python3 relay.py                 # uses UPSTREAM_HOST / UPSTREAM_PORT below
+    python3 relay.py 192.168.1.50    # override the tank address
+
+Local viewers open http://<laptop>:8081/ exactly like they would open the tank.
+The page's /state polls (ETag / 304) and /events streams are served from that
+copy, however many viewers there are.
+Per-viewer statistics are available at /relay_stats.
+"""
+import http.client
+import json
+import math
+import os
+import signal
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import SimpleHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from telemetry import EventStream, TelemetryState, etag_matches
+
+# Configuration
+UPSTREAM_HOST = '192.168.1.50'  # Address of the Pi running web_fixed.py
+UPSTREAM_PORT = 8080
+RELAY_PORT = 8081
+# ----------------------------------------------------
+# The one telemetry subscription to the tank: every field, at the tank's default event rate
+UPSTREAM_EVENTS_PATH = '/events?rate=20'
+# Control endpoints are not cached, they are forwarded to the tank as-is
+PASSTHROUGH_PREFIXES = ('/tank_command', '/laser_on', '/laser_off', '/zoom', '/track')
+EVENTS_MAX_RATE = 20  # Default events per second per viewer; /events?rate= may ask for fewer (or more, up to 4x)
+# Static files are fetched once from the tank and then served from memory
+STATIC_PATHS = ['/index.html', '/gunshot.mp3']
+# ----------------------------------------------------
+# Reconnect backoff (seconds)
+RECONNECT_MIN_DELAY = 0.5
+RECONNECT_MAX_DELAY = 5.0
+UPSTREAM_TIMEOUT = 5.0
+EVENTS_TIMEOUT = 40.0  # Longest quiet /events stream; the tank sends a heartbeat every 15 s
+# ----------------------------------------------------
+
+
+class StreamingOutput:
+    """Latest upstream frame plus a sequence number so viewers can count skips."""
+    def __init__(self):
+        self.frame = None
+        self.sequence = 0
+        self.condition = threading.Condition()
+
+    def write(self, buf):
+        with self.condition:
+            self.frame = buf
+            self.sequence += 1
+            self.condition.notify_all()
+
+
+output = StreamingOutput()
+
+# Latest tank telemetry, fed by upstream_events_thread()
+telemetry = TelemetryState()
+
+# Static files fetched from the tank: path -> (content_type, body)
+static_cache = {}
+static_lock = threading.Lock()
+
+# Upstream link state
+upstream_stats = {
+    'connected': False,
+    'reconnects': 0,
+    'frames_received': 0,
+    'bytes_received': 0,
+    'last_frame_time': 0.0,
+    'events_connected': False,
+    'events_received': 0,
+    'last_error': '',
+}
+upstream_lock = threading.Lock()
+
+# Per-viewer statistics: viewer_id -> dict
+viewer_stats = {}
+viewer_lock = threading.Lock()
+next_viewer_id = 0
+
+
+def read_mjpeg_frames(stream):
+    """
+    Generator yielding JPEG payloads from a multipart/x-mixed-replace stream.
+
+    :param stream: A file-like object with readline() and read(), e.g. an
+                   http.client.HTTPResponse for /stream.mjpg.
+    """
+    while True:
+        line = stream.readline()
+        if not line:
+            raise ConnectionError("Upstream stream closed")
+        if not line.startswith(b'--'):
+            continue
+        # Part headers end with an empty line
+        content_length = None
+        while True:
+            header = stream.readline()
+            if not header:
+                raise ConnectionError("Upstream stream closed")
+            header = header.strip()
+            if not header:
+                break
+            key, _, value = header.partition(b':')
+            if key.strip().lower() == b'content-length':
+                content_length = int(value.strip())
+        if content_length is None:
+            continue
+        frame = stream.read(content_length)
+        if len(frame) != content_length:
+            raise ConnectionError("Short read from upstream")
+        yield frame
+
+
+def upstream_stream_thread():
+    """Keeps exactly one connection to the tank's /stream.mjpg, reconnecting on failure."""
+    delay = RECONNECT_MIN_DELAY
+    print(f"Relaying http://{UPSTREAM_HOST}:{UPSTREAM_PORT}/stream.mjpg")
+    while True:
+        conn = None
+        try:
+            conn = http.client.HTTPConnection(UPSTREAM_HOST, UPSTREAM_PORT, timeout=UPSTREAM_TIMEOUT)
+            conn.request('GET', '/stream.mjpg')
+            response = conn.getresponse()
+            if response.status != 200:
+                raise ConnectionError(f"Upstream returned HTTP {response.status}")
+            with upstream_lock:
+                upstream_stats['connected'] = True
+            print("Upstream stream connected.")
+            delay = RECONNECT_MIN_DELAY
+            for frame in read_mjpeg_frames(response):
+                output.write(frame)
+                with upstream_lock:
+                    upstream_stats['frames_received'] += 1
+                    upstream_stats['bytes_received'] += len(frame)
+                    upstream_stats['last_frame_time'] = time.time()
+        except Exception as e:
+            with upstream_lock:
+                upstream_stats['connected'] = False
+                upstream_stats['reconnects'] += 1
+                upstream_stats['last_error'] = str(e)
+            print(f"Upstream stream error: {e}. Reconnecting in {delay:.1f}s")
+        finally:
+            if conn is not None:
+                conn.close()
+        time.sleep(delay)
+        delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+
+def fetch_upstream(path, method='GET'):
+    """Single request to the tank. Returns (status, content_type, body)."""
+    conn = http.client.HTTPConnection(UPSTREAM_HOST, UPSTREAM_PORT, timeout=UPSTREAM_TIMEOUT)
+    try:
+        conn.request(method, path)
+        response = conn.getresponse()
+        body = response.read()
+        return response.status, response.getheader('Content-Type', 'text/plain'), body
+    finally:
+        conn.close()
+
+
+def read_sse_events(stream):
+    """
+    Generator yielding (event id, data) from a text/event-stream; comments (heartbeats) are skipped.
+
+    :param stream: A file-like object with readline(), e.g. an http.client.HTTPResponse for /events.
+    """
+    event_id = None
+    data = []
+    while True:
+        line = stream.readline()
+        if not line:
+            raise ConnectionError("Upstream events closed")
+        line = line.rstrip(b'\r\n').decode('utf-8')
+        if not line:
+            if data:
+                yield event_id, '\n'.join(data)
+            data = []
+            continue
+        field, _, value = line.partition(':')
+        value = value[1:] if value.startswith(' ') else value
+        if field == 'id':
+            event_id = value
+        elif field == 'data':
+            data.append(value)
+
+
+def upstream_events_thread():
+    """
+    Keeps exactly one /events subscription to the tank and applies each event to `telemetry`.
+
+    The tank sends only the fields that changed; on reconnect Last-Event-ID asks for what changed while
+    the relay was away (or everything, if the tank restarted).
+    """
+    delay = RECONNECT_MIN_DELAY
+    last_event_id = None
+    while True:
+        conn = None
+        try:
+            conn = http.client.HTTPConnection(UPSTREAM_HOST, UPSTREAM_PORT, timeout=UPSTREAM_TIMEOUT)
+            conn.request('GET', UPSTREAM_EVENTS_PATH, headers={'Last-Event-ID': last_event_id} if last_event_id else {})
+            sock = conn.sock  # The streamed response takes it over
+            response = conn.getresponse()
+            if response.status != 200:
+                raise ConnectionError(f"Upstream /events returned HTTP {response.status}")
+            sock.settimeout(EVENTS_TIMEOUT)
+            with upstream_lock:
+                upstream_stats['events_connected'] = True
+            delay = RECONNECT_MIN_DELAY
+            for event_id, data in read_sse_events(response):
+                telemetry.update(**json.loads(data))
+                last_event_id = event_id
+                with upstream_lock:
+                    upstream_stats['events_received'] += 1
+        except Exception as e:
+            with upstream_lock:
+                upstream_stats['events_connected'] = False
+                upstream_stats['last_error'] = f"/events: {e}"
+            print(f"Upstream events error: {e}. Reconnecting in {delay:.1f}s")
+        finally:
+            if conn is not None:
+                conn.close()
+        time.sleep(delay)
+        delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+
+def get_static(path):
+    """Fetch a static file from the tank on first use and keep it in memory."""
+    with static_lock:
+        cached = static_cache.get(path)
+    if cached is not None:
+        return cached
+    status, content_type, body = fetch_upstream(path)
+    if status != 200:
+        return None
+    with static_lock:
+        static_cache[path] = (content_type, body)
+    return content_type, body
+
+
+def get_relay_stats():
+    """Snapshot of upstream and per-viewer statistics."""
+    now = time.time()
+    with upstream_lock:
+        upstream = dict(upstream_stats)
+    upstream['frame_age_ms'] = (now - upstream['last_frame_time']) * 1000 if upstream['last_frame_time'] else None
+    viewers = []
+    with viewer_lock:
+        for viewer_id, stats in viewer_stats.items():
+            elapsed = max(now - stats['connected_at'], 1e-6)
+            viewers.append({
+                'id': viewer_id,
+                'address': stats['address'],
+                'connected_s': round(elapsed, 1),
+                'frames_sent': stats['frames_sent'],
+                'frames_skipped': stats['frames_skipped'],
+                'bytes_sent': stats['bytes_sent'],
+                'fps': round(stats['frames_sent'] / elapsed, 2),
+                'kbps': round(stats['bytes_sent'] * 8 / 1000 / elapsed, 1),
+            })
+    return {'upstream': upstream, 'viewer_count': len(viewers), 'viewers': viewers}
+
+
+class RelayHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, content_type, body, status=200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', len(body))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        global next_viewer_id
+        if self.path == '/':
+            self.send_response(301)
+            self.send_header('Location', '/index.html')
+            self.end_headers()
+        elif self.path in STATIC_PATHS:
+            try:
+                cached = get_static(self.path)
+            except Exception as e:
+                self.send_error(502, f"Upstream error: {e}")
+                return
+            if cached is None:
+                self.send_error(404, 'File Not Found: %s' % self.path)
+            else:
+                self.send_body(*cached)
+        elif self.path.startswith(PASSTHROUGH_PREFIXES):
+            try:
+                status, content_type, body = fetch_upstream(self.path)
+                self.send_body(content_type, body, status)
+            except Exception as e:
+                self.send_error(502, f"Upstream error: {e}")
+        # The relay's copy of the tank telemetry, served like web_fixed.py serves the original
+        elif self.path == '/state' or self.path.startswith('/state?'):
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            fmt = 'bin' if params.get('format', ['json'])[0] == 'bin' else 'json'
+            etag, body = telemetry.snapshot(fmt)
+            if etag_matches(self.headers.get('If-None-Match'), etag):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream' if fmt == 'bin' else 'application/json')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == '/events' or self.path.startswith('/events?'):
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            fields = [f for f in params.get('fields', [''])[0].split(',') if f]
+            last_event_id = self.headers.get('Last-Event-ID') or params.get('lastEventId', [None])[0]
+            try:
+                rate = float(params.get('rate', [EVENTS_MAX_RATE])[0])
+                if not math.isfinite(rate):
+                    raise ValueError("rate must be a positive number")
+                stream = EventStream(telemetry, fields or None, min(rate, 4 * EVENTS_MAX_RATE), last_event_id)
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+            self.send_events(stream)
+        elif self.path == '/relay_stats':
+            body = json.dumps(get_relay_stats()).encode('utf-8')
+            self.send_body('application/json', body)
+        elif self.path == '/stream.mjpg' or self.path.startswith('/stream.mjpg?'):
+            # ?zoom=&cx=&cy= sets the tank's digital zoom, which applies to the one relayed stream
+            query = self.path.partition('?')[2]
+            if query:
+                try:
+                    status, content_type, body = fetch_upstream('/zoom?' + query)
+                except Exception as e:
+                    self.send_error(502, f"Upstream error: {e}")
+                    return
+                if status != 200:
+                    self.send_body(content_type, body, status)
+                    return
+            with viewer_lock:
+                viewer_id = next_viewer_id
+                next_viewer_id += 1
+                viewer_stats[viewer_id] = {
+                    'address': self.client_address[0],
+                    'connected_at': time.time(),
+                    'frames_sent': 0,
+                    'frames_skipped': 0,
+                    'bytes_sent': 0,
+                }
+            print(f"Viewer {viewer_id} connected from {self.client_address[0]}")
+            self.send_response(200)
+            self.send_header('Age', 0)
+            self.send_header('Cache-Control', 'no-cache, private')
+            self.send_header('Pragma', 'no-cache')
+            self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=FRAME')
+            self.end_headers()
+            last_sequence = None
+            try:
+                while True:
+                    with output.condition:
+                        output.condition.wait_for(
+                            lambda: output.frame is not None and output.sequence != last_sequence)
+                        frame = output.frame
+                        sequence = output.sequence
+                    self.wfile.write(b'--FRAME\r\n')
+                    self.send_header('Content-Type', 'image/jpeg')
+                    self.send_header('Content-Length', len(frame))
+                    self.end_headers()
+                    self.wfile.write(frame)
+                    self.wfile.write(b'\r\n')
+                    with viewer_lock:
+                        stats = viewer_stats[viewer_id]
+                        stats['frames_sent'] += 1
+                        stats['bytes_sent'] += len(frame)
+                        if last_sequence is not None:
+                            stats['frames_skipped'] += sequence - last_sequence - 1
+                    last_sequence = sequence
+            except Exception:
+                pass
+            finally:
+                with viewer_lock:
+                    stats = viewer_stats.pop(viewer_id)
+                print(f"Viewer {viewer_id} disconnected after {stats['frames_sent']} frames")
+        else:
+            self.send_error(404)
+
+    def send_events(self, stream):
+        """Server-Sent Events from a telemetry.EventStream on the relay's copy, until the viewer disconnects."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        try:
+            while True:
+                with telemetry.condition:
+                    event, wait = stream.poll(time.monotonic())
+                    if event is None:
+                        telemetry.condition.wait(wait)
+                        continue
+                self.wfile.write(event)
+        except Exception:
+            pass
+
+
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def stats_report_thread():
+    """Prints a one-line summary every 10 s."""
+    while True:
+        time.sleep(10)
+        stats = get_relay_stats()
+        up = stats['upstream']
+        print(f"Upstream {'UP' if up['connected'] else 'DOWN'}: {up['frames_received']} frames, "
+              f"{up['reconnects']} reconnects | events {'UP' if up['events_connected'] else 'DOWN'}: "
+              f"{up['events_received']} | {stats['viewer_count']} viewer(s)")
+        for viewer in stats['viewers']:
+            print(f"  viewer {viewer['id']} {viewer['address']}: {viewer['fps']} fps, "
+                  f"{viewer['kbps']} kbps, {viewer['frames_skipped']} skipped")
+
+
+def shutdown(signum, frame):
+    print("\nReceived exit signal. Stopping relay...")
+    os._exit(0)
+
+
+def main():
+    global UPSTREAM_HOST
+    if len(sys.argv) > 1:
+        UPSTREAM_HOST = sys.argv[1]
+    print("MJPEG Stream Relay")
+    print("==================")
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    for target in (upstream_stream_thread, upstream_events_thread, stats_report_thread):
+        threading.Thread(target=target, daemon=True).start()
+
+    server = ThreadedHTTPServer(('', RELAY_PORT), RelayHandler)
+    print(f"\nRelay started at http://0.0.0.0:{RELAY_PORT}")
+    print(f"Per-viewer stats at http://localhost:{RELAY_PORT}/relay_stats")
+    print("Press Ctrl+C to stop\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping...")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+In-memory instant replay buffer.
+
+Keeps the most recent encoded JPEGs in a ring capped by total bytes (not frame
+count, so a busy scene simply covers fewer seconds). The ring stores references
+to the same bytes objects stream_camera() hands to StreamingOutput, nothing is
+copied.
+
+    /replay.mjpg?seconds=N   replays the last N seconds at the original pace
+
+When the operator fires (FC goes 0 -> 1 in /tank_command), trigger_clip() waits
+in the background until post_seconds after the shot, then freezes the window
+[shot - pre_seconds, shot + post_seconds] into clips/fire_<ms>.mjpg.
+"""
+import collections
+import os
+import threading
+import time
+
+
+class ReplayBuffer:
+    def __init__(self, max_bytes=16 * 1024 * 1024, clip_dir='clips', pre_seconds=3.0, post_seconds=2.0):
+        """
+        :param max_bytes: Memory cap for buffered JPEG data.
+        :param clip_dir: Where fire-triggered clips are written.
+        :param pre_seconds: Video kept before the shot.
+        :param post_seconds: Video kept after the shot.
+        """
+        self.max_bytes = max_bytes
+        self.clip_dir = clip_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.frames = collections.deque()  # (timestamp, jpeg)
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.pending_clip_until = 0.0
+        self.clips_saved = 0
+
+    def append(self, jpeg, timestamp=None):
+        """Called from stream_camera() for every encoded frame."""
+        timestamp = timestamp if timestamp is not None else time.time()
+        with self.lock:
+            self.frames.append((timestamp, jpeg))
+            self.total_bytes += len(jpeg)
+            while self.total_bytes > self.max_bytes and len(self.frames) > 1:
+                _, old = self.frames.popleft()
+                self.total_bytes -= len(old)
+
+    def window(self, start, end):
+        """References to the buffered frames with start <= timestamp <= end."""
+        with self.lock:
+            return [(t, jpeg) for t, jpeg in self.frames if start <= t <= end]
+
+    def buffered_seconds(self):
+        with self.lock:
+            if len(self.frames) < 2:
+                return 0.0
+            return self.frames[-1][0] - self.frames[0][0]
+
+    def trigger_clip(self, fire_time=None):
+        """
+        Schedule a clip around a shot. Shots while a clip is still pending are
+        already covered by that clip and are ignored.
+        """
+        fire_time = fire_time if fire_time is not None else time.time()
+        if fire_time < self.pending_clip_until:
+            return False
+        self.pending_clip_until = fire_time + self.post_seconds
+        threading.Thread(target=self._save_clip, args=(fire_time,), daemon=True).start()
+        return True
+
+    def _save_clip(self, fire_time):
+        delay = fire_time + self.post_seconds - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        frames = self.window(fire_time - self.pre_seconds, fire_time + self.post_seconds)
+        if not frames:
+            return
+        try:
+            os.makedirs(self.clip_dir, exist_ok=True)
+            path = os.path.join(self.clip_dir, f"fire_{int(fire_time * 1000)}.mjpg")
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                buffers = [jpeg for _, jpeg in frames]
+                expected = sum(len(b) for b in buffers)
+                written = os.writev(fd, buffers)
+                if written != expected:
+                    os.write(fd, b''.join(buffers)[written:])
+            finally:
+                os.close(fd)
+            self.clips_saved += 1
+            print(f"Replay: saved {len(frames)} frames around shot to {path}")
+        except OSError as e:
+            print(f"Replay: could not save clip: {e}")
+
+    def get_stats(self):
+        with self.lock:
+            frame_count = len(self.frames)
+            total_bytes = self.total_bytes
+        return {
+            'frames': frame_count,
+            'bytes': total_bytes,
+            'seconds': round(self.buffered_seconds(), 2),
+            'clips_saved': self.clips_saved,
+        }
+
+
+def send_replay(handler, replay_buffer, seconds):
+    """Stream the last `seconds` of buffered video as multipart MJPEG, then end."""
+    now = time.time()
+    frames = replay_buffer.window(now - seconds, now)
+    if not frames:
+        handler.send_error(404, "Replay buffer is empty")
+        return
+    handler.send_response(200)
+    handler.send_header('Age', 0)
+    handler.send_header('Cache-Control', 'no-cache, private')
+    handler.send_header('Pragma', 'no-cache')
+    handler.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=FRAME')
+    handler.end_headers()
+    playback_start = time.time()
+    first_timestamp = frames[0][0]
+    try:
+        for timestamp, frame in frames:
+            delay = (timestamp - first_timestamp) - (time.time() - playback_start)
+            if delay > 0:
+                time.sleep(delay)
+            handler.wfile.write(b'--FRAME\r\n')
+            handler.send_header('Content-Type', 'image/jpeg')
+            handler.send_header('Content-Length', len(frame))
+            handler.end_headers()
+            handler.wfile.write(frame)
+            handler.wfile.write(b'\r\n')
+    except Exception:
+        pass
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Gyro-based electronic image stabilization (roadmap milestone 5.2).
+
+The MPU6050 rates come in over the same serial link as Dist:/M1:/M2:, as
+
+    G:<millis>,<gx>,<gy>,<gz>      rates in deg/s, Arduino millis() timestamp
+    G:<gx>,<gy>,<gz>               (without a timestamp the receive time is used)
+
+read_serial_data_thread() hands those lines to add_line(). For every frame,
+apply() integrates only the samples received since the previous frame, so
+the camera orientation is updated incrementally, never recomputed. The
+orientation is low-pass filtered to get the intended path (driving, turning
+the turret), and the difference, the shake, is undone with one cv2.warpAffine:
+yaw and pitch become a shift of focal_px * angle, roll a rotation about the
+centre. The output is zoomed by 1 / (1 - 2 * margin) so the shifted borders
+are cropped away; corrections larger than the margin are clamped.
+
+Time budget: after OVERRUN_LIMIT frames in a row slower than budget_ms the
+warp switches to nearest-neighbour sampling; if that still overruns
+OVERRUN_LIMIT frames in a row the stage is bypassed for BYPASS_SECONDS (same
+policy as filter_chain.py).
+
+Residual motion: every residual_every frames the shift between that frame and
+the next is measured with phase correlation on small grey copies, on both the
+raw and the stabilized frames, so the stats show how much shake is left.
+"""
+import collections
+import math
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from filter_chain import BYPASS_SECONDS, OVERRUN_LIMIT
+
+# How far the device->host clock offset estimate may creep up per sample.
+# The offset tracks the minimum observed (host - device) time, i.e. the
+# least-delayed serial line.
+OFFSET_CREEP_S = 0.00001
+# Samples older than this are not extrapolated past
+MAX_EXTRAPOLATION_S = 0.05
+# Gyro considered lost after this long without samples
+STALE_SECONDS = 0.5
+RESIDUAL_SCALE = 0.25
+
+
+def focal_from_hfov(width, hfov_deg):
+    return (width / 2.0) / math.tan(math.radians(hfov_deg) / 2.0)
+
+
+def motion_matrix(yaw, pitch, roll, focal_px, centre, scale=1.0):
+    """
+    Affine approximation of how a small camera rotation (radians) moves the image:
+    yaw right shifts the scene left, pitch up shifts it down, roll rotates it.
+    """
+    matrix = cv2.getRotationMatrix2D(centre, math.degrees(roll), scale)
+    matrix[0, 2] += -focal_px * yaw * scale
+    matrix[1, 2] += focal_px * pitch * scale
+    return matrix
+
+
+def measure_shift(previous_small, small):
+    (dx, dy), _ = cv2.phaseCorrelate(previous_small, small)
+    return math.hypot(dx, dy) / RESIDUAL_SCALE
+
+
+def small_gray(frame):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return np.float32(cv2.resize(gray, None, fx=RESIDUAL_SCALE, fy=RESIDUAL_SCALE, interpolation=cv2.INTER_AREA))
+
+
+class GyroStabilizer:
+    def __init__(self, resolution, focal_px, margin=0.1, smoothing_seconds=0.4, budget_ms=5.0,
+                 axes=((2, 1.0), (1, -1.0), (0, 1.0)), residual_every=12, max_samples=2000):
+        """
+        :param resolution: (width, height) of the frames to stabilize.
+        :param focal_px: Focal length in pixels (see focal_from_hfov).
+        :param margin: Fraction of width/height cropped on each side to hide the warp borders.
+        :param smoothing_seconds: Time constant of the intended-path low-pass filter.
+        :param budget_ms: Warp time budget per frame.
+        :param axes: (gyro index, sign) for camera yaw, pitch and roll.
+        :param residual_every: Measure residual motion every N frames (0 = never).
+        """
+        self.resolution = resolution
+        self.focal_px = focal_px
+        self.margin = margin
+        self.zoom = 1.0 / (1.0 - 2.0 * margin)
+        self.max_shift = (resolution[0] * margin, resolution[1] * margin)
+        self.max_roll = math.radians(5.0)
+        self.centre = (resolution[0] / 2.0, resolution[1] / 2.0)
+        self.smoothing_seconds = smoothing_seconds
+        self.budget_ms = budget_ms
+        self.axes = axes
+        self.residual_every = residual_every
+
+        self.samples = collections.deque(maxlen=max_samples)  # (host time, (yaw, pitch, roll) rad/s)
+        self.lock = threading.Lock()
+        self.clock_offset = None
+
+        # Orientation state, advanced incrementally by _integrate()
+        self.angles = [0.0, 0.0, 0.0]
+        self.smooth = [0.0, 0.0, 0.0]
+        self.last_sample_time = None
+        self.last_rates = (0.0, 0.0, 0.0)
+        self.last_frame_time = None
+
+        self.interpolation = cv2.INTER_LINEAR
+        self.consecutive_overruns = 0
+        self.bypassed_until = 0.0
+        self._residual_pending = None
+        # Stats
+        self.frames = 0
+        self.stabilized = 0
+        self.samples_received = 0
+        self.clamped = 0
+        self.overruns = 0
+        self.bypass_count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_correction = (0.0, 0.0, 0.0)
+        self.residual_raw = collections.deque(maxlen=50)
+        self.residual_stabilized = collections.deque(maxlen=50)
+
+    # ------------------------------------------------------------------
+    # Telemetry side (serial reader thread)
+
+    def add_line(self, payload, received=None):
+        """:param payload: The text after 'G:'."""
+        received = received if received is not None else time.time()
+        try:
+            values = [float(v) for v in payload.split(',')]
+        except ValueError:
+            return
+        if len(values) == 4:
+            device_time = values[0] / 1000.0
+            candidate = received - device_time
+            if self.clock_offset is None or candidate < self.clock_offset + OFFSET_CREEP_S:
+                self.clock_offset = candidate
+            else:
+                self.clock_offset += OFFSET_CREEP_S
+            timestamp = device_time + self.clock_offset
+            rates = values[1:]
+        elif len(values) == 3:
+            timestamp = received
+            rates = values
+        else:
+            return
+        camera_rates = tuple(math.radians(rates[index]) * sign for index, sign in self.axes)
+        with self.lock:
+            self.samples.append((timestamp, camera_rates))
+            self.samples_received += 1
+
+    # ------------------------------------------------------------------
+    # Frame side (stream_camera thread)
+
+    def _integrate(self, until):
+        """Advance the orientation with the samples received up to `until`."""
+        with self.lock:
+            pending = []
+            while self.samples and self.samples[0][0] <= until:
+                pending.append(self.samples.popleft())
+        for timestamp, rates in pending:
+            if self.last_sample_time is not None:
+                dt = timestamp - self.last_sample_time
+                if 0 < dt < STALE_SECONDS:
+                    for i in range(3):
+                        # Trapezoidal step between consecutive samples
+                        self.angles[i] += 0.5 * (rates[i] + self.last_rates[i]) * dt
+            self.last_sample_time = timestamp
+            self.last_rates = rates
+        if self.last_sample_time is None or until - self.last_sample_time > STALE_SECONDS:
+            return False
+        # Frame falls between samples: extrapolate the latest rate a little way
+        ahead = min(until - self.last_sample_time, MAX_EXTRAPOLATION_S)
+        return [self.angles[i] + self.last_rates[i] * max(ahead, 0.0) for i in range(3)]
+
+    def apply(self, frame, frame_time=None):
+        """
+        :param frame_time: Capture time of the frame (host clock); defaults to now.
+        :return: Stabilized frame (a new array) or the input frame when bypassed.
+        """
+        frame_time = frame_time if frame_time is not None else time.time()
+        self.frames += 1
+        if time.monotonic() < self.bypassed_until:
+            return frame
+        start = time.perf_counter()
+        angles = self._integrate(frame_time)
+        if angles is False:
+            correction = (0.0, 0.0, 0.0)  # No gyro: keep the same crop so framing does not jump
+        else:
+            if self.last_frame_time is None:
+                self.smooth = list(angles)
+            else:
+                dt = max(frame_time - self.last_frame_time, 0.0)
+                k = dt / (self.smoothing_seconds + dt)
+                for i in range(3):
+                    self.smooth[i] += k * (angles[i] - self.smooth[i])
+            correction = [angles[i] - self.smooth[i] for i in range(3)]
+            correction = self._clamp(correction)
+        self.last_frame_time = frame_time
+        self.last_correction = correction
+
+        # Undo the shake: apply the opposite motion, zoomed to crop the borders
+        matrix = motion_matrix(-correction[0], -correction[1], -correction[2], self.focal_px, self.centre, self.zoom)
+        output = cv2.warpAffine(frame, matrix, (frame.shape[1], frame.shape[0]), flags=self.interpolation,
+                                borderMode=cv2.BORDER_REPLICATE)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._record(elapsed_ms)
+        self.stabilized += 1
+        if self.residual_every:
+            self._measure_residual(frame, output)
+        return output
+
+    def _clamp(self, correction):
+        yaw, pitch, roll = correction
+        max_yaw = self.max_shift[0] / self.focal_px
+        max_pitch = self.max_shift[1] / self.focal_px
+        clamped = (max(-max_yaw, min(max_yaw, yaw)), max(-max_pitch, min(max_pitch, pitch)),
+                   max(-self.max_roll, min(self.max_roll, roll)))
+        if clamped != (yaw, pitch, roll):
+            self.clamped += 1
+            # Let the smoothed path catch up so we do not stay pinned to the edge
+            for i in range(3):
+                self.smooth[i] += correction[i] - clamped[i]
+        return clamped
+
+    def _record(self, elapsed_ms):
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if elapsed_ms <= self.budget_ms:
+            self.consecutive_overruns = 0
+            return
+        self.overruns += 1
+        self.consecutive_overruns += 1
+        if self.consecutive_overruns < OVERRUN_LIMIT:
+            return
+        if self.interpolation != cv2.INTER_NEAREST:
+            self.interpolation = cv2.INTER_NEAREST
+            print(f"Stabilizer over its {self.budget_ms:.1f} ms budget ({elapsed_ms:.1f} ms), "
+                  f"switching to nearest-neighbour warp")
+            self.consecutive_overruns = 0
+        else:
+            self.bypassed_until = time.monotonic() + BYPASS_SECONDS
+            self.bypass_count += 1
+            self.consecutive_overruns = 0
+            print(f"Stabilizer bypassed for {BYPASS_SECONDS:.0f}s ({elapsed_ms:.1f} ms > {self.budget_ms:.1f} ms)")
+
+    def _measure_residual(self, raw, stabilized):
+        if self._residual_pending is not None:
+            previous_raw, previous_stabilized = self._residual_pending
+            self._residual_pending = None
+            self.residual_raw.append(measure_shift(previous_raw, small_gray(raw)))
+            self.residual_stabilized.append(measure_shift(previous_stabilized, small_gray(stabilized)))
+        elif self.frames % self.residual_every == 0:
+            self._residual_pending = (small_gray(raw), small_gray(stabilized))
+
+    def get_stats(self):
+        with self.lock:
+            newest = self.samples[-1][0] if self.samples else self.last_sample_time
+        return {
+            'frames': self.frames,
+            'stabilized': self.stabilized,
+            'mean_ms': round(self.total_ms / self.stabilized, 3) if self.stabilized else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'budget_ms': self.budget_ms,
+            'overruns': self.overruns,
+            'bypass_count': self.bypass_count,
+            'bypassed': time.monotonic() < self.bypassed_until,
+            'interpolation': 'nearest' if self.interpolation == cv2.INTER_NEAREST else 'linear',
+            'gyro_samples': self.samples_received,
+            'gyro_age_s': round(time.time() - newest, 3) if newest else None,
+            'clamped': self.clamped,
+            'correction_px': [round(-self.focal_px * self.last_correction[0], 1),
+                              round(self.focal_px * self.last_correction[1], 1)],
+            'correction_roll_deg': round(math.degrees(self.last_correction[2]), 2),
+            # Mean frame-to-frame image shift in full-resolution pixels
+            'residual_raw_px': round(float(np.mean(self.residual_raw)), 2) if self.residual_raw else None,
+            'residual_stabilized_px': (round(float(np.mean(self.residual_stabilized)), 2)
+                                       if self.residual_stabilized else None),
+        }
+
+    def summary(self):
+        stats = self.get_stats()
+        return (f"{stats['mean_ms']:.1f} ms/frame, residual {stats['residual_stabilized_px']} px "
+                f"(raw {stats['residual_raw_px']} px), {stats['clamped']} clamped, {stats['gyro_samples']} gyro samples")
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Dashboard telemetry in one place, served by /state.
+
+The serial reader and the streaming thread call
+TelemetryState.update() when a value changes; /state returns a snapshot of
+everything (Pi time, frame latency, distance, motor speeds, serial link) in
+one response instead of one request per value. The streaming thread publishes
+the mean frame latency once a second, so frame-to-frame jitter is not a change.
+
+Each change bumps a version number. The response body is built at most once
+per version and format and cached, so any number of pollers get the same
+prebuilt bytes. The ETag is the version (plus a per-run prefix, so a restart
+never matches an old tag): a poller sending If-None-Match with the tag it has
+gets a 304 with no body while nothing changed.
+
+/events pushes the same values as Server-Sent Events (EventStream below):
+each change wakes the waiting clients (condition), and each client gets an
+event with just the fields it subscribed to that changed, at most max_rate
+events per second; changes in between are coalesced into the next event. The
+event ID is the version, so a reconnecting EventSource (Last-Event-ID) is sent
+only what changed while it was away, or everything if that is too long ago.
+
+Formats:
+  - JSON (default), compact: {"v":12,"time":"14:03:09","latency":2.4,"distance":"41","m1":0,"m2":0,"link":"up"}
+  - binary (/state?format=bin), little-endian, BINARY_FORMAT (21 bytes):
+    version u32, distance f32 cm (NaN = N/A), m1 i16, m2 i16, latency f32 ms,
+    Pi time u32 seconds since midnight, link u8 (LINK_CODES)
+"""
+import collections
+import json
+import math
+import struct
+import threading
+import time
+
+BINARY_FORMAT = '<IfhhfIB'
+LINK_CODES = {'none': 0, 'up': 1, 'down': 2}
+HISTORY_VERSIONS = 512  # Changes remembered for Last-Event-ID resume
+HEARTBEAT_S = 15.0  # SSE comment sent when a client has had no event for this long
+
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value names etag (or is *)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags or 'W/' + etag in tags
+
+
+class TelemetryState:
+    def __init__(self, clock=None):
+        """
+        :param clock: Optional callable returning the Pi time as 'HH:MM:SS'; read on every snapshot,
+            so the time only counts as a change once per second.
+        """
+        self.clock = clock
+        self.lock = threading.RLock()
+        self.condition = threading.Condition(self.lock)  # Notified on every change
+        self.values = {'time': '', 'latency': 0, 'distance': 'N/A', 'm1': 0, 'm2': 0, 'link': 'none'}
+        self.version = 0
+        self.run_id = '%x' % int(time.time())
+        self.cache = {}  # format -> body of the current version
+        self.history = collections.deque(maxlen=HISTORY_VERSIONS)  # (version, changed keys)
+
+    def update(self, **values):
+        """Sets telemetry values; returns True (and bumps the version) if any of them changed."""
+        with self.lock:
+            changed = {key: value for key, value in values.items() if self.values.get(key) != value}
+            if not changed:
+                return False
+            self.values.update(changed)
+            self.version += 1
+            self.cache.clear()
+            self.history.append((self.version, frozenset(changed)))
+            self.condition.notify_all()
+            return True
+
+    def tick(self):
+        """Reads the clock; the time changes (and wakes /events clients) once per second."""
+        if self.clock is not None:
+            self.update(time=self.clock())
+
+    def changed_since(self, version):
+        """Keys changed after version, or None if that is older than the history (= everything)."""
+        with self.lock:
+            if version is None or version > self.version or (self.history and version < self.history[0][0] - 1):
+                return None
+            keys = set()
+            for changed_version, changed in reversed(self.history):
+                if changed_version <= version:
+                    break
+                keys |= changed
+            return keys
+
+    def event_id(self):
+        return f"{self.run_id}-{self.version}"
+
+    def parse_event_id(self, event_id):
+        """Version of an event ID from this run, else None."""
+        run_id, _, version = (event_id or '').strip().partition('-')
+        if run_id != self.run_id or not version.isdigit():
+            return None
+        return int(version)
+
+    def etag(self, fmt='json'):
+        return f'"{self.run_id}-{self.version}{"b" if fmt == "bin" else ""}"'
+
+    def snapshot(self, fmt='json'):
+        """(ETag, body bytes) of the current state; the body is built once per version and format."""
+        self.tick()
+        with self.lock:
+            body = self.cache.get(fmt)
+            if body is None:
+                body = self.cache[fmt] = self._encode(fmt)
+            return self.etag(fmt), body
+
+    def _encode(self, fmt):
+        values = self.values
+        if fmt == 'bin':
+            try:
+                distance = float(values['distance'])
+            except (TypeError, ValueError):
+                distance = float('nan')
+            try:
+                hours, minutes, seconds = (int(part) for part in values['time'].split(':'))
+                pi_time = hours * 3600 + minutes * 60 + seconds
+            except ValueError:
+                pi_time = 0
+            return struct.pack(BINARY_FORMAT, self.version & 0xFFFFFFFF, distance, int(values['m1']),
+                               int(values['m2']), float(values['latency']), pi_time,
+                               LINK_CODES.get(values['link'], 0))
+        return json.dumps({'v': self.version, **values}, separators=(',', ':')).encode('utf-8')
+
+
+class EventStream:
+    def __init__(self, state, fields=None, max_rate=20.0, last_event_id=None, retry_ms=1000):
+        """
+        One /events client.
+
+        :param fields: Names of the values to send (None = all); a ValueError names unknown ones.
+        :param max_rate: Events per second at most; changes in between are coalesced into one event.
+        :param last_event_id: The Last-Event-ID of a reconnecting client; only later changes are sent.
+        :param retry_ms: Reconnect delay the browser is told to use.
+        """
+        self.state = state
+        if fields:
+            unknown = set(fields) - set(state.values)
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}; "
+                                 f"available: {', '.join(state.values)}")
+            self.fields = set(fields)
+        else:
+            self.fields = set(state.values)
+        if not math.isfinite(max_rate) or max_rate <= 0:
+            raise ValueError("rate must be a positive number")
+        self.interval = 1.0 / max_rate
+        self.version = state.parse_event_id(last_event_id)  # Last version sent (None = nothing yet)
+        self.retry_ms = retry_ms
+        self.last_sent = 0.0
+        self.events = 0
+
+    def poll(self, now):
+        """
+        (event bytes or None, seconds to wait before polling again). Wait on state.condition in between;
+        polling and waiting under the condition's lock cannot miss a change.
+        """
+        if 'time' in self.fields:
+            self.state.tick()
+        with self.state.lock:
+            changed = self.state.changed_since(self.version)
+            changed = self.fields if changed is None else changed & self.fields
+            if not changed:
+                self.version = self.state.version  # Only unsubscribed fields changed, if any
+                if now - self.last_sent >= HEARTBEAT_S:
+                    return self._sent(': heartbeat\n\n', now), HEARTBEAT_S
+                wait = HEARTBEAT_S - (now - self.last_sent)
+                if 'time' in self.fields:
+                    # The clock is read when polled: wake up just after the next second
+                    wait = min(wait, 1.001 - time.time() % 1.0)
+                return None, wait
+            if now - self.last_sent < self.interval:
+                return None, self.interval - (now - self.last_sent)
+            data = {key: value for key, value in self.state.values.items() if key in changed}
+            event_id = self.state.event_id()
+            self.version = self.state.version
+        event = f"id: {event_id}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+        return self._sent(event, now), self.interval
+
+    def _sent(self, event, now):
+        if not self.events and self.retry_ms:
+            event = f"retry: {self.retry_ms}\n" + event
+        self.last_sent = now
+        self.events += 1
+        return event.encode('utf-8')
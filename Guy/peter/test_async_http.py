@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+AsyncHTTPServer serving routes written for the threaded server.
+
+    python3 -m pytest -q test_async_http.py
+"""
+import http.client
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler
+
+from async_http import AsyncHTTPServer
+from keepalive_http import KeepAliveMixin
+from recorder import handle_recordings_request
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class RecordingsHandler(KeepAliveMixin, BaseHTTPRequestHandler):
+    directory = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        handle_recordings_request(self, self.directory)
+
+
+def start_server(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    deadline = time.time() + 5
+    while True:
+        try:
+            socket.create_connection(server.server_address, timeout=1).close()
+            return
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def get(port, path, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        conn.request('GET', path, headers=headers or {})
+        response = conn.getresponse()
+        return response, response.read()
+    finally:
+        conn.close()
+
+
+class SegmentDownloadTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.segment = bytes(range(256)) * 4096 + b'tail'  # > FILE_CHUNK_BYTES, not a multiple of it
+        with open(os.path.join(cls.tmp.name, 'seg_1000.mjpg'), 'wb') as f:
+            f.write(cls.segment)
+        RecordingsHandler.directory = cls.tmp.name
+        cls.port = free_port()
+        cls.server = AsyncHTTPServer(('127.0.0.1', cls.port), RecordingsHandler)
+        start_server(cls.server)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.tmp.cleanup()
+
+    def get(self, path, headers=None):
+        return get(self.port, path, headers)
+
+    def test_whole_segment(self):
+        response, body = self.get('/recordings/seg_1000.mjpg')
+        self.assertEqual(response.status, 200)
+        self.assertEqual(int(response.getheader('Content-Length')), len(self.segment))
+        self.assertEqual(body, self.segment)
+
+    def test_range(self):
+        response, body = self.get('/recordings/seg_1000.mjpg', {'Range': 'bytes=1000-299999'})
+        self.assertEqual(response.status, 206)
+        self.assertEqual(response.getheader('Content-Range'), f'bytes 1000-299999/{len(self.segment)}')
+        self.assertEqual(body, self.segment[1000:300000])
+
+    def test_missing_segment(self):
+        response, _ = self.get('/recordings/seg_2000.mjpg')
+        self.assertEqual(response.status, 404)
+
+    def test_invalid_playback_speed(self):
+        for speed in ('abc', 'nan', '-1'):
+            response, _ = self.get(f'/recordings/play.mjpg?t=1&speed={speed}')
+            self.assertEqual(response.status, 400, speed)
+
+
+class EndlessStreamHandler(KeepAliveMixin, BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/replay.mjpg':
+            # Streams until the client leaves, like replay.send_replay()
+            self.send_response(200)
+            self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=FRAME')
+            self.end_headers()
+            try:
+                while True:
+                    self.wfile.write(b'--FRAME\r\n\r\n')
+                    time.sleep(0.05)
+            except (OSError, ValueError):
+                pass
+        else:
+            self.send_response(200)
+            self.send_header('Content-Length', 2)
+            self.end_headers()
+            self.wfile.write(b'ok')
+
+
+class StreamRoutesTest(unittest.TestCase):
+    def test_streams_do_not_take_request_threads(self):
+        port = free_port()
+        server = AsyncHTTPServer(('127.0.0.1', port), EndlessStreamHandler, handler_threads=1,
+                                 stream_routes=('/replay.mjpg',), stream_threads=2)
+        start_server(server)
+        viewers = []
+        try:
+            for _ in range(2):
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                conn.request('GET', '/replay.mjpg')
+                self.assertEqual(conn.getresponse().status, 200)
+                viewers.append(conn)
+            response, _ = get(port, '/replay.mjpg')
+            self.assertEqual(response.status, 503)
+            response, body = get(port, '/index.html')
+            self.assertEqual((response.status, body), (200, b'ok'))
+        finally:
+            for conn in viewers:
+                conn.close()
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
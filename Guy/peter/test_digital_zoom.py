@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+DigitalZoom.set() input checks.
+
+    python3 -m pytest -q test_digital_zoom.py
+"""
+import unittest
+
+import numpy as np
+
+from digital_zoom import DigitalZoom
+
+
+class DigitalZoomSetTest(unittest.TestCase):
+    def setUp(self):
+        self.zoom = DigitalZoom((640, 480))
+        self.frame = np.zeros((480, 640, 3), dtype=np.uint8)
+
+    def test_zoom_and_centre(self):
+        self.zoom.set('2', '100', None)
+        self.assertEqual(self.zoom.apply(self.frame).shape, (240, 320, 3))
+        self.assertEqual(self.zoom.box, (0, 120, 320, 360))
+
+    def test_values_are_clamped(self):
+        self.zoom.set('100', '-5', '1e9')
+        state = self.zoom.get_state()
+        self.assertEqual((state['zoom'], state['cx'], state['cy']), (8.0, 0.0, 480.0))
+
+    def test_non_finite_values_are_rejected(self):
+        for values in (('nan', None, None), ('2', 'nan', None), ('2', None, 'inf'), ('-inf', None, None),
+                       ('abc', None, None)):
+            with self.assertRaises(ValueError, msg=values):
+                self.zoom.set(*values)
+        # Nothing from the rejected calls was applied, and frames still go through
+        self.assertEqual(self.zoom.get_state()['zoom'], 1.0)
+        self.assertEqual(self.zoom.centre, (320.0, 240.0))
+        self.assertEqual(self.zoom.apply(self.frame).shape, (480, 640, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+SharedFrameSlot's sequence-lock protocol: one writer, readers that never see
+a half-written frame.
+
+    python3 -m pytest -q test_multiproc_frontend.py
+"""
+import threading
+import time
+import unittest
+
+from multiproc_frontend import SLOT_HEADER, SharedFrameSlot
+
+
+class SharedFrameSlotTest(unittest.TestCase):
+    def setUp(self):
+        self.slot = SharedFrameSlot(capacity=4096)
+
+    def tearDown(self):
+        self.slot.close()
+
+    def test_empty_slot(self):
+        self.assertEqual(self.slot.read(0), (0, None))
+
+    def test_write_then_read(self):
+        self.assertTrue(self.slot.write(b'frame-1'))
+        sequence, frame = self.slot.read(0)
+        self.assertEqual(frame, b'frame-1')
+        self.assertEqual(sequence % 2, 0)
+        # Nothing new for a reader that has it already
+        self.assertEqual(self.slot.read(sequence), (sequence, None))
+        self.slot.write(b'frame-2')
+        next_sequence, frame = self.slot.read(sequence)
+        self.assertEqual(frame, b'frame-2')
+        self.assertGreater(next_sequence, sequence)
+
+    def test_frame_too_large_is_dropped(self):
+        self.slot.write(b'kept')
+        sequence, _ = self.slot.read(0)
+        self.assertFalse(self.slot.write(b'x' * 4097))
+        self.assertEqual(self.slot.dropped, 1)
+        # The previous frame stays, and readers are not told about a new one
+        self.assertEqual(self.slot.read(sequence), (sequence, None))
+        self.assertEqual(self.slot.read(0), (sequence, b'kept'))
+        self.assertTrue(self.slot.write(b'y' * 4096))
+        self.assertEqual(self.slot.read(sequence)[1], b'y' * 4096)
+
+    def test_reader_waits_for_a_write_in_progress(self):
+        self.slot.write(b'old')
+        sequence, size = SLOT_HEADER.unpack_from(self.slot.buf, 0)
+        # Writer mid-update: odd sequence, new length, half the new bytes
+        SLOT_HEADER.pack_into(self.slot.buf, 0, sequence + 1, 6)
+        self.slot.buf[SLOT_HEADER.size:SLOT_HEADER.size + 3] = b'new'
+        result = []
+        reader = threading.Thread(target=lambda: result.append(self.slot.read(sequence)), daemon=True)
+        reader.start()
+        time.sleep(0.05)
+        self.assertEqual(result, [])  # Still retrying
+        self.slot.buf[SLOT_HEADER.size + 3:SLOT_HEADER.size + 6] = b'est'
+        SLOT_HEADER.pack_into(self.slot.buf, 0, sequence + 2, 6)
+        reader.join(1)
+        self.assertEqual(result, [(sequence + 2, b'newest')])
+
+    def test_concurrent_reads_are_never_torn(self):
+        # Each frame is one repeated byte with its own length: a torn copy mixes bytes or lengths
+        frames = [bytes([n]) * (100 + n * 13) for n in range(1, 200)]
+        done = threading.Event()
+
+        def writer():
+            n = 0
+            while not done.is_set():
+                self.slot.write(frames[n % len(frames)])
+                n += 1
+
+        thread = threading.Thread(target=writer, daemon=True)
+        thread.start()
+        reads = 0
+        sequence = 0
+        deadline = time.time() + 1.0
+        try:
+            while time.time() < deadline:
+                sequence, frame = self.slot.read(sequence)
+                if frame is None:
+                    continue
+                reads += 1
+                self.assertEqual(frame, frames[frame[0] - 1])
+        finally:
+            done.set()
+            thread.join(1)
+        self.assertGreater(reads, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+TelemetryState snapshots, ETags and change history; EventStream coalescing,
+rate limiting and Last-Event-ID resume.
+
+    python3 -m pytest -q test_telemetry.py
+"""
+import json
+import math
+import struct
+import unittest
+
+from telemetry import BINARY_FORMAT, HEARTBEAT_S, HISTORY_VERSIONS, EventStream, TelemetryState, etag_matches
+
+
+def parse_event(event):
+    """(id, data dict) of one SSE event; (None, None) for a heartbeat comment."""
+    event_id = data = None
+    for line in event.decode('utf-8').splitlines():
+        if line.startswith('id: '):
+            event_id = line[4:]
+        elif line.startswith('data: '):
+            data = json.loads(line[6:])
+    return event_id, data
+
+
+class EtagMatchesTest(unittest.TestCase):
+    def test_matches(self):
+        self.assertTrue(etag_matches('"a-1"', '"a-1"'))
+        self.assertTrue(etag_matches('"x", "a-1"', '"a-1"'))
+        self.assertTrue(etag_matches('W/"a-1"', '"a-1"'))
+        self.assertTrue(etag_matches('*', '"a-1"'))
+
+    def test_no_match(self):
+        self.assertFalse(etag_matches(None, '"a-1"'))
+        self.assertFalse(etag_matches('', '"a-1"'))
+        self.assertFalse(etag_matches('"a-2"', '"a-1"'))
+        self.assertFalse(etag_matches('"a-1b"', '"a-1"'))
+
+
+class TelemetryStateTest(unittest.TestCase):
+    def setUp(self):
+        self.state = TelemetryState()
+
+    def test_update_bumps_version_only_on_change(self):
+        self.assertTrue(self.state.update(distance='41', m1=0))
+        self.assertEqual(self.state.version, 1)
+        self.assertFalse(self.state.update(distance='41', m1=0))
+        self.assertEqual(self.state.version, 1)
+
+    def test_snapshot_etag_follows_version(self):
+        etag, body = self.state.snapshot()
+        self.assertEqual(self.state.snapshot(), (etag, body))
+        self.assertIs(self.state.snapshot()[1], body)  # Built once per version
+        self.state.update(distance='12')
+        new_etag, new_body = self.state.snapshot()
+        self.assertNotEqual(new_etag, etag)
+        self.assertFalse(etag_matches(etag, new_etag))
+        self.assertEqual(json.loads(new_body)['distance'], '12')
+        self.assertEqual(json.loads(new_body)['v'], 1)
+
+    def test_etag_differs_per_format_and_run(self):
+        self.assertNotEqual(self.state.etag('json'), self.state.etag('bin'))
+        other = TelemetryState()
+        other.run_id = self.state.run_id + 'x'
+        self.assertNotEqual(other.etag(), self.state.etag())
+
+    def test_binary_snapshot(self):
+        self.state.update(time='01:02:03', latency=2.5, distance='N/A', m1=-120, m2=255, link='up')
+        _, body = self.state.snapshot('bin')
+        self.assertEqual(len(body), struct.calcsize(BINARY_FORMAT))
+        version, distance, m1, m2, latency, pi_time, link = struct.unpack(BINARY_FORMAT, body)
+        self.assertEqual((version, m1, m2, pi_time, link), (1, -120, 255, 3723, 1))
+        self.assertTrue(math.isnan(distance))
+        self.assertAlmostEqual(latency, 2.5)
+
+    def test_changed_since(self):
+        self.state.update(distance='1')
+        self.state.update(m1=10)
+        self.state.update(m1=20, m2=5)
+        self.assertEqual(self.state.changed_since(3), set())
+        self.assertEqual(self.state.changed_since(2), {'m1', 'm2'})
+        self.assertEqual(self.state.changed_since(0), {'distance', 'm1', 'm2'})
+        self.assertIsNone(self.state.changed_since(None))
+        self.assertIsNone(self.state.changed_since(4))  # From the future: another run
+
+    def test_changed_since_history_boundary(self):
+        for n in range(HISTORY_VERSIONS + 100):
+            self.state.update(m1=n + 1)
+        oldest = self.state.history[0][0]
+        self.assertEqual(oldest, self.state.version - HISTORY_VERSIONS + 1)
+        # Everything after oldest - 1 is still in the history; anything older is not
+        self.assertEqual(self.state.changed_since(oldest - 1), {'m1'})
+        self.assertIsNone(self.state.changed_since(oldest - 2))
+
+    def test_event_ids(self):
+        self.state.update(distance='1')
+        event_id = self.state.event_id()
+        self.assertEqual(self.state.parse_event_id(event_id), 1)
+        self.assertIsNone(self.state.parse_event_id('other-1'))
+        self.assertIsNone(self.state.parse_event_id(f'{self.state.run_id}-x'))
+        self.assertIsNone(self.state.parse_event_id(None))
+
+
+class EventStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.state = TelemetryState()
+        self.state.update(distance='40', m1=0, m2=0, link='up')
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            EventStream(self.state, ['distance', 'heading'])
+        for rate in (0, -1, float('nan'), float('inf')):
+            with self.assertRaises(ValueError, msg=rate):
+                EventStream(self.state, max_rate=rate)
+
+    def test_first_event_has_every_subscribed_field(self):
+        stream = EventStream(self.state, ['distance', 'm1'])
+        event, wait = stream.poll(100.0)
+        self.assertTrue(event.startswith(b'retry: 1000\n'))
+        self.assertEqual(parse_event(event), (self.state.event_id(), {'distance': '40', 'm1': 0}))
+        self.assertEqual(wait, stream.interval)
+
+    def test_only_changed_fields_are_sent(self):
+        stream = EventStream(self.state, ['distance', 'm1'], max_rate=10)
+        stream.poll(100.0)
+        self.state.update(m1=50)
+        event, _ = stream.poll(101.0)
+        self.assertEqual(parse_event(event)[1], {'m1': 50})
+        self.assertFalse(event.startswith(b'retry'))
+
+    def test_unsubscribed_changes_send_nothing(self):
+        stream = EventStream(self.state, ['distance'], max_rate=10)
+        stream.poll(100.0)
+        self.state.update(m2=30)
+        event, wait = stream.poll(101.0)
+        self.assertIsNone(event)
+        self.assertEqual(stream.version, self.state.version)
+        self.assertAlmostEqual(wait, HEARTBEAT_S - 1.0)
+
+    def test_rate_limit_coalesces_changes(self):
+        stream = EventStream(self.state, ['distance', 'm1', 'm2'], max_rate=10)  # One event per 0.1 s
+        stream.poll(100.0)
+        self.state.update(distance='39')
+        self.state.update(m1=20)
+        event, wait = stream.poll(100.04)
+        self.assertIsNone(event)
+        self.assertAlmostEqual(wait, 0.06)
+        self.state.update(m1=25, m2=-25)
+        event, _ = stream.poll(100.11)
+        self.assertEqual(parse_event(event), (self.state.event_id(), {'distance': '39', 'm1': 25, 'm2': -25}))
+        self.assertEqual(stream.events, 2)
+
+    def test_resume_from_last_event_id(self):
+        last_event_id = self.state.event_id()
+        self.state.update(distance='38')
+        self.state.update(m1=70)
+        stream = EventStream(self.state, ['distance', 'm1', 'm2'], last_event_id=last_event_id)
+        event, _ = stream.poll(100.0)
+        self.assertEqual(parse_event(event)[1], {'distance': '38', 'm1': 70})
+
+    def test_resume_with_unknown_id_sends_everything(self):
+        for last_event_id in ('otherrun-1', f'{self.state.run_id}-99'):
+            stream = EventStream(self.state, ['distance', 'm1'], last_event_id=last_event_id)
+            event, _ = stream.poll(100.0)
+            self.assertEqual(parse_event(event)[1], {'distance': '40', 'm1': 0}, last_event_id)
+
+    def test_heartbeat(self):
+        stream = EventStream(self.state, ['distance'])
+        stream.poll(100.0)
+        self.assertIsNone(stream.poll(100.0 + HEARTBEAT_S - 1)[0])
+        event, wait = stream.poll(100.0 + HEARTBEAT_S)
+        self.assertEqual(event, b': heartbeat\n\n')
+        self.assertEqual(wait, HEARTBEAT_S)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Target lock-on (roadmap milestone 5.1): a lightweight correlation tracker that
+follows an operator-selected target, and a rate-limited controller that turns
+its position into turret pan steps and tilt.
+
+TemplateTracker runs on the streaming thread at camera rate, on a grey pyramid
+level from the frame's FrameViews (1/4 scale by default). Each frame it runs
+cv2.matchTemplate (normalized cross-correlation) only inside a search window
+around the predicted position (last position + velocity), so the cost depends
+on the target size, not the frame size. The template adapts slowly while the
+match is confident. After lost_frames weak matches in a row the track is lost
+and the window widens until the target is found again or the lock is released.
+
+Budget: the tracker keeps a running mean of its cost; above budget_ms it moves
+to the next coarser pyramid level (1/4 -> 1/8), which cuts the work ~4x.
+
+TurretController runs in its own thread at command_hz. It converts the
+target's offset from the image centre into angles (via the focal length), and
+outside a dead band sends pan steps and tilt degrees through the callables it
+is given, clamped per command. Between commands the turret has time to move and
+the next error is measured on new frames, so the loop does not overshoot.
+"""
+import collections
+import math
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from frame_views import PYRAMID_LEVELS
+
+
+class TemplateTracker:
+    def __init__(self, level=2, search_factor=1.5, min_score=0.45, lost_frames=12,
+                 template_update=0.08, budget_ms=5.0):
+        """
+        :param level: Grey pyramid level to track on (2 = 1/4 scale).
+        :param search_factor: Search window margin around the target, in target sizes.
+        :param min_score: Weakest normalized correlation accepted as a match.
+        :param lost_frames: Weak matches in a row before the track is declared lost.
+        :param template_update: Template blend rate on confident matches (0 = fixed template).
+        :param budget_ms: Per-frame tracking budget; above it the tracker moves to a coarser level.
+        """
+        self.level = level
+        self.search_factor = search_factor
+        self.min_score = min_score
+        self.lost_frames = lost_frames
+        self.template_update = template_update
+        self.budget_ms = budget_ms
+
+        self.lock = threading.Lock()
+        self.pending_lock = None  # Box requested by the operator, applied on the next frame
+        self.pending_release = False
+        self.template = None  # float32, for the running update
+        self.template_u8 = None  # What matchTemplate uses
+        self.box = None  # (x, y, w, h) at the tracking level
+        self.velocity = (0.0, 0.0)
+        self.weak_frames = 0
+        self.state = 'idle'
+        self.score = 0.0
+        self.frame_id = 0
+        self.updated = 0.0
+        self.scale = 1.0  # Full-resolution pixels per tracking-level pixel
+        self.frame_size = None  # (width, height) of the frames tracked on
+        self.timings = collections.deque(maxlen=48)
+        self.frames_tracked = 0
+        self.level_changes = 0
+
+    # ------------------------------------------------------------------
+    # Operator side (HTTP threads)
+
+    def request_lock(self, x, y, w, h):
+        """Lock on to the box (x, y, w, h) in full-resolution pixels, from the next frame."""
+        with self.lock:
+            self.pending_lock = (x, y, w, h)
+            self.pending_release = False
+
+    def request_release(self):
+        with self.lock:
+            self.pending_release = True
+            self.pending_lock = None
+
+    # ------------------------------------------------------------------
+    # Streaming thread
+
+    def update(self, views):
+        """Track on this frame. Cheap (no work) while idle."""
+        with self.lock:
+            pending_lock, self.pending_lock = self.pending_lock, None
+            release, self.pending_release = self.pending_release, False
+        if release:
+            self._set_state('idle')
+            self.template = None
+            return
+        if pending_lock is not None:
+            self._start(views, pending_lock)
+            return
+        if self.template is None:
+            return
+
+        if (views.shape[1], views.shape[0]) != self.frame_size:
+            # Frame size changed (digital zoom): the box no longer matches the picture
+            print("Tracker: frame size changed, lock released")
+            self._set_state('idle')
+            self.template = None
+            return
+        start = time.perf_counter()
+        image = views.gray_level(self.level)
+        self._track(image)
+        self.frame_id = views.frame_id
+        self.updated = time.time()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.timings.append(elapsed_ms)
+        self.frames_tracked += 1
+        if (len(self.timings) == self.timings.maxlen and np.mean(self.timings) > self.budget_ms
+                and self.level < PYRAMID_LEVELS):
+            print(f"Tracker over its {self.budget_ms:.1f} ms budget ({np.mean(self.timings):.1f} ms), "
+                  f"moving to 1/{2 ** (self.level + 1)} scale")
+            self._change_level(views, self.level + 1)
+
+    def _start(self, views, box):
+        image = views.gray_level(self.level)
+        self.scale = views.shape[1] / float(image.shape[1])
+        self.frame_size = (views.shape[1], views.shape[0])
+        x, y, w, h = (v / self.scale for v in box)
+        # At least 8 px at the tracking level, and inside the image
+        w, h = max(w, 8), max(h, 8)
+        x = min(max(x, 0), image.shape[1] - w)
+        y = min(max(y, 0), image.shape[0] - h)
+        self.box = (x, y, w, h)
+        self.template = self._patch(image, self.box).astype(np.float32)
+        self.template_u8 = self._patch(image, self.box).copy()
+        self.velocity = (0.0, 0.0)
+        self.weak_frames = 0
+        self.score = 1.0
+        self.frame_id = views.frame_id
+        self.updated = time.time()
+        self.timings.clear()
+        self._set_state('tracking')
+
+    def _change_level(self, views, level):
+        box = self.full_box()
+        self.level = level
+        self.level_changes += 1
+        self._start(views, box)
+
+    @staticmethod
+    def _patch(image, box):
+        x, y, w, h = (int(round(v)) for v in box)
+        return image[y:y + h, x:x + w]
+
+    def _track(self, image):
+        x, y, w, h = self.box
+        template = self.template_u8
+        th, tw = template.shape
+        # Search around the predicted position; wider while the target is lost
+        factor = self.search_factor * (3 if self.state == 'lost' else 1)
+        px, py = x + self.velocity[0], y + self.velocity[1]
+        x0 = int(max(0, px - factor * w))
+        y0 = int(max(0, py - factor * h))
+        x1 = int(min(image.shape[1], px + w + factor * w))
+        y1 = int(min(image.shape[0], py + h + factor * h))
+        if x1 - x0 < tw or y1 - y0 < th:
+            return
+        window = image[y0:y1, x0:x1]
+        result = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, location = cv2.minMaxLoc(result)
+        self.score = float(score)
+        if score < self.min_score:
+            self.velocity = (0.0, 0.0)
+            self.weak_frames += 1
+            if self.weak_frames >= self.lost_frames and self.state != 'lost':
+                self._set_state('lost')
+            return
+        nx, ny = x0 + location[0], y0 + location[1]
+        self.velocity = (0.5 * self.velocity[0] + 0.5 * (nx - x), 0.5 * self.velocity[1] + 0.5 * (ny - y))
+        self.box = (nx, ny, w, h)
+        self.weak_frames = 0
+        if self.state != 'tracking':
+            self._set_state('tracking')
+        if self.template_update and score > 0.8:
+            patch = self._patch(image, self.box)
+            if patch.shape == self.template.shape:
+                cv2.accumulateWeighted(patch, self.template, self.template_update)
+                self.template_u8 = cv2.convertScaleAbs(self.template)
+
+    def _set_state(self, state):
+        if state != self.state:
+            print(f"Tracker: {self.state} -> {state}")
+        self.state = state
+
+    # ------------------------------------------------------------------
+
+    def full_box(self):
+        """Current box in full-resolution pixels, or None."""
+        if self.box is None:
+            return None
+        return tuple(int(round(v * self.scale)) for v in self.box)
+
+    def target(self):
+        """(centre_x, centre_y, age_s) in full-resolution pixels while tracking, else None."""
+        if self.state != 'tracking' or self.box is None:
+            return None
+        x, y, w, h = self.full_box()
+        return x + w / 2.0, y + h / 2.0, time.time() - self.updated
+
+    def draw(self, frame):
+        if self.state == 'idle' or self.box is None:
+            return frame
+        x, y, w, h = self.full_box()
+        colour = (0, 255, 0) if self.state == 'tracking' else (0, 0, 255)
+        cv2.rectangle(frame, (x, y), (x + w, y + h), colour, 2)
+        cv2.putText(frame, f"LOCK {self.score:.2f}" if self.state == 'tracking' else "LOST",
+                    (x, max(y - 6, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, colour, 1, cv2.LINE_AA)
+        return frame
+
+    def get_state(self):
+        return {
+            'state': self.state,
+            'box': list(self.full_box()) if self.box is not None and self.state != 'idle' else None,
+            'score': round(self.score, 3),
+            'frame_id': self.frame_id,
+            'scale': f"1/{2 ** self.level}",
+            'mean_ms': round(float(np.mean(self.timings)), 3) if self.timings else 0.0,
+            'max_ms': round(float(max(self.timings)), 3) if self.timings else 0.0,
+            'budget_ms': self.budget_ms,
+            'frames_tracked': self.frames_tracked,
+            'level_changes': self.level_changes,
+        }
+
+
+class TurretController(threading.Thread):
+    def __init__(self, tracker, resolution, focal_px, send, steps_per_degree, command_hz=5.0, gain=0.6,
+                 dead_band_deg=1.0, max_steps=10, max_tilt_deg=5.0, max_age_s=0.3, paused=None):
+        """
+        :param send: send(pan_steps, tilt_degrees), called at most command_hz times per second.
+        :param steps_per_degree: Pan stepper steps per degree of turret rotation.
+        :param gain: Fraction of the measured error corrected per command (< 1 avoids overshoot).
+        :param max_steps: Pan steps per command limit (MAX_STEPS_PER_COMMAND).
+        :param max_tilt_deg: Tilt change per command limit.
+        :param max_age_s: Ignore tracker positions older than this.
+        :param paused: Optional callable; no commands while it returns True (operator steering).
+        """
+        super().__init__(daemon=True)
+        self.tracker = tracker
+        self.centre = (resolution[0] / 2.0, resolution[1] / 2.0)
+        self.focal_px = focal_px
+        self.send = send
+        self.steps_per_degree = steps_per_degree
+        self.interval = 1.0 / command_hz
+        self.gain = gain
+        self.dead_band_deg = dead_band_deg
+        self.max_steps = max_steps
+        self.max_tilt_deg = max_tilt_deg
+        self.max_age_s = max_age_s
+        self.paused = paused
+        self.running = True
+        self.commands = 0
+        self.last_command = (0, 0.0)
+
+    def compute(self, target_x, target_y):
+        """Pan steps and tilt degrees for a target at (target_x, target_y) full-resolution pixels."""
+        error_x = math.degrees(math.atan((target_x - self.centre[0]) / self.focal_px))
+        error_y = math.degrees(math.atan((target_y - self.centre[1]) / self.focal_px))
+        pan_steps = 0
+        tilt_deg = 0.0
+        if abs(error_x) > self.dead_band_deg:
+            pan_steps = int(round(self.gain * error_x * self.steps_per_degree))
+            pan_steps = max(-self.max_steps, min(self.max_steps, pan_steps))
+        if abs(error_y) > self.dead_band_deg:
+            tilt_deg = max(-self.max_tilt_deg, min(self.max_tilt_deg, self.gain * error_y))
+        return pan_steps, tilt_deg
+
+    def run(self):
+        while self.running:
+            time.sleep(self.interval)
+            target = self.tracker.target()
+            if target is None or target[2] > self.max_age_s:
+                continue
+            if self.paused is not None and self.paused():
+                continue
+            if self.tracker.frame_size is not None:
+                self.centre = (self.tracker.frame_size[0] / 2.0, self.tracker.frame_size[1] / 2.0)
+            pan_steps, tilt_deg = self.compute(target[0], target[1])
+            if pan_steps or tilt_deg:
+                try:
+                    self.send(pan_steps, tilt_deg)
+                    self.commands += 1
+                    self.last_command = (pan_steps, round(tilt_deg, 2))
+                except Exception as e:
+                    print(f"Turret command failed: {e}")
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Lens undistortion for stream_camera() with precomputed remap tables.
+
+cv2.undistort() recomputes the distortion model for every pixel on every call.
+Here the model is evaluated once per output profile (frame size) with
+cv2.initUndistortRectifyMap in fixed-point form (CV_16SC2 + CV_16UC1, the
+layout cv2.remap handles fastest), the tables are cached on disk, and each
+frame costs a single cv2.remap.
+
+Calibration files are written by calibrate_camera.py (.npz with camera_matrix,
+dist_coeffs and image_size). The intrinsics are scaled when the stream runs at
+a different resolution from the calibration images, as long as the aspect
+ratio is the same.
+
+    undistorter = Undistorter('calibration_data/camera.npz')
+    frame = undistorter.apply(frame)
+"""
+import hashlib
+import os
+
+import cv2
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join('calibration_data', 'maps')
+
+
+def load_calibration(path):
+    """:return: (camera_matrix, dist_coeffs, (width, height)) from a calibrate_camera.py file."""
+    data = np.load(path)
+    width, height = (int(v) for v in data['image_size'])
+    return data['camera_matrix'].astype(np.float64), data['dist_coeffs'].astype(np.float64), (width, height)
+
+
+def save_calibration(path, camera_matrix, dist_coeffs, image_size, rms=None):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    np.savez(path, camera_matrix=camera_matrix, dist_coeffs=dist_coeffs,
+             image_size=np.array(image_size), rms=np.array(-1.0 if rms is None else rms))
+
+
+def synthetic_calibration(image_size=(640, 480), k1=-0.3, k2=0.1):
+    """Barrel distortion similar to a cheap wide-angle module, for benchmarks without a calibration."""
+    width, height = image_size
+    focal = 0.9 * width
+    camera_matrix = np.array([[focal, 0, width / 2.0], [0, focal, height / 2.0], [0, 0, 1]])
+    return camera_matrix, np.array([k1, k2, 0, 0, 0], dtype=np.float64), image_size
+
+
+def scale_camera_matrix(camera_matrix, from_size, to_size):
+    sx = to_size[0] / float(from_size[0])
+    sy = to_size[1] / float(from_size[1])
+    scaled = camera_matrix.copy()
+    scaled[0, 0] *= sx
+    scaled[0, 2] *= sx
+    scaled[1, 1] *= sy
+    scaled[1, 2] *= sy
+    return scaled
+
+
+def build_maps(camera_matrix, dist_coeffs, calibration_size, output_size, alpha=0.0, fixed_point=True):
+    """
+    :param alpha: 0 = crop to valid pixels only (no black corners), 1 = keep the whole field of view.
+    :param fixed_point: CV_16SC2 maps (fast) instead of CV_32FC1 (reference).
+    :return: (map1, map2) for cv2.remap.
+    """
+    matrix = scale_camera_matrix(camera_matrix, calibration_size, output_size)
+    new_matrix, _ = cv2.getOptimalNewCameraMatrix(matrix, dist_coeffs, output_size, alpha, output_size)
+    map_type = cv2.CV_16SC2 if fixed_point else cv2.CV_32FC1
+    return cv2.initUndistortRectifyMap(matrix, dist_coeffs, None, new_matrix, output_size, map_type)
+
+
+class Undistorter:
+    def __init__(self, calibration_path=None, alpha=0.0, cache_dir=DEFAULT_CACHE_DIR, calibration=None):
+        """
+        :param calibration_path: .npz file from calibrate_camera.py.
+        :param alpha: Passed to getOptimalNewCameraMatrix (0 = crop, 1 = full view).
+        :param cache_dir: Where remap tables are cached; None disables the disk cache.
+        :param calibration: (camera_matrix, dist_coeffs, size) instead of a file (benchmarks).
+        """
+        if calibration is None:
+            calibration = load_calibration(calibration_path)
+        self.camera_matrix, self.dist_coeffs, self.calibration_size = calibration
+        self.alpha = alpha
+        self.cache_dir = cache_dir
+        self.maps = {}  # (width, height) -> (map1, map2)
+        digest = hashlib.sha1()
+        for array in (self.camera_matrix, self.dist_coeffs, np.array(self.calibration_size), np.array([alpha])):
+            digest.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+        self.key = digest.hexdigest()[:12]
+
+    def _cache_path(self, size):
+        return os.path.join(self.cache_dir, f"undistort_{self.key}_{size[0]}x{size[1]}.npz")
+
+    def maps_for(self, size):
+        """Remap tables for one output profile: memory, then disk cache, then computed."""
+        maps = self.maps.get(size)
+        if maps is not None:
+            return maps
+        path = self._cache_path(size) if self.cache_dir else None
+        if path and os.path.exists(path):
+            try:
+                data = np.load(path)
+                maps = (data['map1'], data['map2'])
+            except Exception as e:
+                print(f"Ignoring unreadable remap cache {path}: {e}")
+        if maps is None:
+            maps = build_maps(self.camera_matrix, self.dist_coeffs, self.calibration_size, size, self.alpha)
+            if path:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = path + '.tmp.npz'
+                np.savez(tmp_path, map1=maps[0], map2=maps[1])
+                os.replace(tmp_path, path)
+                print(f"Cached undistortion maps for {size[0]}x{size[1]} in {path}")
+        self.maps[size] = maps
+        return maps
+
+    def apply(self, frame):
+        """Undistorted copy of a BGR frame (cv2.remap cannot work in place)."""
+        map1, map2 = self.maps_for((frame.shape[1], frame.shape[0]))
+        return cv2.remap(frame, map1, map2, cv2.INTER_LINEAR)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+HTTP over a Unix domain socket, for on-board helper processes.
+
+web_fixed.py serves the same routes on UNIX_SOCKET_PATH as on TCP PORT when
+UNIX_SOCKET_PATH is set. Local consumers (logger, recorder, vision scripts)
+skip the TCP stack and access is controlled by the socket file's permissions.
+
+Client side, from another process on the Pi:
+
+    from unix_http import UnixHTTPConnection
+    conn = UnixHTTPConnection('/tmp/tank_web.sock')
+    conn.request('GET', '/get_distance')
+    print(conn.getresponse().read())
+
+or with curl:  curl --unix-socket /tmp/tank_web.sock http://localhost/get_distance
+"""
+import http.client
+import os
+import socket
+import stat
+from socketserver import ThreadingMixIn, UnixStreamServer
+
+
+class ThreadedUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    """ThreadedHTTPServer equivalent listening on a filesystem socket."""
+    daemon_threads = True
+
+    def __init__(self, path, handler_class, mode=0o660):
+        # A socket file left over from a previous run would make bind() fail
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+        self.socket_mode = mode
+        if getattr(handler_class, 'disable_nagle_algorithm', False):
+            # TCP_NODELAY does not exist on AF_UNIX sockets, setup() would fail
+            handler_class = type(handler_class.__name__, (handler_class,), {'disable_nagle_algorithm': False})
+        super().__init__(path, handler_class)
+
+    def server_bind(self):
+        super().server_bind()
+        os.chmod(self.server_address, self.socket_mode)
+        # BaseHTTPRequestHandler expects these, HTTPServer normally sets them
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+    def get_request(self):
+        # AF_UNIX peers have no address; give handlers a (host, port) tuple like TCP
+        request, _ = self.socket.accept()
+        return request, ('unix', 0)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except FileNotFoundError:
+            pass
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """http.client connection that talks to a ThreadedUnixHTTPServer."""
+    def __init__(self, path, timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
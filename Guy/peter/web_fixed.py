@@ -3,6 +3,7 @@ import cv2
 import io
 import time
 import threading
+import queue
 from http.server import SimpleHTTPRequestHandler, HTTPServer
 from socketserver import ThreadingMixIn
 from PIL import Image
@@ -13,29 +14,66 @@ import pytz
 import urllib.parse
 from typing import Dict, Any
 import json
+import math
+from multiproc_frontend import SharedFrameSlot, start_frontend_workers, stop_frontend_workers
+from unix_http import ThreadedUnixHTTPServer
+from async_http import AsyncHTTPServer
+from keepalive_http import KeepAliveMixin
+from recorder import SegmentRecorder, handle_recordings_request
+from replay import ReplayBuffer, send_replay
+from frame_sources import open_frame_source
+from filter_chain import FilterChain
+from hud_overlay import HudOverlay
+from undistort import Undistorter
+from stabilizer import GyroStabilizer, focal_from_hfov
+from frame_views import FrameViews, VIEW_STATS
+from motion_detector import MotionDetector
+from turret_tracker import TemplateTracker, TurretController
+from laser_detector import LaserDetector
+from object_detector import ObjectDetector
+from foveate import Foveator
+from digital_zoom import DigitalZoom
+from panorama import PanoramaSweep
+from dataset_capture import DatasetCapture
+from camera_pipelines import CameraPipeline, FrameStats, PipCompositor
+from telemetry import EventStream, TelemetryState, etag_matches
 
+# Missing libraries are reported by main(), so the benchmarks can import this module's settings without them
 try:
     import serial
 except ImportError:
-    print("Error: pyserial library not found. Please install it with: pip install install pyserial")
-    exit(1)
+    serial = None
 
 try:
     from gpiozero import LED, Servo
     GPIO_SUPPORT = True
 except ImportError:
-    print("Warning: gpiozero library not found. GPIO control will be disabled.")
     GPIO_SUPPORT = False
 
 # Configuration
 PORT = 8080
 RESOLUTION = (640, 480)
+# Camera capture size. Larger than RESOLUTION gives the digital zoom (/zoom) real detail to crop from;
+# at zoom 1 the frame is scaled down to RESOLUTION right after stabilization
+CAPTURE_RESOLUTION = RESOLUTION
 FRAMERATE = 24
 JPEG_QUALITY = 80
 CAMERA_INDEX = 0
+# Where frames come from (see frame_sources.py): 'camera:0', 'file:run.mp4@2', 'test', 'jpegdir:frames/'
+FRAME_SOURCE = f'camera:{CAMERA_INDEX}'
+# Cameras (see camera_pipelines.py): the main camera above runs the full pipeline and is also served at
+# /stream/<MAIN_CAMERA_NAME>.mjpg; each extra camera gets its own capture/encode pipeline at /stream/<name>.mjpg
+MAIN_CAMERA_NAME = 'drive'
+EXTRA_CAMERAS = [] # e.g. [{'name': 'turret', 'source': 'camera:1', 'resolution': (320, 240), 'framerate': 15, 'quality': 70}]
+PIP_CAMERAS = None # e.g. ('drive', 'turret'): main picture and inset of /stream/pip.mjpg, built only while watched
+PIP_FRAMERATE = 15
+PIP_INSET_SCALE = 0.3
 # ----------------------------------------------------
 SERIAL_PORT = '/dev/ttyAMA0' # Common port for Arduino on Pi. 
 BAUDRATE = 115200
+# The firmware reads one line per loop() into a ~256-byte RX buffer, so lines are written one per loop:
+# after each, the writer waits for that loop's Dist: report, or this long (just over pulseIn's 1 s timeout)
+SERIAL_LINE_TIMEOUT = 1.2
 # ----------------------------------------------------
 # Stepper Control Configuration
 MAX_STEPS_PER_COMMAND = 10 # Maximum steps to send to Arduino per mouse/joystick update
@@ -46,6 +84,128 @@ X_SCALE_FACTOR = X_POS_RANGE / MAX_STEPS_PER_COMMAND # 320 / 10 = 32
 TURRET_STEP_DELTA = 3 # Fixed steps for Stepper Pan
 TURRET_TILT_DELTA_ANGLE = 5 # Fixed angle change for Servo Tilt
 # ----------------------------------------------------
+# HTTP server core
+# 'asyncio' = one event loop for every connection (see async_http.py)
+# 'threaded' = ThreadedHTTPServer, one thread per request and per MJPEG viewer (original behaviour)
+SERVER_CORE = 'asyncio'
+# Routes answered directly on the event loop: they only read globals or queue work, so they never block it
+ASYNC_LOOP_ROUTES = ('/tank_command', '/get_', '/state', '/events', '/laser_on', '/laser_off', '/stream.mjpg',
+                     '/stream/')
+ASYNC_HANDLER_THREADS = 4 # Threads for every other route (static files, panorama, dataset, recordings...)
+# Routes that stream until the viewer leaves: their own threads, so they cannot take the ones above
+ASYNC_STREAM_ROUTES = ('/replay.mjpg', '/recordings/play.mjpg')
+ASYNC_STREAM_THREADS = 8 # Replay / playback viewers at once; more get a 503
+# HTTP/1.1 keep-alive (see keepalive_http.py), for both cores
+KEEPALIVE_IDLE_S = 15 # Idle kept-alive connections are closed after this
+KEEPALIVE_MAX_REQUESTS = 1000 # Responses per connection before it is closed (~10 s of index.html polling)
+# /events telemetry push (Server-Sent Events, see telemetry.py)
+EVENTS_MAX_RATE = 20 # Default events per second per client; /events?rate= may ask for fewer (or more, up to 4x)
+# ----------------------------------------------------
+# Multi-process viewer front-end (see multiproc_frontend.py)
+# 0 = serve everything from one ThreadedHTTPServer on PORT (original behaviour)
+# N = fork N workers sharing PORT via SO_REUSEPORT; this process keeps the serial
+#     port and answers forwarded control requests on 127.0.0.1:CONTROL_PORT
+FRONTEND_WORKERS = 0
+CONTROL_PORT = 8079
+# ----------------------------------------------------
+# Unix domain socket for on-board helper processes (see unix_http.py)
+# Same routes as PORT; None disables it. Access is controlled by file permissions.
+UNIX_SOCKET_PATH = None # e.g. '/tmp/tank_web.sock'
+UNIX_SOCKET_MODE = 0o660
+# ----------------------------------------------------
+# Rolling recorder (see recorder.py). Writes the already-encoded JPEGs, never re-encodes.
+RECORDING_ENABLED = False
+RECORDINGS_DIR = 'recordings'
+RECORDING_SEGMENT_SECONDS = 60
+RECORDING_MAX_BYTES = 2 * 1024 ** 3 # Oldest segments are deleted above this
+# ----------------------------------------------------
+# Instant replay (see replay.py): RAM ring of recent JPEGs, clip saved on every shot
+REPLAY_ENABLED = False
+REPLAY_MAX_BYTES = 16 * 1024 * 1024 # ~15 s at 640x480 q80, 24 fps
+REPLAY_CLIP_DIR = 'clips'
+REPLAY_PRE_SECONDS = 3.0
+REPLAY_POST_SECONDS = 2.0
+# ----------------------------------------------------
+# Filter chain (see filter_chain.py): cvfilter_py-style filter files run in order on every frame
+# e.g. ['../../mjpg-streamer/mjpg-streamer-experimental/plugins/input_opencv/filters/cvfilter_py/example_filter.py']
+FILTERS = []
+FILTER_BUDGET_MS = 8.0 # Default per-filter budget; filters overrunning it repeatedly are bypassed
+# ----------------------------------------------------
+# Lens undistortion (see undistort.py, calibrate with calibrate_camera.py)
+# Remap tables are built once per frame size and cached under calibration_data/maps/
+UNDISTORT_CALIBRATION = None # e.g. 'calibration_data/camera.npz'
+UNDISTORT_ALPHA = 0.0 # 0 = crop to valid pixels, 1 = keep the full field of view (black corners)
+# ----------------------------------------------------
+# Gyro stabilization (see stabilizer.py). Needs G:<millis>,<gx>,<gy>,<gz> lines from the MPU6050 on the serial link
+EIS_ENABLED = False
+EIS_MARGIN = 0.1 # Fraction cropped on each side; shake beyond it is not corrected
+EIS_SMOOTHING_S = 0.4 # Motion slower than this is treated as intended (driving, turret turns)
+EIS_BUDGET_MS = 5.0
+EIS_HFOV_DEG = 62.0 # Horizontal field of view, used when no calibration gives the focal length
+EIS_CAMERA_DELAY_S = 0.03 # Capture-to-read() delay; frame time = read time - this
+EIS_AXES = ((2, 1.0), (1, -1.0), (0, 1.0)) # (gyro axis, sign) for camera yaw, pitch, roll
+# ----------------------------------------------------
+# Sentry motion detection (see motion_detector.py): 1/4-scale grey frames in a background worker
+MOTION_ENABLED = False
+MOTION_ANALYSIS_FPS = 5.0 # Independent of FRAMERATE; frames arriving while the worker is busy are skipped
+MOTION_OVERLAY = True # Outline moving regions on the stream
+MOTION_SUPPRESS_WHILE_DRIVING = True # Pause while M1/M2 are non-zero (the whole picture moves)
+# ----------------------------------------------------
+# Target lock-on (see turret_tracker.py): click the video to lock, the turret follows the target
+TRACKER_ENABLED = False
+TRACKER_LEVEL = 2 # Grey pyramid level tracked on (2 = 1/4 scale); moves coarser when over budget
+TRACKER_BUDGET_MS = 5.0 # Share of the 41 ms frame period at 24 fps
+TRACKER_COMMAND_HZ = 5 # Turret commands per second; the turret settles between them
+TRACKER_DEFAULT_BOX = 48 # Box size locked around a click, in stream pixels
+# 'TLR' = drive the turret with tank-command lines (espWorkProject_fixed.ino: 10 steps / 1 deg per line),
+# 'P' = send P{steps} for firmware with the direct stepper command
+TRACKER_PAN_COMMAND = 'TLR'
+TRACKER_PAN_SIGN = 1 # Flip (-1) if the turret turns away from the target
+TRACKER_TILT_SIGN = 1
+TURRET_STEPS_PER_DEGREE = 2048 / 360.0 # 28BYJ-48 stepper, stepsPerRevolution = 2048
+TLR_STEPS_PER_LINE = 10 # stepsToTake in espWorkProject_fixed.ino
+# ----------------------------------------------------
+# Laser dot detection and hit scoring (see laser_detector.py): searches a small ROI around the
+# boresight, only while the laser is on (/laser_on) or during a shot window after firing
+LASER_DETECTION = False
+LASER_ROI_SIZE = 160 # Square searched around the boresight, in stream pixels
+LASER_BORESIGHT = (0, 0) # Where the laser lands relative to the crosshair, in pixels
+LASER_SHOT_WINDOW_S = 0.3 # Firmware lights the laser 100 ms per shot; plus camera latency
+# ----------------------------------------------------
+# People/vehicle detection (see object_detector.py): OpenCV DNN in a separate process, boxes drawn
+# on newer frames as results arrive. None = off
+DETECTOR_MODEL = None # e.g. ('models/MobileNetSSD_deploy.caffemodel', 'models/MobileNetSSD_deploy.prototxt')
+DETECTOR_FPS = 2.0 # Detections per second at most; the stream never waits for them
+DETECTOR_MIN_CONFIDENCE = 0.5
+DETECTOR_THREADS = 2 # OpenCV threads in the detector process
+# ----------------------------------------------------
+# Streaming profile (see foveate.py): 'standard', or 'foveated' = full detail in the centre and a
+# reduced periphery, for weak links. Switch and resize at runtime with /stream_profile
+STREAM_PROFILE = 'standard'
+FOVEA_SIZE = 0.4 # Full-detail centre, as a fraction of the frame width and height
+FOVEA_PERIPHERY = 'downsample' # or 'blur'
+FOVEA_PERIPHERY_SCALE = 0.25 # Resolution kept outside the fovea
+FOVEA_MEASURE_EVERY = 48 # Also encode the standard frame every N frames to measure the saving
+# ----------------------------------------------------
+# Panorama from a turret pan sweep (see panorama.py): /panorama/start, served at /panorama.jpg.
+# Turns the turret with TRACKER_PAN_COMMAND ('P' steps, or TLR lines) and returns it afterwards
+PANORAMA_SPAN_DEG = 360.0
+PANORAMA_STEP_DEG = 20.0 # Well under the ~62 deg field of view, for overlap
+PANORAMA_SETTLE_S = 0.8 # Wait after each move before taking the frame
+# ----------------------------------------------------
+# Dataset capture (see dataset_capture.py): /dataset/start samples frames with the current
+# /tank_command values and telemetry into sharded files plus a manifest
+DATASET_DIR = 'datasets'
+DATASET_SAMPLE_FPS = 4.0
+DATASET_BLUR_THRESHOLD = 60.0 # Laplacian variance below which a frame is skipped as blurry; None = keep all
+DATASET_SHARD_SAMPLES = 1000
+DATASET_WORKERS = 2
+# ----------------------------------------------------
+# HUD burned into the stream (see hud_overlay.py): crosshair, distance, motor bars
+# None = off, 'cached' = pre-rendered tiles re-rendered on change, 'direct' = redraw every frame
+# (run bench_hud.py on the Pi to see which is cheaper there)
+HUD_MODE = None
+# ----------------------------------------------------
 
 
 # Set Thailand timezone
@@ -55,6 +215,9 @@ THAILAND_TIMEZONE = pytz.timezone('Asia/Bangkok')
 # Global Serial Object, Lock, and Sensor Data
 ser = None
 serial_lock = threading.Lock()
+serial_out = queue.Queue() # Lines for the Arduino, written by write_serial_thread() so HTTP handlers never wait for the port
+firmware_loop = threading.Condition() # Notified on every Dist: line, which the firmware prints once per loop()
+firmware_loops = 0
 ultrasonic_distance = "N/A" # Variable to store the distance value (cm)
 
 # Motor speed variables (0-255 range)
@@ -73,6 +236,62 @@ class StreamingOutput(io.BufferedIOBase):
             self.condition.notify_all()
 
 output = StreamingOutput()
+# Shared-memory copy of the newest frame for the front-end workers (None when FRONTEND_WORKERS = 0)
+frame_slot = None
+frontend_workers = []
+# Background segment recorder (None when RECORDING_ENABLED = False)
+recorder = None
+# Instant replay ring (None when REPLAY_ENABLED = False)
+replay_buffer = None
+if REPLAY_ENABLED:
+    replay_buffer = ReplayBuffer(REPLAY_MAX_BYTES, REPLAY_CLIP_DIR, REPLAY_PRE_SECONDS, REPLAY_POST_SECONDS)
+last_fire_state = 0 # Previous FC value, to detect the moment the operator fires
+# Filter chain applied before encoding (None when FILTERS is empty)
+filter_chain = None
+# Derived views (gray, HSV, pyramid) of the newest frame, shared by every analysis consumer
+latest_views = None
+# Undistortion stage, first in the pipeline (None when UNDISTORT_CALIBRATION is None)
+undistorter = None
+# Gyro stabilizer, fed by read_serial_data_thread() (None when EIS_ENABLED = False)
+stabilizer = None
+if EIS_ENABLED:
+    stabilizer = GyroStabilizer(CAPTURE_RESOLUTION, focal_from_hfov(CAPTURE_RESOLUTION[0], EIS_HFOV_DEG), EIS_MARGIN,
+                                EIS_SMOOTHING_S, EIS_BUDGET_MS, EIS_AXES)
+# Motion detector (None when MOTION_ENABLED = False)
+motion_detector = None
+# Target tracker and turret controller (None when TRACKER_ENABLED = False)
+tracker = None
+turret_controller = None
+# Laser spot detector (None when LASER_DETECTION = False)
+laser_detector = None
+if LASER_DETECTION:
+    laser_detector = LaserDetector(RESOLUTION, LASER_ROI_SIZE, LASER_BORESIGHT)
+# Foveated profile; always created so it can be switched on at runtime
+foveator = Foveator(FOVEA_SIZE, FOVEA_PERIPHERY_SCALE, FOVEA_PERIPHERY, FOVEA_MEASURE_EVERY,
+                    enabled=STREAM_PROFILE == 'foveated')
+# Server-side digital zoom, applied to every frame (a no-op at zoom 1 when CAPTURE_RESOLUTION = RESOLUTION)
+digital_zoom = DigitalZoom(RESOLUTION)
+# Extra camera pipelines by name, and the PiP composite (None when PIP_CAMERAS is None)
+camera_pipelines = {}
+pip_compositor = None
+# Achieved fps and CPU per frame of the main pipeline (stream_camera)
+main_stats = FrameStats()
+latest_main_frame = None # Newest main frame as streamed, for the PiP composite
+# Running dataset capture (None when not capturing)
+dataset_capture = None
+# Running or last panorama sweep (None until /panorama/start)
+panorama_sweep = None
+# Object detector process (None when DETECTOR_MODEL is None)
+object_detector = None
+# Last operator tank command, so tracker commands keep the operator's drive/fire/light values
+last_tank_command = {'FR': 0, 'LR': 0, 'UD': 0, 'TLR': 0, 'FC': 0, 'LC': 0}
+last_tank_command_time = 0.0
+# Snapshot of the dashboard telemetry served by /state, updated where the values change
+telemetry = TelemetryState(clock=lambda: datetime.now(THAILAND_TIMEZONE).strftime("%H:%M:%S"))
+# HUD renderer (None when HUD_MODE is None)
+hud = None
+if HUD_MODE:
+    hud = HudOverlay(RESOLUTION)
 
 # Global variables for control threads
 blink_stop_event = threading.Event()
@@ -84,11 +303,12 @@ last_frame_latency = 0
 # Thread for Reading Ultrasonic Data from Arduino (Unchanged)
 def read_serial_data_thread():
     """Continuously reads data from the Arduino serial port for sensor values."""
-    global ser, ultrasonic_distance, motor_m1_speed, motor_m2_speed
+    global ser, ultrasonic_distance, motor_m1_speed, motor_m2_speed, firmware_loops
     print("Starting Arduino serial data reader thread...")
     if ser is None:
         print("Serial reader skipped: Serial port not available.")
         return
+    telemetry.update(link='up')
         
     while True:
         try:
@@ -112,10 +332,17 @@ def read_serial_data_thread():
                             print(f"Warning: Corrupted data received, some bytes ignored")
                     
                     # Only process non-empty lines
-                    if line:
+                    if line.startswith("G:"):
+                        # Gyro samples arrive at up to 200 Hz: no per-line logging
+                        if stabilizer is not None:
+                            stabilizer.add_line(line[2:])
+                    elif line:
                         print(line)
                         # Arduino sends: Dist:XXX or Dist:ERROR
                         if line.startswith("Dist:"):
+                            with firmware_loop:
+                                firmware_loops += 1
+                                firmware_loop.notify_all()
                             try:
                                 # Extract the numeric part
                                 distance_value = line.split(':')[1]
@@ -145,20 +372,105 @@ def read_serial_data_thread():
                                 print(f"Motor M2 PWM Received: {motor_m2_speed}")
                             except:
                                 pass # Ignore malformed lines
+                        telemetry.update(distance=ultrasonic_distance, m1=motor_m1_speed, m2=motor_m2_speed, link='up')
                             
         except serial.SerialException as e:
             print(f"Serial connection error: {e}")
             ultrasonic_distance = "N/A"
+            telemetry.update(distance=ultrasonic_distance, link='down')
             # Try to reconnect
             time.sleep(1)
             continue
         except Exception as e:
             print(f"Serial reading thread error: {e}")
             ultrasonic_distance = "N/A"
+            telemetry.update(distance=ultrasonic_distance)
             # Don't break on general errors, just continue
             time.sleep(0.1)
             continue
         time.sleep(0.01) # Short delay to prevent high CPU usage
+
+def write_serial_thread():
+    """
+    Writes the lines queued by send_serial_lines() to the Arduino, in order, one per firmware loop.
+
+    A burst written at once (a turret move is one line per 10 steps) overflows the firmware's RX buffer
+    and lines are lost, so each line waits for the loop that reads it (SERIAL_LINE_TIMEOUT at most).
+    """
+    while True:
+        line = serial_out.get()
+        if isinstance(line, threading.Event):
+            line.set() # Everything queued before it has been written and read
+            continue
+        with firmware_loop:
+            loops = firmware_loops
+        try:
+            with serial_lock:
+                ser.write((line + '\n').encode('utf-8'))
+        except Exception as e:
+            print(f"Serial write error: {e}")
+            continue
+        with firmware_loop:
+            firmware_loop.wait_for(lambda: firmware_loops != loops, SERIAL_LINE_TIMEOUT)
+
+def send_serial_lines(lines, wait=False):
+    """
+    Queues command lines for the Arduino and returns at once (safe on the event loop), or with
+    wait=True once the firmware has read them all.
+    """
+    for line in lines:
+        serial_out.put(line)
+    if wait and lines:
+        done = threading.Event()
+        serial_out.put(done)
+        done.wait(serial_out.qsize() * SERIAL_LINE_TIMEOUT + 1.0)
+
+def send_turret_command(pan_steps, tilt_deg):
+    """
+    Moves the turret for the target tracker.
+
+    :param pan_steps: Stepper steps, positive = turn right (towards a target right of centre).
+    :param tilt_deg: Servo degrees, positive = tilt down (towards a target below centre).
+
+    Returns once the firmware has read the lines, so the turret has moved before the panorama sweep
+    grabs its next frame, and the tracker never queues a new move behind an unfinished one.
+    """
+    if ser is None:
+        return
+    pan_steps *= TRACKER_PAN_SIGN
+    tilt_deg *= TRACKER_TILT_SIGN
+    lines = []
+    if TRACKER_PAN_COMMAND == 'P':
+        if pan_steps:
+            lines.append(f"P{pan_steps}")
+        pan_lines = 0
+    else:
+        pan_lines = -(-abs(pan_steps) // TLR_STEPS_PER_LINE) # The firmware moves 10 steps per TLR line
+    tilt_lines = int(round(abs(tilt_deg))) # and 1 degree per UD line
+    base = last_tank_command
+    for n in range(max(pan_lines, tilt_lines)):
+        # Joystick convention (index_fixed.html): TLR < 0 turns right, UD > 0 tilts up
+        tlr = (-7 if pan_steps > 0 else 7) if n < pan_lines else 0
+        ud = (-7 if tilt_deg > 0 else 7) if n < tilt_lines else 0
+        lines.append(f"FR:{base.get('FR', 0)};LR:{base.get('LR', 0)};UD:{ud};TLR:{tlr};"
+                     f"FC:{base.get('FC', 0)};LC:{base.get('LC', 0)}")
+    send_serial_lines(lines, wait=True)
+
+def dataset_labels():
+    """Controls and telemetry stored with each dataset sample."""
+    return {
+        'command': dict(last_tank_command),
+        'command_age_s': round(time.time() - last_tank_command_time, 3) if last_tank_command_time else None,
+        'distance': ultrasonic_distance,
+        'm1': motor_m1_speed,
+        'm2': motor_m2_speed,
+        'zoom': digital_zoom.get_state()['zoom'],
+    }
+
+def operator_steering_turret():
+    """True while the operator is moving the turret; the tracker gives way."""
+    return abs(last_tank_command.get('TLR', 0)) > 3 or abs(last_tank_command.get('UD', 0)) > 3
+
 def parse_tank_command(path: str) -> Dict[str, int]:
     """
     Parses the command from a URL path, decodes it, and returns a dictionary 
@@ -197,17 +509,22 @@ def parse_tank_command(path: str) -> Dict[str, int]:
     return result
 
 
-class StreamingHandler(SimpleHTTPRequestHandler):
+class StreamingHandler(KeepAliveMixin, SimpleHTTPRequestHandler):
+    timeout = KEEPALIVE_IDLE_S
+    max_requests = KEEPALIVE_MAX_REQUESTS
+
     def log_message(self, format, *args):
         pass
         
     def do_GET(self):
-        global current_blink_thread, blink_stop_event, ultrasonic_distance, motor_m1_speed, motor_m2_speed
+        global current_blink_thread, blink_stop_event, ultrasonic_distance, motor_m1_speed, motor_m2_speed, last_fire_state
+        global panorama_sweep, dataset_capture, last_tank_command_time
         
         # --- Existing code for static files, GPIO, and video stream ---
         if self.path == '/':
             self.send_response(301)
             self.send_header('Location', '/index.html')
+            self.send_header('Content-Length', 0)
             self.end_headers()
         elif self.path == '/index.html':
             try:
@@ -234,63 +551,116 @@ class StreamingHandler(SimpleHTTPRequestHandler):
             
         elif self.path.startswith('/tank_command'):
             try:
-                self.send_response(200)
-                self.end_headers()
                 # print(self.path)
                 command_data = parse_tank_command(self.path)
                 print(command_data)
 
+                # FC 0 -> 1 is a shot: keep a replay clip around it
+                fire_state = command_data.get('FC', 0)
+                if fire_state and not last_fire_state and replay_buffer is not None:
+                    replay_buffer.trigger_clip()
+                if fire_state and not last_fire_state and laser_detector is not None:
+                    laser_detector.arm(LASER_SHOT_WINDOW_S)
+                last_fire_state = fire_state
+                last_tank_command.update(command_data)
+                last_tank_command_time = time.time()
+
                 global ser
                 if ser is None:
                     print("Serial port not initialized.")
-                    return
-
-
-                command_str = f"FR:{command_data['FR']};LR:{command_data['LR']};UD:{command_data['UD']};TLR:{command_data['TLR']};FC:{command_data['FC']};LC:{command_data['LC']}" # "FR:5;LR:0"
-                message_to_send = command_str + '\n'
-                with serial_lock:
-                    ser.write(message_to_send.encode('utf-8'))
+                else:
+                    command_str = f"FR:{command_data['FR']};LR:{command_data['LR']};UD:{command_data['UD']};TLR:{command_data['TLR']};FC:{command_data['FC']};LC:{command_data['LC']}" # "FR:5;LR:0"
+                    send_serial_lines([command_str])
 
             except Exception as e:
                 self.send_error(500, f"Error sending tank command: {e}")
+                return
+            # Answered after the command is queued, so an error can still be reported
+            self.send_response(200)
+            self.send_header('Content-Length', 0)
+            self.end_headers()
         
 
         elif self.path == '/get_time':
             now_thailand = datetime.now(THAILAND_TIMEZONE)
-            time_str = now_thailand.strftime("%H:%M:%S")
+            body = now_thailand.strftime("%H:%M:%S").encode('utf-8')
             self.send_response(200)
             self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', len(body))
             self.end_headers()
-            self.wfile.write(time_str.encode('utf-8'))
+            self.wfile.write(body)
         elif self.path == '/get_latency':
+            body = f"{last_frame_latency:.2f}".encode('utf-8')
             self.send_response(200)
             self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', len(body))
             self.end_headers()
-            self.wfile.write(f"{last_frame_latency:.2f}".encode('utf-8'))
+            self.wfile.write(body)
             
         # Endpoint to fetch real-time ultrasonic distance
         elif self.path == '/get_distance':
+            # Send the global variable value updated by the serial reader thread
+            body = str(ultrasonic_distance).encode('utf-8')
             self.send_response(200)
             self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', len(body))
             self.end_headers()
-            # Send the global variable value updated by the serial reader thread
-            self.wfile.write(str(ultrasonic_distance).encode('utf-8'))
+            self.wfile.write(body)
             
         elif self.path == '/get_motor_speeds':
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            import json
             motor_data = {
                 'M1': motor_m1_speed,
                 'M2': motor_m2_speed
             }
-            self.wfile.write(json.dumps(motor_data).encode('utf-8'))
+            body = json.dumps(motor_data).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
             
+        # All dashboard telemetry in one response; /state?format=bin for the packed form (telemetry.py)
+        elif self.path == '/state' or self.path.startswith('/state?'):
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            fmt = 'bin' if params.get('format', ['json'])[0] == 'bin' else 'json'
+            etag, body = telemetry.snapshot(fmt)
+            if etag_matches(self.headers.get('If-None-Match'), etag):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream' if fmt == 'bin' else 'application/json')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+        # The same telemetry pushed as it changes: /events[?fields=distance,m1,m2&rate=10]
+        elif self.path == '/events' or self.path.startswith('/events?'):
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            fields = [f for f in params.get('fields', [''])[0].split(',') if f]
+            # Last-Event-ID is sent by the browser on reconnect; lastEventId for clients that cannot set headers
+            last_event_id = self.headers.get('Last-Event-ID') or params.get('lastEventId', [None])[0]
+            try:
+                rate = float(params.get('rate', [EVENTS_MAX_RATE])[0])
+                if not math.isfinite(rate):
+                    raise ValueError("rate must be a positive number")
+                rate = min(rate, 4 * EVENTS_MAX_RATE)
+                stream = EventStream(telemetry, fields or None, rate, last_event_id)
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+            self.send_events(stream)
+
         elif self.path == '/laser_on':
             try:
                 # laser.on()
+                if laser_detector is not None:
+                    laser_detector.set_laser(True)
                 self.send_response(200)
+                self.send_header('Content-Length', 0)
                 self.end_headers()
             except Exception as e:
                 self.send_error(500, f"Error controlling laser: {e}")
@@ -298,74 +668,502 @@ class StreamingHandler(SimpleHTTPRequestHandler):
         elif self.path == '/laser_off':
             try:
                 # laser.on()
+                if laser_detector is not None:
+                    laser_detector.set_laser(False)
                 self.send_response(200)
+                self.send_header('Content-Length', 0)
                 self.end_headers()
             except Exception as e:
                 self.send_error(500, f"Error controlling laser: {e}")
 
-        elif self.path == '/stream.mjpg':
+        elif self.path == '/motion':
+            state = motion_detector.get_state() if motion_detector is not None else {'enabled': False}
+            if motion_detector is not None:
+                state['stats'] = motion_detector.get_stats()
+            body = json.dumps(state).encode('utf-8')
             self.send_response(200)
-            self.send_header('Age', 0)
-            self.send_header('Cache-Control', 'no-cache, private')
-            self.send_header('Pragma', 'no-cache')
-            self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=FRAME')
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+        elif self.path == '/laser':
+            state = laser_detector.get_state() if laser_detector is not None else {'enabled': False}
+            body = json.dumps(state).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(body))
             self.end_headers()
+            self.wfile.write(body)
+
+        elif self.path.startswith('/laser_target'):
+            if laser_detector is None:
+                self.send_error(503, "Laser detection is disabled")
+                return
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
             try:
-                while True:
-                    with output.condition:
-                        output.condition.wait()
-                        frame = output.frame
-                    self.wfile.write(b'--FRAME\r\n')
-                    self.send_header('Content-Type', 'image/jpeg')
-                    self.send_header('Content-Length', len(frame))
-                    self.end_headers()
-                    self.wfile.write(frame)
-                    self.wfile.write(b'\r\n')
-            except Exception as e:
-                pass
+                if 'clear' in params:
+                    laser_detector.clear_targets()
+                else:
+                    laser_detector.add_target(float(params['x'][0]), float(params['y'][0]),
+                                              float(params.get('r', [20])[0]), params.get('name', [None])[0])
+            except (KeyError, ValueError):
+                self.send_error(400, "Expected /laser_target?x=&y=[&r=&name=] or /laser_target?clear=1")
+                return
+            self.send_response(200)
+            self.send_header('Content-Length', 0)
+            self.end_headers()
+
+        elif self.path == '/detections':
+            state = object_detector.get_state() if object_detector is not None else {'enabled': False}
+            body = json.dumps(state).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+        elif self.path.startswith('/stream_profile'):
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            try:
+                profile = params.get('profile', [None])[0]
+                if profile not in (None, 'standard', 'foveated'):
+                    raise ValueError("profile must be 'standard' or 'foveated'")
+                foveator.configure(enabled=None if profile is None else profile == 'foveated',
+                                   fovea=params.get('fovea', [None])[0],
+                                   periphery_scale=params.get('scale', [None])[0],
+                                   periphery=params.get('periphery', [None])[0])
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+            body = json.dumps(foveator.get_stats()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+        elif self.path.startswith('/dataset/start'):
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            if dataset_capture is not None and dataset_capture.running:
+                self.send_error(409, "A dataset capture is already running")
+                return
+            try:
+                sample_fps = float(params.get('fps', [DATASET_SAMPLE_FPS])[0])
+                blur = params.get('blur', [DATASET_BLUR_THRESHOLD])[0]
+                blur = None if blur in (None, '', 'off', 'none') else float(blur)
+                # fps=0 would divide by zero, negative or nan fps would sample every frame
+                if not (math.isfinite(sample_fps) and sample_fps > 0) or \
+                        (blur is not None and not (math.isfinite(blur) and blur >= 0)):
+                    raise ValueError
+            except ValueError:
+                self.send_error(400, "Expected /dataset/start[?fps=&blur=] with fps > 0 and blur >= 0")
+                return
+            dataset_capture = DatasetCapture(DATASET_DIR, sample_fps, blur, DATASET_SHARD_SAMPLES, DATASET_WORKERS)
+            print(f"Dataset capture started: {dataset_capture.directory}")
+            body = json.dumps(dataset_capture.get_stats()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+        elif self.path in ('/dataset/stop', '/dataset/state'):
+            if dataset_capture is None:
+                stats = {'running': False}
+            else:
+                if self.path == '/dataset/stop':
+                    dataset_capture.stop()
+                stats = dataset_capture.get_stats()
+            body = json.dumps(stats).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+        elif self.path.startswith('/panorama/start'):
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            if panorama_sweep is not None and panorama_sweep.is_alive():
+                self.send_error(409, "A panorama sweep is already running")
+                return
+            if ser is None:
+                self.send_error(503, "Serial port not initialized")
+                return
+            try:
+                span = float(params.get('span', [PANORAMA_SPAN_DEG])[0])
+                step = float(params.get('step', [PANORAMA_STEP_DEG])[0])
+                # Also rules out nan/inf: the canvas is sized from span / step
+                if not (math.isfinite(span) and math.isfinite(step) and 0 < step <= span <= 360):
+                    raise ValueError
+            except ValueError:
+                self.send_error(400, "Expected /panorama/start[?span=&step=] with 0 < step <= span <= 360")
+                return
+            panorama_sweep = PanoramaSweep(lambda steps: send_turret_command(steps, 0), TURRET_STEPS_PER_DEGREE,
+                                           focal_from_hfov(CAPTURE_RESOLUTION[0], EIS_HFOV_DEG), span, step,
+                                           PANORAMA_SETTLE_S,
+                                           step_quantum=1 if TRACKER_PAN_COMMAND == 'P' else TLR_STEPS_PER_LINE)
+            panorama_sweep.start()
+            body = json.dumps(panorama_sweep.get_state()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+        elif self.path == '/panorama/stop':
+            if panorama_sweep is not None:
+                panorama_sweep.stop()
+            self.send_response(200)
+            self.send_header('Content-Length', 0)
+            self.end_headers()
+
+        elif self.path == '/panorama/state':
+            state = panorama_sweep.get_state() if panorama_sweep is not None else {'state': 'idle'}
+            body = json.dumps(state).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+        elif self.path == '/panorama.jpg':
+            image = panorama_sweep.builder.render() if panorama_sweep is not None else None
+            if image is None:
+                self.send_error(404, "No panorama yet; start a sweep with /panorama/start")
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Content-Length', len(image))
+            self.end_headers()
+            self.wfile.write(image)
+
+        elif self.path.startswith('/zoom'):
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            try:
+                digital_zoom.set(params.get('zoom', [None])[0], params.get('cx', [None])[0], params.get('cy', [None])[0])
+            except ValueError:
+                self.send_error(400, "Expected /zoom?zoom=&cx=&cy=")
+                return
+            body = json.dumps(digital_zoom.get_state()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+        elif self.path.startswith('/track_state'):
+            state = tracker.get_state() if tracker is not None else {'enabled': False}
+            if turret_controller is not None:
+                state['commands'] = turret_controller.commands
+                state['last_command'] = list(turret_controller.last_command)
+            body = json.dumps(state).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+        elif self.path.startswith('/track'):
+            if tracker is None:
+                self.send_error(503, "Target tracking is disabled")
+                return
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            try:
+                if 'stop' in params:
+                    tracker.request_release()
+                else:
+                    x = int(float(params['x'][0]))
+                    y = int(float(params['y'][0]))
+                    w = int(float(params.get('w', [TRACKER_DEFAULT_BOX])[0]))
+                    h = int(float(params.get('h', [TRACKER_DEFAULT_BOX])[0]))
+                    # x, y is the clicked point: centre the box on it
+                    tracker.request_lock(x - w // 2, y - h // 2, w, h)
+            except (KeyError, ValueError):
+                self.send_error(400, "Expected /track?x=&y=[&w=&h=] or /track?stop=1")
+                return
+            self.send_response(200)
+            self.send_header('Content-Length', 0)
+            self.end_headers()
+
+        elif self.path == '/view_stats':
+            body = json.dumps(VIEW_STATS.get_stats()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+        elif self.path == '/stabilizer_stats':
+            stats = stabilizer.get_stats() if stabilizer is not None else {'enabled': False}
+            body = json.dumps(stats).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+        elif self.path == '/filter_stats':
+            stats = filter_chain.get_stats() if filter_chain is not None else {'filters': []}
+            body = json.dumps(stats).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+        elif self.path.startswith('/replay.mjpg'):
+            if replay_buffer is None:
+                self.send_error(503, "Instant replay is disabled")
+            else:
+                try:
+                    query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+                    seconds = float(query.get('seconds', ['5'])[0])
+                    send_replay(self, replay_buffer, seconds)
+                except ValueError:
+                    self.send_error(400, "Invalid seconds value")
+
+        elif self.path.startswith('/recordings'):
+            handle_recordings_request(self, RECORDINGS_DIR)
+
+        elif self.path == '/stream.mjpg' or self.path.startswith('/stream.mjpg?'):
+            # /stream.mjpg?zoom=2&cx=..&cy=.. sets the digital zoom for the stream
+            params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            if params:
+                try:
+                    digital_zoom.set(params.get('zoom', [None])[0], params.get('cx', [None])[0],
+                                     params.get('cy', [None])[0])
+                except ValueError:
+                    self.send_error(400, "Expected /stream.mjpg?zoom=&cx=&cy=")
+                    return
+            self.send_mjpeg(output)
+
+        elif self.path.startswith('/stream/') and self.path.endswith('.mjpg'):
+            name = self.path[len('/stream/'):-len('.mjpg')]
+            if name == MAIN_CAMERA_NAME:
+                self.send_mjpeg(output)
+            elif name in camera_pipelines:
+                self.send_mjpeg(camera_pipelines[name].output)
+            elif name == 'pip' and pip_compositor is not None:
+                self.send_mjpeg(pip_compositor.output, pip_compositor)
+            else:
+                self.send_error(404, f"No camera named '{name}'")
+
+        elif self.path == '/cameras':
+            cameras = {MAIN_CAMERA_NAME: dict(main_stats.get_stats(), resolution=list(RESOLUTION), framerate=FRAMERATE,
+                                              quality=JPEG_QUALITY)}
+            for name, pipeline in camera_pipelines.items():
+                cameras[name] = dict(pipeline.stats.get_stats(), resolution=list(pipeline.resolution),
+                                     framerate=pipeline.framerate, quality=pipeline.quality)
+            body = json.dumps({'cameras': cameras,
+                               'pip': pip_compositor.get_stats() if pip_compositor is not None else None}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(body))
+            self.end_headers()
+            self.wfile.write(body)
         else:
             self.send_error(404)
-            self.end_headers()
+
+    def send_mjpeg_headers(self):
+        self.send_response(200)
+        self.send_header('Age', 0)
+        self.send_header('Cache-Control', 'no-cache, private')
+        self.send_header('Pragma', 'no-cache')
+        self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=FRAME')
+        self.end_headers()
+
+    def send_mjpeg(self, source, viewer=None):
+        """
+        Multipart MJPEG of every new frame written to source (a StreamingOutput / FrameOutput).
+
+        :param viewer: Optional object whose acquire() / release() bracket the stream (PipCompositor).
+        AsyncHTTPServer replaces this method and streams from the event loop instead.
+        """
+        self.send_mjpeg_headers()
+        if viewer is not None:
+            viewer.acquire()
+        try:
+            while True:
+                with source.condition:
+                    source.condition.wait()
+                    frame = source.frame
+                self.wfile.write(b'--FRAME\r\n')
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', len(frame))
+                self.end_headers()
+                self.wfile.write(frame)
+                self.wfile.write(b'\r\n')
+        except Exception as e:
+            pass
+        finally:
+            if viewer is not None:
+                viewer.release()
+
+    def send_events_headers(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Accel-Buffering', 'no')
+        self.end_headers()
+
+    def send_events(self, stream):
+        """
+        Server-Sent Events from a telemetry.EventStream until the client disconnects.
+
+        AsyncHTTPServer replaces this method and streams from the event loop instead.
+        """
+        self.send_events_headers()
+        try:
+            while True:
+                with telemetry.condition:
+                    event, wait = stream.poll(time.monotonic())
+                    if event is None:
+                        telemetry.condition.wait(wait)
+                        continue
+                self.wfile.write(event)
+                self.wfile.flush()
+        except Exception as e:
+            pass
 
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     daemon_threads = True
+    request_queue_size = 128 # socketserver's default of 5 drops connects when a few browsers poll at once
+
+def make_http_server(address):
+    """HTTP server for StreamingHandler on address, with the SERVER_CORE configured."""
+    if SERVER_CORE == 'asyncio':
+        return AsyncHTTPServer(address, StreamingHandler, ASYNC_LOOP_ROUTES, ASYNC_HANDLER_THREADS,
+                               stream_routes=ASYNC_STREAM_ROUTES, stream_threads=ASYNC_STREAM_THREADS)
+    return ThreadedHTTPServer(address, StreamingHandler)
+
+def encode_frame(frame, resize=True):
+    """
+    BGR frame from the frame source -> JPEG bytes at RESOLUTION / JPEG_QUALITY.
+
+    :param resize: False to encode at the frame's own size (zoomed crops are never upscaled).
+    """
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    img = Image.fromarray(rgb_frame)
+    if resize and img.size != RESOLUTION:
+        img = img.resize(RESOLUTION, Image.LANCZOS)
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=JPEG_QUALITY)
+    return buffer.getvalue()
 
 def stream_camera(camera):
-    global last_frame_latency
+    """
+    :param camera: A frame source from frame_sources.py (camera, video file, test pattern...).
+    """
+    global last_frame_latency, latest_views, latest_main_frame
     frame_count = 0
+    frame_id = 0
+    latency_sum = 0.0 # Frame latencies since /state's latency was last updated
+    latency_frames = 0
+    latency_published = time.time()
     error_count = 0
-    print("Starting camera streaming...")
+    print(f"Starting streaming from {camera.describe()}...")
     while True:
         start_time = time.time()
+        cpu_start = main_stats.start()
         try:
             ret, frame = camera.read()
+            capture_time = time.time() - EIS_CAMERA_DELAY_S
             if not ret:
                 error_count += 1
                 if error_count > 10:
-                    camera.release()
-                    time.sleep(1)
-                    camera = cv2.VideoCapture(CAMERA_INDEX)
+                    camera = camera.reopen()
                     if camera.isOpened():
-                        camera.set(cv2.CAP_PROP_FRAME_WIDTH, RESOLUTION[0])
-                        camera.set(cv2.CAP_PROP_FRAME_HEIGHT, RESOLUTION[1])
                         error_count = 0
                 continue
             error_count = 0
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(rgb_frame)
-            if img.size != RESOLUTION:
-                img = img.resize(RESOLUTION, Image.LANCZOS)
-            buffer = io.BytesIO()
-            img.save(buffer, format='JPEG', quality=JPEG_QUALITY)
+            if undistorter is not None:
+                frame = undistorter.apply(frame)
+            if stabilizer is not None:
+                frame = stabilizer.apply(frame, capture_time)
+            if panorama_sweep is not None:
+                panorama_sweep.offer(frame)
+            # Crop before anything else is computed on the frame; at most RESOLUTION from here on
+            frame = digital_zoom.apply(frame)
+            zoomed = digital_zoom.active()
+            frame_id += 1
+            views = FrameViews(frame, frame_id, capture_time)
+            # Retire the previous frame's views; consumers pick up the new ones
+            previous_views, latest_views = latest_views, views
+            if previous_views is not None:
+                previous_views.release()
+            if dataset_capture is not None:
+                dataset_capture.submit(frame, views, dataset_labels)
+            if motion_detector is not None:
+                if MOTION_SUPPRESS_WHILE_DRIVING:
+                    motion_detector.set_suppressed(motor_m1_speed != 0 or motor_m2_speed != 0)
+                motion_detector.submit(views)
+            if tracker is not None:
+                tracker.update(views)
+            if laser_detector is not None:
+                laser_detector.process(views)
+            if object_detector is not None:
+                object_detector.submit(views)
+            if filter_chain is not None:
+                frame = filter_chain.process(frame, views)
+            standard_frame = None
+            if foveator.enabled:
+                # Before the overlays, so the HUD stays sharp at the frame edges
+                standard_frame = frame if foveator.should_measure() else None
+                frame = foveator.apply(frame)
+            if hud is not None:
+                hud.set_values(distance=ultrasonic_distance, m1=motor_m1_speed, m2=motor_m2_speed)
+                if HUD_MODE == 'direct':
+                    hud.draw_direct(frame)
+                else:
+                    hud.draw(frame)
+            if motion_detector is not None and MOTION_OVERLAY:
+                motion_detector.draw(frame)
+            if tracker is not None:
+                tracker.draw(frame)
+            if laser_detector is not None:
+                laser_detector.draw(frame)
+            if object_detector is not None:
+                object_detector.draw(frame, frame_id)
+            jpeg = encode_frame(frame, resize=not zoomed)
+            if foveator.enabled:
+                foveator.record(len(jpeg), len(encode_frame(standard_frame, resize=not zoomed))
+                                if standard_frame is not None else None)
             
             end_time = time.time()
             last_frame_latency = (end_time - start_time) * 1000
+            # /state gets the mean over each second; per-frame jitter would change it on every frame
+            latency_sum += last_frame_latency
+            latency_frames += 1
+            if end_time - latency_published >= 1.0:
+                telemetry.update(latency=round(latency_sum / latency_frames, 1))
+                latency_sum, latency_frames, latency_published = 0.0, 0, end_time
             
-            output.write(buffer.getvalue())
+            output.write(jpeg)
+            latest_main_frame = frame
+            main_stats.end(cpu_start)
+            if frame_slot is not None:
+                frame_slot.write(jpeg)
+            if recorder is not None:
+                recorder.submit(jpeg, end_time)
+            if replay_buffer is not None:
+                replay_buffer.append(jpeg, end_time)
             frame_count += 1
             if frame_count % 100 == 0:
                 print(f"Streamed {frame_count} frames successfully. Latency: {last_frame_latency:.2f} ms")
-            time.sleep(1.0 / FRAMERATE)
+                if filter_chain is not None:
+                    print(f"Filters: {filter_chain.summary()}")
+                if stabilizer is not None:
+                    print(f"Stabilizer: {stabilizer.summary()}")
+                if foveator.enabled:
+                    print(f"Foveated profile: {foveator.summary()}")
+                if object_detector is not None and object_detector.completed:
+                    print(f"Detector: {object_detector.summary()}")
+                if VIEW_STATS.counts:
+                    print(f"Frame views: {VIEW_STATS.summary()}")
+            # Sleep only what is left of the frame period (paced sources already waited in read())
+            time.sleep(max(0.0, 1.0 / FRAMERATE - (time.time() - start_time)))
         except Exception as e:
             print(f"Error in streaming: {e}")
             time.sleep(0.1)
@@ -389,14 +1187,51 @@ def cleanup_gpio(signum, frame):
             ser.close()
         except Exception as e:
             print(f"Error closing serial port: {e}")
+    if frontend_workers:
+        stop_frontend_workers(frontend_workers)
+    if frame_slot is not None:
+        frame_slot.close()
+    if recorder is not None:
+        recorder.stop()
+    if motion_detector is not None:
+        motion_detector.stop()
+    if turret_controller is not None:
+        turret_controller.stop()
+    if object_detector is not None:
+        object_detector.stop()
+    if panorama_sweep is not None:
+        panorama_sweep.stop()
+    if dataset_capture is not None:
+        dataset_capture.stop()
+    for pipeline in camera_pipelines.values():
+        pipeline.stop()
+    if UNIX_SOCKET_PATH and os.path.exists(UNIX_SOCKET_PATH):
+        os.unlink(UNIX_SOCKET_PATH)
     os._exit(0)
 
 def main():
-    global ser
+    global ser, frame_slot, frontend_workers, recorder, filter_chain, undistorter, motion_detector
+    global tracker, turret_controller, object_detector, pip_compositor
     print("Simple MJPEG Streamer using OpenCV")
     print("===================================")
+    if serial is None:
+        print("Error: pyserial library not found. Please install it with: pip install install pyserial")
+        exit(1)
+    if not GPIO_SUPPORT:
+        print("Warning: gpiozero library not found. GPIO control will be disabled.")
     signal.signal(signal.SIGINT, cleanup_gpio)
     signal.signal(signal.SIGTERM, cleanup_gpio)
+
+    # Fork the front-end workers first, before this process starts any threads
+    if FRONTEND_WORKERS > 0:
+        frame_slot = SharedFrameSlot()
+        frontend_workers = start_frontend_workers(FRONTEND_WORKERS, frame_slot, PORT, CONTROL_PORT)
+        print(f"Started {FRONTEND_WORKERS} front-end worker(s) on port {PORT}")
+    if DETECTOR_MODEL:
+        object_detector = ObjectDetector(*DETECTOR_MODEL, frame_shape=(RESOLUTION[1], RESOLUTION[0], 3),
+                                         detection_fps=DETECTOR_FPS, min_confidence=DETECTOR_MIN_CONFIDENCE,
+                                         threads=DETECTOR_THREADS)
+        object_detector.start()
     
     # ----------------------------------------------------
     # Initialize Serial Port
@@ -416,6 +1251,8 @@ def main():
         # START SERIAL READER THREAD
         serial_reader_thread = threading.Thread(target=read_serial_data_thread, daemon=True)
         serial_reader_thread.start()
+        serial_writer_thread = threading.Thread(target=write_serial_thread, daemon=True)
+        serial_writer_thread.start()
         
     except serial.SerialException as e:
         print(f"Error: Could not open serial port {SERIAL_PORT}. Check connection and permissions.")
@@ -423,32 +1260,70 @@ def main():
         ser = None
     # ----------------------------------------------------
     
-    print(f"Opening camera {CAMERA_INDEX}...")
-    cam = cv2.VideoCapture(CAMERA_INDEX)
+    print(f"Opening frame source {FRAME_SOURCE}...")
+    cam = open_frame_source(FRAME_SOURCE, CAPTURE_RESOLUTION)
     if not cam.isOpened():
-        print("Error: Cannot open camera")
+        print("Error: Cannot open frame source")
         cleanup_gpio(None, None)
     
-    cam.set(cv2.CAP_PROP_FRAME_WIDTH, RESOLUTION[0])
-    cam.set(cv2.CAP_PROP_FRAME_HEIGHT, RESOLUTION[1])
-    actual_width = int(cam.get(cv2.CAP_PROP_FRAME_WIDTH))
-    actual_height = int(cam.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    print(f"Camera opened successfully")
-    print(f"Resolution: {actual_width}x{actual_height}")
+    print(f"Frame source opened successfully: {cam.describe()}")
     ret, test_frame = cam.read()
     if not ret:
-        print("Error: Cannot read from camera")
+        print("Error: Cannot read from frame source")
         cam.release()
         cleanup_gpio(None, None)
-    print("Camera test successful")
-    server = ThreadedHTTPServer(('', PORT), StreamingHandler)
+    print("Frame source test successful")
+    if FRONTEND_WORKERS > 0:
+        # Workers own the public port; this server only answers forwarded control requests
+        server = make_http_server(('127.0.0.1', CONTROL_PORT))
+    else:
+        server = make_http_server(('', PORT))
     server_thread = threading.Thread(target=server.serve_forever, daemon=True)
     server_thread.start()
-    print(f"\nServer started at http://0.0.0.0:{PORT}")
+    if UNIX_SOCKET_PATH:
+        unix_server = ThreadedUnixHTTPServer(UNIX_SOCKET_PATH, StreamingHandler, UNIX_SOCKET_MODE)
+        unix_server_thread = threading.Thread(target=unix_server.serve_forever, daemon=True)
+        unix_server_thread.start()
+        print(f"Local consumers: unix socket {UNIX_SOCKET_PATH}")
+    print(f"\nServer started at http://0.0.0.0:{PORT} ({SERVER_CORE} core)")
     print(f"View stream at http://localhost:{PORT}")
     print("Press Ctrl+C to stop\n")
+    if UNDISTORT_CALIBRATION:
+        try:
+            undistorter = Undistorter(UNDISTORT_CALIBRATION, UNDISTORT_ALPHA)
+            undistorter.maps_for(CAPTURE_RESOLUTION)
+        except Exception as e:
+            print(f"Undistortion disabled: {e}")
+            undistorter = None
+    if FILTERS:
+        filter_chain = FilterChain.from_paths(FILTERS, FILTER_BUDGET_MS)
+    if MOTION_ENABLED:
+        motion_detector = MotionDetector(MOTION_ANALYSIS_FPS)
+        motion_detector.start()
+    if TRACKER_ENABLED:
+        tracker = TemplateTracker(TRACKER_LEVEL, budget_ms=TRACKER_BUDGET_MS)
+        turret_controller = TurretController(tracker, RESOLUTION, focal_from_hfov(RESOLUTION[0], EIS_HFOV_DEG),
+                                             send_turret_command, TURRET_STEPS_PER_DEGREE, TRACKER_COMMAND_HZ,
+                                             max_steps=MAX_STEPS_PER_COMMAND, paused=operator_steering_turret)
+        turret_controller.start()
+    if RECORDING_ENABLED:
+        recorder = SegmentRecorder(RECORDINGS_DIR, RECORDING_SEGMENT_SECONDS, RECORDING_MAX_BYTES)
+        recorder.start()
     streaming_thread = threading.Thread(target=stream_camera, args=(cam,), daemon=True)
     streaming_thread.start()
+    for camera in EXTRA_CAMERAS:
+        pipeline = CameraPipeline(camera['name'], camera['source'], camera.get('resolution', RESOLUTION),
+                                  camera.get('framerate', FRAMERATE), camera.get('quality', JPEG_QUALITY))
+        camera_pipelines[pipeline.name] = pipeline
+        pipeline.start()
+        print(f"Camera '{pipeline.name}' at http://localhost:{PORT}/stream/{pipeline.name}.mjpg")
+    if PIP_CAMERAS:
+        def camera_frame(name):
+            if name == MAIN_CAMERA_NAME:
+                return lambda: latest_main_frame
+            return lambda: camera_pipelines[name].latest_frame
+        pip_compositor = PipCompositor(camera_frame(PIP_CAMERAS[0]), camera_frame(PIP_CAMERAS[1]), PIP_FRAMERATE,
+                                       JPEG_QUALITY, PIP_INSET_SCALE)
     try:
         while True:
             time.sleep(1)
@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 import cv2
 import io
+import json
 import time
 import threading
+import collections
 from http.server import SimpleHTTPRequestHandler, HTTPServer
 from socketserver import ThreadingMixIn
 from PIL import Image
@@ -14,6 +16,18 @@ FRAMERATE = 24
 JPEG_QUALITY = 80
 CAMERA_INDEX = 0
 
+# Camera list: one capture/encode pipeline per entry, served at /stream/<name>.mjpg.
+# Missing keys fall back to the settings above; /stream.mjpg is the first camera.
+CAMERAS = [
+    {'name': 'drive', 'index': CAMERA_INDEX},
+    # {'name': 'turret', 'index': 1, 'resolution': (320, 240), 'framerate': 15, 'quality': 70},
+]
+# Picture-in-picture at /stream/pip.mjpg: (main camera, inset camera), or None.
+# Composited only while someone is watching it.
+PIP_CAMERAS = None # e.g. ('drive', 'turret')
+PIP_FRAMERATE = 15
+PIP_INSET_SCALE = 0.3
+
 class StreamingOutput(io.BufferedIOBase):
     def __init__(self):
         self.frame = None
@@ -24,8 +38,111 @@ class StreamingOutput(io.BufferedIOBase):
             self.frame = buf
             self.condition.notify_all()
 
-# Global output stream
-output = StreamingOutput()
+class FrameStats:
+    """Achieved fps and CPU time per frame (thread CPU time, so only this pipeline counts)."""
+    def __init__(self, window_s=5.0):
+        self.window_s = window_s
+        self.samples = collections.deque()  # (wall time, cpu seconds) per frame
+        self.frames = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        return time.thread_time()
+
+    def end(self, cpu_start):
+        now = time.monotonic()
+        with self.lock:
+            self.samples.append((now, time.thread_time() - cpu_start))
+            self.frames += 1
+            while self.samples and now - self.samples[0][0] > self.window_s:
+                self.samples.popleft()
+
+    def get_stats(self):
+        with self.lock:
+            samples = list(self.samples)
+            frames = self.frames
+        if len(samples) < 2:
+            return {'frames': frames, 'fps': 0.0, 'cpu_ms': 0.0, 'cpu_pct': 0.0}
+        duration = samples[-1][0] - samples[0][0]
+        cpu = sum(c for _, c in samples[1:])
+        return {
+            'frames': frames,
+            'fps': round((len(samples) - 1) / duration, 1) if duration > 0 else 0.0,
+            'cpu_ms': round(1000 * cpu / (len(samples) - 1), 2),
+            'cpu_pct': round(100 * cpu / duration, 1) if duration > 0 else 0.0,
+        }
+
+class CameraPipeline:
+    """One camera: its own capture settings, output stream and stats."""
+    def __init__(self, config):
+        self.name = config['name']
+        self.index = config.get('index', CAMERA_INDEX)
+        self.resolution = tuple(config.get('resolution', RESOLUTION))
+        self.framerate = config.get('framerate', FRAMERATE)
+        self.quality = config.get('quality', JPEG_QUALITY)
+        self.output = StreamingOutput()
+        self.stats = FrameStats()
+        self.latest_frame = None # Newest BGR frame, for the PiP composite
+
+    def open_camera(self):
+        camera = cv2.VideoCapture(self.index)
+        if camera.isOpened():
+            camera.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
+            camera.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
+        return camera
+
+class PipCompositor:
+    """Inset of one camera in another, running only while it has viewers."""
+    def __init__(self, main, inset):
+        self.main = main
+        self.inset = inset
+        self.output = StreamingOutput()
+        self.stats = FrameStats()
+        self.lock = threading.Lock()
+        self.viewers = 0
+        self.thread = None
+
+    def acquire(self):
+        with self.lock:
+            self.viewers += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+                print("PiP composite started")
+
+    def release(self):
+        with self.lock:
+            self.viewers -= 1
+
+    def run(self):
+        while True:
+            with self.lock:
+                if self.viewers <= 0:
+                    self.thread = None
+                    print("PiP composite stopped (no viewers)")
+                    return
+            start_time = time.time()
+            cpu_start = self.stats.start()
+            main, inset = self.main.latest_frame, self.inset.latest_frame
+            if main is not None:
+                composite = main.copy()
+                if inset is not None:
+                    height, width = composite.shape[:2]
+                    inset_width = int(width * PIP_INSET_SCALE)
+                    inset_height = int(inset_width * inset.shape[0] / inset.shape[1])
+                    x, y = width - inset_width - 10, 10
+                    composite[y:y + inset_height, x:x + inset_width] = cv2.resize(
+                        inset, (inset_width, inset_height), interpolation=cv2.INTER_AREA)
+                    cv2.rectangle(composite, (x - 1, y - 1), (x + inset_width, y + inset_height), (255, 255, 255), 1)
+                ok, jpeg = cv2.imencode('.jpg', composite, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+                if ok:
+                    self.output.write(jpeg.tobytes())
+                self.stats.end(cpu_start)
+            time.sleep(max(0.0, 1.0 / PIP_FRAMERATE - (time.time() - start_time)))
+
+# Pipelines by name (filled in main()), and the PiP composite
+pipelines = {}
+pip_compositor = None
 
 class StreamingHandler(SimpleHTTPRequestHandler):
     def log_message(self, format, *args):
@@ -78,56 +195,95 @@ img {
 <body>
 <div class="container">
 <h1>Camera MJPEG Stream</h1>
-<img src="stream.mjpg" width="640" height="480" />
+CAMERA_IMAGES
 <div class="info">
-    <p>Direct stream URL: <a href="/stream.mjpg" style="color: #4CAF50;">/stream.mjpg</a></p>
+    STREAM_LINKS
     <p class="status">✓ Streaming active</p>
 </div>
 </div>
 </body>
 </html>
 '''
+            names = list(pipelines) + (['pip'] if pip_compositor is not None else [])
+            images = '\n'.join(f'<img src="stream/{name}.mjpg" title="{name}" />' for name in pipelines)
+            links = '\n    '.join(f'<p>{name}: <a href="/stream/{name}.mjpg" style="color: #4CAF50;">/stream/{name}.mjpg</a></p>'
+                                   for name in names)
+            content = content.replace('CAMERA_IMAGES', images).replace('STREAM_LINKS', links)
             self.send_response(200)
             self.send_header('Content-Type', 'text/html')
             self.send_header('Content-Length', len(content))
             self.end_headers()
             self.wfile.write(content.encode('utf-8'))
         elif self.path == '/stream.mjpg':
+            # First camera, for existing links
+            self.send_mjpeg(next(iter(pipelines.values())).output)
+        elif self.path.startswith('/stream/') and self.path.endswith('.mjpg'):
+            name = self.path[len('/stream/'):-len('.mjpg')]
+            if name in pipelines:
+                self.send_mjpeg(pipelines[name].output)
+            elif name == 'pip' and pip_compositor is not None:
+                pip_compositor.acquire()
+                try:
+                    self.send_mjpeg(pip_compositor.output)
+                finally:
+                    pip_compositor.release()
+            else:
+                self.send_error(404, f"No camera named '{name}'")
+        elif self.path == '/cameras':
+            # Per-camera achieved fps and CPU cost
+            cameras = {}
+            for name, pipeline in pipelines.items():
+                cameras[name] = pipeline.stats.get_stats()
+                cameras[name].update(resolution=list(pipeline.resolution), framerate=pipeline.framerate,
+                                     quality=pipeline.quality)
+            if pip_compositor is not None:
+                cameras['pip'] = pip_compositor.stats.get_stats()
+                cameras['pip']['viewers'] = pip_compositor.viewers
+            content = json.dumps(cameras).encode('utf-8')
             self.send_response(200)
-            self.send_header('Age', 0)
-            self.send_header('Cache-Control', 'no-cache, private')
-            self.send_header('Pragma', 'no-cache')
-            self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=FRAME')
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(content))
             self.end_headers()
-            try:
-                while True:
-                    with output.condition:
-                        output.condition.wait()
-                        frame = output.frame
-                    self.wfile.write(b'--FRAME\r\n')
-                    self.send_header('Content-Type', 'image/jpeg')
-                    self.send_header('Content-Length', len(frame))
-                    self.end_headers()
-                    self.wfile.write(frame)
-                    self.wfile.write(b'\r\n')
-            except Exception as e:
-                pass
+            self.wfile.write(content)
         else:
             self.send_error(404)
             self.end_headers()
 
+    def send_mjpeg(self, output):
+        self.send_response(200)
+        self.send_header('Age', 0)
+        self.send_header('Cache-Control', 'no-cache, private')
+        self.send_header('Pragma', 'no-cache')
+        self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=FRAME')
+        self.end_headers()
+        try:
+            while True:
+                with output.condition:
+                    output.condition.wait()
+                    frame = output.frame
+                self.wfile.write(b'--FRAME\r\n')
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', len(frame))
+                self.end_headers()
+                self.wfile.write(frame)
+                self.wfile.write(b'\r\n')
+        except Exception as e:
+            pass
+
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     """Handle requests in a separate thread."""
     daemon_threads = True
 
-def stream_camera(camera):
-    """Stream camera frames as JPEG"""
+def stream_camera(pipeline, camera):
+    """Stream one camera's frames as JPEG"""
     frame_count = 0
     error_count = 0
     
-    print("Starting camera streaming...")
+    print(f"Starting camera streaming for '{pipeline.name}'...")
     
     while True:
+        start_time = time.time()
+        cpu_start = pipeline.stats.start()
         try:
             # Capture frame-by-frame
             ret, frame = camera.read()
@@ -143,10 +299,8 @@ def stream_camera(camera):
                     print("Too many errors, attempting to reconnect camera...")
                     camera.release()
                     time.sleep(1)
-                    camera = cv2.VideoCapture(CAMERA_INDEX)
+                    camera = pipeline.open_camera()
                     if camera.isOpened():
-                        camera.set(cv2.CAP_PROP_FRAME_WIDTH, RESOLUTION[0])
-                        camera.set(cv2.CAP_PROP_FRAME_HEIGHT, RESOLUTION[1])
                         print("Camera reconnected")
                         error_count = 0
                     else:
@@ -156,6 +310,7 @@ def stream_camera(camera):
             
             # Reset error count on successful frame
             error_count = 0
+            pipeline.latest_frame = frame
             
             # Convert BGR to RGB (OpenCV uses BGR by default)
             rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
@@ -164,60 +319,68 @@ def stream_camera(camera):
             img = Image.fromarray(rgb_frame)
             
             # Resize if needed
-            if img.size != RESOLUTION:
-                img = img.resize(RESOLUTION, Image.LANCZOS)
+            if img.size != pipeline.resolution:
+                img = img.resize(pipeline.resolution, Image.LANCZOS)
             
             # Save to bytes buffer as JPEG
             buffer = io.BytesIO()
-            img.save(buffer, format='JPEG', quality=JPEG_QUALITY)
+            img.save(buffer, format='JPEG', quality=pipeline.quality)
             
             # Write to output stream
-            output.write(buffer.getvalue())
+            pipeline.output.write(buffer.getvalue())
+            pipeline.stats.end(cpu_start)
             
             frame_count += 1
             if frame_count % 100 == 0:
-                print(f"Streamed {frame_count} frames successfully")
+                stats = pipeline.stats.get_stats()
+                print(f"'{pipeline.name}': streamed {frame_count} frames successfully, "
+                      f"{stats['fps']} fps, {stats['cpu_ms']} ms CPU/frame ({stats['cpu_pct']}% of a core)")
             
-            # Control frame rate
-            time.sleep(1.0 / FRAMERATE)
+            # Control frame rate: sleep only what is left of the frame period
+            time.sleep(max(0.0, 1.0 / pipeline.framerate - (time.time() - start_time)))
             
         except Exception as e:
             print(f"Error in streaming: {e}")
             time.sleep(0.1)
 
 def main():
+    global pip_compositor
     print("Simple MJPEG Streamer using OpenCV")
     print("===================================")
     
-    # Open camera
-    print(f"Opening camera {CAMERA_INDEX}...")
-    cam = cv2.VideoCapture(CAMERA_INDEX)
-    
-    if not cam.isOpened():
-        print("Error: Cannot open camera")
-        print("Please check:")
-        print("  1. Camera is connected")
-        print("  2. Camera index is correct (try 0, 1, 2...)")
-        print("  3. No other application is using the camera")
-        exit(1)
-    
-    # Set camera resolution
-    cam.set(cv2.CAP_PROP_FRAME_WIDTH, RESOLUTION[0])
-    cam.set(cv2.CAP_PROP_FRAME_HEIGHT, RESOLUTION[1])
-    
-    # Get actual resolution (camera might not support requested resolution)
-    actual_width = int(cam.get(cv2.CAP_PROP_FRAME_WIDTH))
-    actual_height = int(cam.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    print(f"Camera opened successfully")
-    print(f"Resolution: {actual_width}x{actual_height}")
+    cameras = []
+    for config in CAMERAS:
+        pipeline = CameraPipeline(config)
+        # Open camera
+        print(f"Opening camera '{pipeline.name}' (index {pipeline.index})...")
+        cam = pipeline.open_camera()
+        
+        if not cam.isOpened():
+            print("Error: Cannot open camera")
+            print("Please check:")
+            print("  1. Camera is connected")
+            print("  2. Camera index is correct (try 0, 1, 2...)")
+            print("  3. No other application is using the camera")
+            exit(1)
+        
+        # Get actual resolution (camera might not support requested resolution)
+        actual_width = int(cam.get(cv2.CAP_PROP_FRAME_WIDTH))
+        actual_height = int(cam.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        print(f"Camera opened successfully")
+        print(f"Resolution: {actual_width}x{actual_height}")
+        
+        # Test camera by reading one frame
+        ret, test_frame = cam.read()
+        if not ret:
+            print("Error: Cannot read from camera")
+            cam.release()
+            exit(1)
+        print("Camera test successful")
+        pipelines[pipeline.name] = pipeline
+        cameras.append(cam)
     
-    # Test camera by reading one frame
-    ret, test_frame = cam.read()
-    if not ret:
-        print("Error: Cannot read from camera")
-        cam.release()
-        exit(1)
-    print("Camera test successful")
+    if PIP_CAMERAS:
+        pip_compositor = PipCompositor(pipelines[PIP_CAMERAS[0]], pipelines[PIP_CAMERAS[1]])
     
     # Start HTTP server in a thread
     server = ThreadedHTTPServer(('', PORT), StreamingHandler)
@@ -226,11 +389,14 @@ def main():
     
     print(f"\nServer started at http://0.0.0.0:{PORT}")
     print(f"View stream at http://localhost:{PORT}")
+    for name in pipelines:
+        print(f"  {name}: http://localhost:{PORT}/stream/{name}.mjpg")
     print("Press Ctrl+C to stop\n")
     
-    # Start streaming thread
-    streaming_thread = threading.Thread(target=stream_camera, args=(cam,), daemon=True)
-    streaming_thread.start()
+    # Start one streaming thread per camera
+    for pipeline, cam in zip(pipelines.values(), cameras):
+        streaming_thread = threading.Thread(target=stream_camera, args=(pipeline, cam), daemon=True)
+        streaming_thread.start()
     
     try:
         # Keep running
@@ -238,9 +404,10 @@ def main():
             time.sleep(1)
     except KeyboardInterrupt:
         print("\nStopping...")
-        cam.release()
-        print("Camera released")
+        for cam in cameras:
+            cam.release()
+        print("Cameras released")
         print("Server stopped")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,167 @@
+'''
+    Chain loader for cvfilter_py: runs several filters in sequence inside the
+    mjpg-streamer pipeline, under a per-frame time budget.
+
+        mjpg_streamer -i "input_opencv.so --filter cvfilter_py.so --fargs path/to/chain_filter.py"
+
+    The filters are listed in chain_filter.json next to this file (or in the
+    file named by the CVFILTER_CHAIN_CONFIG environment variable):
+
+        {
+            "budget_ms": 20,
+            "report_every": 300,
+            "filters": [
+                {"path": "example_filter.py", "required": true},
+                {"path": "detect_filter.py", "budget_ms": 12}
+            ]
+        }
+
+    Every entry is a normal cvfilter_py filter (init_filter() returning a
+    callable). The same NumPy frame is handed from filter to filter; the chain
+    itself never copies it, so filters should draw in place and return the
+    array they were given.
+
+    Before running a filter the chain checks whether the time already spent on
+    this frame plus the filter's recent average cost would exceed budget_ms. If
+    so the filter is skipped for this frame (unless it is "required"). Each
+    filter keeps a latency histogram, printed every report_every frames.
+
+    A filter skipped on RETRY_AFTER_SKIPS frames in a row is run once anyway, so
+    its cost estimate is refreshed and it is not starved forever by one slow
+    frame.
+'''
+
+import importlib.util
+import json
+import os
+import sys
+import time
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chain_filter.json')
+
+# Histogram bucket upper edges in milliseconds (last bucket is everything above)
+BUCKET_EDGES_MS = [0.25, 0.5, 1, 2, 4, 8, 16, 32, 64]
+
+# Weight of the newest sample in each filter's moving-average cost
+COST_SMOOTHING = 0.2
+
+# Run a skipped filter anyway after this many consecutive skips, to re-measure it
+RETRY_AFTER_SKIPS = 30
+
+
+class ChainEntry:
+
+    def __init__(self, name, fn, budget_ms, required):
+        self.name = name
+        self.fn = fn
+        self.budget_ms = budget_ms
+        self.required = required
+        self.histogram = [0] * (len(BUCKET_EDGES_MS) + 1)
+        self.avg_ms = 0.0
+        self.calls = 0
+        self.skipped = 0
+        self.consecutive_skips = 0
+        self.overruns = 0
+        self.errors = 0
+
+    def record(self, elapsed_ms):
+        self.calls += 1
+        bucket = len(BUCKET_EDGES_MS)
+        for i, edge in enumerate(BUCKET_EDGES_MS):
+            if elapsed_ms <= edge:
+                bucket = i
+                break
+        self.histogram[bucket] += 1
+        if self.calls == 1:
+            self.avg_ms = elapsed_ms
+        else:
+            self.avg_ms += COST_SMOOTHING * (elapsed_ms - self.avg_ms)
+        if self.budget_ms is not None and elapsed_ms > self.budget_ms:
+            self.overruns += 1
+
+    def histogram_line(self):
+        labels = ['<=%gms' % edge for edge in BUCKET_EDGES_MS] + ['>%gms' % BUCKET_EDGES_MS[-1]]
+        return ' '.join('%s:%d' % (label, count) for label, count in zip(labels, self.histogram) if count)
+
+
+class FilterChain:
+
+    def __init__(self, entries, budget_ms, report_every):
+        self.entries = entries
+        self.budget_ms = budget_ms
+        self.report_every = report_every
+        self.frames = 0
+        self.frames_over_budget = 0
+
+    def process(self, img):
+        '''
+            :param img: A numpy array representing the input image
+            :returns: A numpy array to send to the mjpg-streamer output plugin
+        '''
+        start = time.perf_counter()
+        for entry in self.entries:
+            spent_ms = (time.perf_counter() - start) * 1000
+            if (not entry.required and entry.consecutive_skips < RETRY_AFTER_SKIPS
+                    and spent_ms + entry.avg_ms > self.budget_ms):
+                entry.skipped += 1
+                entry.consecutive_skips += 1
+                continue
+            entry.consecutive_skips = 0
+            t0 = time.perf_counter()
+            try:
+                result = entry.fn(img)
+                if result is not None:
+                    img = result
+            except Exception as e:
+                entry.errors += 1
+                print('chain_filter: %s raised %s' % (entry.name, e), file=sys.stderr)
+            entry.record((time.perf_counter() - t0) * 1000)
+
+        self.frames += 1
+        if (time.perf_counter() - start) * 1000 > self.budget_ms:
+            self.frames_over_budget += 1
+        if self.report_every and self.frames % self.report_every == 0:
+            self.report()
+        return img
+
+    def report(self):
+        print('chain_filter: %d frames, %d over the %.1f ms budget' %
+              (self.frames, self.frames_over_budget, self.budget_ms), file=sys.stderr)
+        for entry in self.entries:
+            print('  %-20s avg %.2f ms, %d runs, %d skipped, %d overruns, %d errors | %s' %
+                  (entry.name, entry.avg_ms, entry.calls, entry.skipped, entry.overruns, entry.errors,
+                   entry.histogram_line()), file=sys.stderr)
+
+
+def load_module(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location('chain_' + name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return name, module
+
+
+def init_filter():
+    '''
+        This function is called after the filter module is imported. It MUST
+        return a callable object (such as a function or bound method).
+    '''
+    config_path = os.environ.get('CVFILTER_CHAIN_CONFIG', DEFAULT_CONFIG)
+    with open(config_path) as f:
+        config = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(config_path))
+
+    entries = []
+    for item in config.get('filters', []):
+        path = item['path']
+        if not os.path.isabs(path):
+            path = os.path.join(base_dir, path)
+        name, module = load_module(path)
+        fn = module.init_filter()
+        if not callable(fn):
+            raise TypeError('init_filter() in %s did not return a callable' % path)
+        entries.append(ChainEntry(name, fn, item.get('budget_ms'), item.get('required', False)))
+        print('chain_filter: loaded %s' % name, file=sys.stderr)
+
+    chain = FilterChain(entries, float(config.get('budget_ms', 20)), int(config.get('report_every', 300)))
+    return chain.process